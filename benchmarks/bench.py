@@ -0,0 +1,496 @@
+import os
+import sys
+import json
+import time
+import wave
+import argparse
+import platform
+import resource
+import subprocess
+import contextlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LABS = {
+    'echo_steganography': os.path.join(ROOT, 'echo_steganography', 'echo_steganography'),
+    'echo_hiding_decoding': os.path.join(ROOT, 'echo_hiding_decoding', 'echo_hiding_decoding'),
+    'watermark_echo_hiding': os.path.join(ROOT, 'watermark_echo_hiding', 'watermark_echo_hiding'),
+}
+SAMPLE_RATE = 44100
+FREQUENCY = 440.0
+# Input WAVs are synthesized this many seconds at a time (a whole number of 440 Hz periods)
+CHUNK_SECONDS = 10
+L = 8192
+
+def _capacity_text(nsamples):
+    """
+    Message that fills every frame echo_embed can use.
+
+    Args:
+        nsamples (int): Number of samples per channel.
+
+    Returns:
+        str: Text of max_bits / 8 characters.
+    """
+    nframe = nsamples // L
+    nchar = (nframe - nframe % 8) // 8
+    return ('benchmark ' * (nchar // 10 + 1))[:nchar]
+
+def _path(case_dir, name):
+    return os.path.join(case_dir, name)
+
+def _nsamples(case_dir):
+    with wave.open(_path(case_dir, 'input.wav'), 'rb') as wav:
+        return wav.getnframes()
+
+# Stages run in a fresh child process with the lab directory on sys.path.
+# Each takes the case directory and leaves its outputs there for later stages.
+
+def stage_preprocess(case_dir):
+    from preprocess import preprocess_audio
+    preprocess_audio(_path(case_dir, 'input.wav'), _path(case_dir, 'input.npy'))
+
+def stage_mixer(case_dir):
+    import numpy as np
+    from embed import mixer
+    nframe = _nsamples(case_dir) // L
+    bits = ''.join(np.random.default_rng(0).choice(['0', '1'], size=nframe))
+    mixer(L, bits, 0, 1)
+
+def stage_echo_embed(case_dir):
+    import numpy as np
+    from embed import audiosave, echo_embed
+    signal = np.load(_path(case_dir, 'input.npy'), mmap_mode='r')
+    out_signal = echo_embed(signal, _capacity_text(len(signal)))
+    audiosave(out_signal, SAMPLE_RATE, _path(case_dir, 'stego.wav'))
+
+def stage_echo_embed_stream(case_dir):
+    import numpy as np
+    from embed import echo_embed_stream
+    signal = np.load(_path(case_dir, 'input.npy'), mmap_mode='r')
+    echo_embed_stream(signal, _capacity_text(len(signal)), _path(case_dir, 'stego_stream.wav'),
+                      SAMPLE_RATE)
+
+def stage_echo_embed_wav(case_dir):
+    from embed import echo_embed_wav
+    echo_embed_wav(_path(case_dir, 'input.wav'), _path(case_dir, 'stego_wav.wav'),
+                   _capacity_text(_nsamples(case_dir)))
+
+def stage_prepare_data(case_dir):
+    from prepare_data import prepare_data
+    prepare_data(_path(case_dir, 'stego.wav'), _path(case_dir, 'stego.npy'))
+
+def stage_decode_message(case_dir):
+    from decode_message import decode_message
+    decode_message(_path(case_dir, 'stego.npy'), _path(case_dir, 'decoded_message.txt'))
+
+def stage_task1_generate_keys(case_dir):
+    import numpy as np
+    from task1_generate_keys import task1_generate_keys
+    np.random.seed(0)
+    task1_generate_keys(_path(case_dir, 'watermark_ori.dat'), _path(case_dir, 'watermark_extended.dat'),
+                        _path(case_dir, 'secret_key.dat'))
+
+def stage_task2_compute_params(case_dir):
+    from task2_compute_params import task2_compute_params
+    task2_compute_params(_path(case_dir, 'input.wav'), _path(case_dir, 'embed_params.dat'))
+
+def _task3(mode):
+    def stage(case_dir):
+        task3 = getattr(__import__(f'task3_embed_{mode}'), f'task3_embed_{mode}')
+        task3(_path(case_dir, 'input.wav'), _path(case_dir, 'watermark_extended.dat'),
+              _path(case_dir, 'secret_key.dat'), _path(case_dir, 'embed_params.dat'),
+              _path(case_dir, f'wmed_{mode}.wav'))
+    return stage
+
+def _task4(method):
+    def stage(case_dir):
+        from task4_detect import task4_detect
+        task4_detect(_path(case_dir, 'wmed_positive.wav'), _path(case_dir, 'secret_key.dat'),
+                     _path(case_dir, 'embed_params.dat'), _path(case_dir, f'detected_bits_{method}.dat'), 'signal1',
+                     method=method)
+    return stage
+
+def stage_task5_evaluate(case_dir):
+    from task5_evaluate import task5_evaluate
+    task5_evaluate(_path(case_dir, 'input.wav'), _path(case_dir, 'wmed_positive.wav'),
+                   _path(case_dir, 'watermark_ori.dat'), _path(case_dir, 'detected_bits_full.dat'),
+                   _path(case_dir, 'embed_params.dat'))
+
+# Engine -> ordered (stage, function); later stages use earlier outputs
+STAGES = {
+    'echo_steganography': [
+        ('preprocess', stage_preprocess),
+        ('mixer', stage_mixer),
+        ('echo_embed', stage_echo_embed),
+        ('echo_embed_stream', stage_echo_embed_stream),
+        ('echo_embed_wav', stage_echo_embed_wav),
+    ],
+    'echo_hiding_decoding': [
+        ('prepare_data', stage_prepare_data),
+        ('decode_message', stage_decode_message),
+    ],
+    'watermark_echo_hiding': [
+        ('task1_generate_keys', stage_task1_generate_keys),
+        ('task2_compute_params', stage_task2_compute_params),
+        ('task3_embed_positive', _task3('positive')),
+        ('task3_embed_negative', _task3('negative')),
+        ('task3_embed_forward', _task3('forward')),
+        ('task4_detect', _task4('full')),
+        ('task4_detect_sparse', _task4('sparse')),
+        ('task5_evaluate', stage_task5_evaluate),
+    ],
+}
+# Stages of each engine's command-line pipeline, summed for the engine throughput
+PIPELINES = {
+    'echo_steganography': ('preprocess', 'echo_embed'),
+    'echo_hiding_decoding': ('prepare_data', 'decode_message'),
+    'watermark_echo_hiding': ('task2_compute_params', 'task3_embed_positive', 'task4_detect', 'task5_evaluate'),
+}
+# The watermark tasks only handle mono host signals
+MONO_ONLY = ('watermark_echo_hiding',)
+# task1 always writes a 40-bit watermark, repeated 3 times at a 2048-sample
+# frame shift; shorter hosts cannot carry it and task5 fails
+MIN_SECONDS = {'watermark_echo_hiding': (40 * 3 + 1) * 2048 / SAMPLE_RATE}
+# Imported in the child before timing; lab modules only where they exist
+WARM_MODULES = ('numpy', 'scipy.fft', 'scipy.io.wavfile',
+                'stego_core', 'echo_kernel', 'echo_engine', 'embed', 'preprocess', 'decode_message')
+
+def parse_duration(text):
+    """
+    Parse a duration such as '30', '30s', '10m' or '1h' into seconds.
+
+    Args:
+        text (str): Duration with an optional s/m/h suffix.
+
+    Returns:
+        float: Duration in seconds.
+    """
+    units = {'s': 1, 'm': 60, 'h': 3600}
+    text = text.strip().lower()
+    if text and text[-1] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+def synthesize(filename, duration, channels, content, seed=0):
+    """
+    Write a 16-bit test WAV chunk by chunk with generate_sine_wave.
+
+    Args:
+        filename (str): Output WAV file path.
+        duration (float): Duration in seconds.
+        channels (int): 1 or 2.
+        content (str): 'sine', 'noise' or 'music'.
+        seed (int): Random seed; chunk i uses seed + i.
+    """
+    import numpy as np
+    from generate_input_audio import generate_sine_wave
+    total = int(duration * SAMPLE_RATE)
+    with wave.open(filename, 'wb') as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        for i, start in enumerate(range(0, total, CHUNK_SECONDS * SAMPLE_RATE)):
+            chunk = min(CHUNK_SECONDS * SAMPLE_RATE, total - start)
+            _, signal = generate_sine_wave(chunk / SAMPLE_RATE, SAMPLE_RATE, FREQUENCY, 0.5, channels == 2,
+                                           content, seed + i)
+            signal = np.int16(np.clip(signal, -1, 1) * 32767)
+            wav.writeframes(signal.astype('<i2').tobytes())
+
+def _proc_status_mb(field):
+    """Read a VmRSS/VmHWM line of /proc/self/status in MB (None if unavailable)."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def _reset_peak_rss():
+    """Reset the kernel's peak RSS (VmHWM) for this process; False if not supported."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def run_stage(engine, stage, case_dir):
+    """
+    Run one stage in this process and measure it (child side).
+
+    Imports, including the lazily loaded scipy modules, happen before the
+    timer starts, so the figures are steady-state compute; CLI startup is
+    measured separately with python -X importtime.
+
+    Args:
+        engine (str): Engine name from STAGES.
+        stage (str): Stage name.
+        case_dir (str): Directory holding the case's input and outputs.
+
+    Returns:
+        dict: seconds, peak_rss_mb (whole process) and stage_rss_mb (peak
+            growth over the RSS at the start of the stage).
+    """
+    sys.path.insert(0, LABS[engine])
+    func = dict(STAGES[engine])[stage]
+    for name in WARM_MODULES:
+        if '.' in name or os.path.exists(os.path.join(LABS[engine], name + '.py')):
+            __import__(name)
+    if 'echo_engine' in sys.modules:
+        # Watermark Hann window (imports scipy.signal)
+        sys.modules['echo_engine'].hann(4096)
+
+    if _reset_peak_rss():
+        before = _proc_status_mb('VmRSS')
+    else:
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        t0 = time.perf_counter()
+        func(case_dir)
+        seconds = time.perf_counter() - t0
+    peak = _proc_status_mb('VmHWM') or resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {'seconds': seconds, 'peak_rss_mb': peak, 'stage_rss_mb': max(peak - before, 0.0)}
+
+def measure(engine, stage, case_dir, repeat):
+    """
+    Run a stage repeat times, each in a fresh process.
+
+    Returns:
+        dict: Best seconds and largest memory figures, or an error.
+    """
+    best = None
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), 'stage', engine, stage, case_dir],
+                              capture_output=True, text=True)
+        if proc.returncode != 0:
+            lines = proc.stderr.strip().splitlines()
+            return {'error': lines[-1] if lines else f"exit status {proc.returncode}"}
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        if best is None:
+            best = result
+        else:
+            best = {'seconds': min(best['seconds'], result['seconds']),
+                    'peak_rss_mb': max(best['peak_rss_mb'], result['peak_rss_mb']),
+                    'stage_rss_mb': max(best['stage_rss_mb'], result['stage_rss_mb'])}
+    return best
+
+def environment():
+    """Versions and machine details stored with the results."""
+    import numpy
+    import scipy
+    try:
+        commit = subprocess.run(['git', '-C', ROOT, 'rev-parse', '--short', 'HEAD'],
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {'date': time.strftime('%Y-%m-%dT%H:%M:%S'), 'commit': commit, 'python': platform.python_version(),
+            'numpy': numpy.__version__, 'scipy': scipy.__version__, 'platform': platform.platform(),
+            'cpus': os.cpu_count()}
+
+def run_benchmarks(durations, channels, contents, engines, repeat=3, work_dir=None, output_file=None):
+    """
+    Synthesize every input case and time every stage of the selected engines.
+
+    Args:
+        durations (list): Input durations in seconds.
+        channels (list): Channel counts (1 and/or 2).
+        contents (list): Signal contents ('sine', 'noise', 'music').
+        engines (list): Engine names from STAGES, run in this order.
+        repeat (int): Runs per stage; the fastest one is kept.
+        work_dir (str): Directory for the synthesized and processed files.
+        output_file (str): Optional JSON file for the results.
+
+    Returns:
+        dict: {'environment': ..., 'results': [...]} as saved to output_file.
+    """
+    import tempfile
+    sys.path.insert(0, LABS['echo_steganography'])
+    work_dir = work_dir or tempfile.mkdtemp(prefix='echo_bench_')
+    results = []
+    for content in contents:
+        for nch in channels:
+            for duration in durations:
+                case_dir = os.path.join(work_dir, f"{content}_{nch}ch_{duration:g}s")
+                os.makedirs(case_dir, exist_ok=True)
+                synthesize(_path(case_dir, 'input.wav'), duration, nch, content)
+                for engine in engines:
+                    if nch > 1 and engine in MONO_ONLY or duration < MIN_SECONDS.get(engine, 0):
+                        continue
+                    for stage, _ in STAGES[engine]:
+                        row = {'engine': engine, 'stage': stage, 'content': content, 'channels': nch,
+                               'duration': duration}
+                        row.update(measure(engine, stage, case_dir, repeat))
+                        if 'seconds' in row:
+                            row['throughput'] = duration / row['seconds'] if row['seconds'] > 0 else float('inf')
+                        results.append(row)
+                        print(format_row(row))
+    report = {'environment': environment(), 'results': results}
+    if output_file:
+        with open(output_file, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results saved to {output_file}")
+    print_engine_summary(results)
+    return report
+
+def case_name(row):
+    return f"{row['content']} {row['channels']}ch {row['duration']:g}s"
+
+def format_row(row):
+    name = f"{row['engine']}.{row['stage']}"
+    if 'error' in row:
+        return f"{name:42s} {case_name(row):22s} FAILED: {row['error']}"
+    return (f"{name:42s} {case_name(row):22s} {row['seconds']:9.3f} s {row['throughput']:10.1f} audio-s/s "
+            f"{row['stage_rss_mb']:8.1f} MB (peak {row['peak_rss_mb']:.1f} MB)")
+
+def print_engine_summary(results):
+    """Print end-to-end throughput of each engine's command-line pipeline per case."""
+    print("Engine throughput (command-line pipeline):")
+    cases = {}
+    for row in results:
+        if row['stage'] in PIPELINES[row['engine']] and 'seconds' in row:
+            key = (row['engine'], case_name(row), row['duration'])
+            cases[key] = cases.get(key, 0.0) + row['seconds']
+    for (engine, case, duration), seconds in cases.items():
+        print(f"  {engine:24s} {case:22s} {duration / seconds if seconds > 0 else float('inf'):10.1f} audio-s/s "
+              f"({' + '.join(PIPELINES[engine])})")
+
+def compare_results(base_file, new_file, threshold=0.1):
+    """
+    Print the time change of every stage between two result files.
+
+    Args:
+        base_file (str): Baseline JSON from run_benchmarks.
+        new_file (str): New JSON from run_benchmarks.
+        threshold (float): Relative slowdown reported as a regression.
+
+    Returns:
+        int: Number of regressions.
+    """
+    def load(filename):
+        with open(filename) as f:
+            rows = json.load(f)['results']
+        return {(r['engine'], r['stage'], r['content'], r['channels'], r['duration']): r for r in rows}
+
+    base, new = load(base_file), load(new_file)
+    regressions = 0
+    print(f"{'stage':42s} {'case':22s} {'base s':>9s} {'new s':>9s} {'change':>8s}")
+    for key, row in new.items():
+        old = base.get(key)
+        name = f"{key[0]}.{key[1]}"
+        if old is None or 'seconds' not in old or 'seconds' not in row:
+            status = 'new' if old is None else 'failed'
+            print(f"{name:42s} {case_name(row):22s} {'':>9s} {'':>9s} {status:>8s}")
+            continue
+        change = row['seconds'] / old['seconds'] - 1 if old['seconds'] > 0 else 0.0
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        elif change < -threshold:
+            flag = '  faster'
+        print(f"{name:42s} {case_name(row):22s} {old['seconds']:9.3f} {row['seconds']:9.3f} {change:+8.1%}{flag}")
+    for key in base.keys() - new.keys():
+        print(f"{key[0] + '.' + key[1]:42s} {case_name(base[key]):22s} missing from {new_file}")
+    print(f"{regressions} regression(s) above {threshold:.0%}")
+    return regressions
+
+def bench_fec(nbits, error_rates, num_reps=3, repeat=3, output_file=None):
+    """
+    Time fec_decode of every code in the watermark lab on a binary symmetric channel.
+
+    Each code encodes the same random payload. Every coded bit is flipped
+    with the given probability, so num_reps > 1 models the lab, where a
+    coded bit spans num_reps frames and is voted on before the outer code.
+
+    Args:
+        nbits (int): Payload bits per code.
+        error_rates (list): Channel bit error rates to test.
+        num_reps (int): Frames per coded bit (the inner repetition).
+        repeat (int): Decode runs per case; the fastest one is kept.
+        output_file (str): Optional JSON file for the results.
+
+    Returns:
+        dict: {'environment': ..., 'results': [...]} as saved to output_file.
+    """
+    import numpy as np
+    sys.path.insert(0, LABS['watermark_echo_hiding'])
+    from fec import CODES, fec_decode, fec_encode
+
+    rng = np.random.default_rng(0)
+    payload = rng.integers(0, 2, nbits)
+    results = []
+    print(f"{'code':12s} {'error rate':>10s} {'bits/frame':>10s} {'BER':>8s} {'decode s':>9s} {'Mbit/s':>8s}")
+    for code in CODES:
+        encoded = fec_encode(payload, code, num_reps)
+        for error_rate in error_rates:
+            received = encoded ^ (rng.random(len(encoded)) < error_rate)
+            seconds = float('inf')
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                decoded = fec_decode(received, nbits, code, num_reps)
+                seconds = min(seconds, time.perf_counter() - t0)
+            row = {'code': code, 'error_rate': error_rate, 'nbits': nbits, 'rate': nbits / len(encoded),
+                   'ber': float(np.mean(decoded != payload)), 'seconds': seconds,
+                   'mbit_per_s': nbits / seconds / 1e6 if seconds > 0 else float('inf')}
+            results.append(row)
+            print(f"{code:12s} {error_rate:10.2%} {row['rate']:10.3f} {row['ber']:8.2%} {seconds:9.4f} "
+                  f"{row['mbit_per_s']:8.2f}")
+    report = {'environment': environment(), 'results': results}
+    if output_file:
+        with open(output_file, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results saved to {output_file}")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the embed, decode, detect and evaluate engines.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    run_parser = sub.add_parser('run', help="Synthesize inputs and time every stage")
+    run_parser.add_argument("--durations", default="5s,30s,2m", help="Comma-separated durations, e.g. 10s,10m,1h (default: 5s,30s,2m)")
+    run_parser.add_argument("--channels", default="1,2", help="Comma-separated channel counts (default: 1,2)")
+    run_parser.add_argument("--content", default="sine,noise,music", help="Comma-separated contents (default: sine,noise,music)")
+    run_parser.add_argument("--engines", default=",".join(STAGES), help="Comma-separated engines, run in this order (default: all)")
+    run_parser.add_argument("--repeat", type=int, default=3, help="Runs per stage, fastest kept (default: 3)")
+    run_parser.add_argument("--work-dir", default=None, help="Directory for the test files (default: a new temp directory)")
+    run_parser.add_argument("--output", default="benchmark_results.json", help="Results JSON file")
+    compare_parser = sub.add_parser('compare', help="Diff two result files and flag regressions")
+    compare_parser.add_argument("base", help="Baseline results JSON")
+    compare_parser.add_argument("new", help="New results JSON")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="Relative slowdown flagged as a regression (default: 0.1)")
+    fec_parser = sub.add_parser('fec', help="Time decoding and measure BER of each watermark FEC code")
+    fec_parser.add_argument("--nbits", type=int, default=100000, help="Payload bits per code (default: 100000)")
+    fec_parser.add_argument("--error-rates", default="0.01,0.05,0.1", help="Comma-separated channel bit error rates (default: 0.01,0.05,0.1)")
+    fec_parser.add_argument("--num-reps", type=int, default=3, help="Frames per coded bit, 1 for the bare codes (default: 3)")
+    fec_parser.add_argument("--repeat", type=int, default=3, help="Decode runs per case, fastest kept (default: 3)")
+    fec_parser.add_argument("--output", default=None, help="Results JSON file")
+    stage_parser = sub.add_parser('stage')  # internal: one measured stage in a fresh process
+    stage_parser.add_argument("engine")
+    stage_parser.add_argument("stage")
+    stage_parser.add_argument("case_dir")
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'stage':
+            print(json.dumps(run_stage(args.engine, args.stage, args.case_dir)))
+        elif args.command == 'compare':
+            sys.exit(1 if compare_results(args.base, args.new, args.threshold) else 0)
+        elif args.command == 'fec':
+            bench_fec(args.nbits, [float(r) for r in args.error_rates.split(',')], args.num_reps, args.repeat,
+                      args.output)
+        else:
+            engines = args.engines.split(',')
+            unknown = set(engines) - set(STAGES)
+            if unknown:
+                raise ValueError(f"Unknown engine(s): {', '.join(sorted(unknown))}")
+            if 'echo_hiding_decoding' in engines and 'echo_steganography' not in engines[:engines.index('echo_hiding_decoding')]:
+                raise ValueError("echo_hiding_decoding decodes the stego.wav written by echo_steganography; list echo_steganography first")
+            run_benchmarks([parse_duration(d) for d in args.durations.split(',')],
+                           [int(c) for c in args.channels.split(',')], args.content.split(','), engines,
+                           args.repeat, args.work_dir, args.output)
+    except Exception as e:
+        if args.command == 'stage':
+            raise
+        print(f"Error: {e}")
+        sys.exit(1)
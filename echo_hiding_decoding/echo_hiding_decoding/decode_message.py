@@ -1,20 +1,115 @@
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from stego_core import HEADER_BITS, bits_to_text, payload_length, profile_stage, read_payload, shift_signal, sp_fft
 
-def decode_message(input_file, output_file, delay=100):
-    data = np.load(input_file)
-    binary = ""
-    for i in range(0, len(data) - delay, delay):
-        segment = data[i:i + delay]
-        echo_energy = np.sum(np.abs(segment))
-        binary += '1' if echo_energy > 0.1 else '0'
-    message = ""
-    for i in range(0, len(binary), 8):
-        byte = binary[i:i + 8]
-        if len(byte) == 8:
-            message += chr(int(byte, 2))
+LOG_FLOOR = 1e-12
+BATCH_FRAMES = 256
+SYNC_STEPS = 32
+SYNC_FRAMES = 64
+
+def real_cepstrum(frames, workers=None):
+    spectrum = np.abs(sp_fft.rfft(frames, axis=-1, workers=workers))
+    spectrum += LOG_FLOOR
+    np.log(spectrum, out=spectrum)
+    return sp_fft.irfft(spectrum, n=frames.shape[-1], axis=-1, workers=workers)
+
+def bit_contrast(frames, d0, d1, workers=None):
+    contrast = np.empty(len(frames))
+    for start in range(0, len(frames), BATCH_FRAMES):
+        ceps = real_cepstrum(frames[start:start + BATCH_FRAMES], workers)
+        contrast[start:start + BATCH_FRAMES] = ceps[:, d1] - ceps[:, d0]
+    return contrast
+
+def find_offset(data, d0=200, d1=300, L=8192, workers=None, K=None):
+    # Coarse phase: cepstra of short sub-frames every hop samples, computed once; a
+    # frame starting at any multiple of hop scores the mean of the sub-frames inside
+    # it. Aligned frames hold a single bit, so their |d1 - d0| contrast is largest.
+    if data.ndim == 2:
+        data = data.mean(axis=1)
+    hop = max(L // SYNC_STEPS, 1)
+    width = min(max(L // 8, 2 * max(d0, d1) + 1), L)
+    nsub = (len(data) - width) // hop + 1
+    per_frame = (L - width) // hop + 1
+    if nsub < per_frame:
+        return 0
+    contrast = bit_contrast(sliding_window_view(data, width)[::hop][:nsub], d0, d1, workers)
+    cum = np.concatenate(([0.0], np.cumsum(contrast)))
+    frame_contrast = np.abs(cum[per_frame:] - cum[:-per_frame])
+    steps = L // hop
+    phase = hop * int(np.argmax([frame_contrast[p::steps].mean() for p in range(min(steps, len(frame_contrast)))]))
+
+    # Frame index: the echo starts where the |contrast| of the frames on the phase grid
+    # steps up. A frame cut by the clip start counts when at least half of it is left.
+    phase -= L if phase >= L // 2 else 0
+    grid = frame_contrasts(data, d0, d1, L, workers, offset=phase)
+    level = np.abs(grid)
+    excess = level - 0.5 * np.percentile(level, 90)
+    first = int(np.argmax(np.cumsum(excess[::-1])[::-1]))
+    coarse = phase + L * first
+
+    # Fine: the coarse phase leans into the K-sample ramp at the start of each frame.
+    # Cross-correlate the sub-frame contrasts with the contrast predicted by the
+    # decoded bits and the ramp, one sample at a time. An echo only shows in a
+    # sub-frame that also holds its source, so each sub-frame starts lag samples late.
+    K = min(L // 8 if K is None else K, L)
+    reach = K // 2 + hop
+    lag = max(d0, d1)
+    sign = np.where(grid[first:first + SYNC_FRAMES] > 0, 1.0, -1.0)
+    prev = np.concatenate((sign[:1], sign[:-1]))
+    model = np.repeat(sign[:, np.newaxis], L, axis=1)
+    ramp = 0.5 - 0.5 * np.cos(np.pi * (np.arange(K) + 0.5) / K)
+    model[:, :K] = prev[:, np.newaxis] + (sign - prev)[:, np.newaxis] * ramp
+    model = np.concatenate(([0.0], np.cumsum(np.concatenate((np.zeros(reach), model.ravel(), np.zeros(reach))))))
+    subs = np.arange(-(-max(coarse, 0) // hop), min(nsub, (coarse + len(sign) * L - width) // hop + 1))
+    offset = coarse
+    if len(subs):
+        shifts = np.arange(-reach, reach + 1)
+        pos = (subs * hop + lag - coarse + reach)[np.newaxis, :] - shifts[:, np.newaxis]
+        offset += int(shifts[np.argmax((model[pos + width - lag] - model[pos]) @ contrast[subs])])
+
+    # Framed message: an exact header sync word pins the frame index
+    for candidate in (offset, offset - L, offset + L):
+        try:
+            payload_length(decode_bits(data, d0, d1, L, workers, candidate, 0, HEADER_BITS), max_errors=0)
+            return candidate
+        except ValueError:
+            pass
+    return offset
+
+def frame_contrasts(data, d0=200, d1=300, L=8192, workers=None, offset=0, start=0, stop=None):
+    # Frames [start, stop), BATCH_FRAMES at a time, so data can be a memmap
+    data = shift_signal(data, offset)
+    nframe = len(data) // L if stop is None else min(stop, len(data) // L)
+    contrast = np.empty(max(nframe - start, 0))
+    for lo in range(start, nframe, BATCH_FRAMES):
+        hi = min(lo + BATCH_FRAMES, nframe)
+        block = np.asarray(data[lo * L:hi * L])
+        if block.ndim == 2:
+            block = block.mean(axis=1)
+        contrast[lo - start:hi - start] = bit_contrast(block.reshape(hi - lo, L), d0, d1, workers)
+    return contrast
+
+def decode_bits(data, d0=200, d1=300, L=8192, workers=None, offset=0, start=0, stop=None):
+    return (frame_contrasts(data, d0, d1, L, workers, offset, start, stop) > 0).astype(np.uint8)
+
+def decode_message(input_file, output_file, d0=200, d1=300, L=8192, sync=False):
+    data = np.load(input_file, mmap_mode='r')
+    offset = 0
+    if sync:
+        with profile_stage('sync'):
+            offset = find_offset(data, d0, d1, L)
+        print(f"Frame offset: {offset} samples")
+    with profile_stage('decode'):
+        # Framed message (exact sync word, good CRC): read only up to the declared
+        # length. Anything else is unframed text.
+        payload = read_payload(lambda start, stop: decode_bits(data, d0, d1, L, offset=offset, start=start, stop=stop),
+                               (len(data) - offset) // L)
+        if payload is None:
+            payload = decode_bits(data, d0, d1, L, offset=offset)
+        message = bits_to_text(payload)
     with open(output_file, 'w') as f:
         f.write(message)
     print(f"Decoded message saved to {output_file}")
 
 if __name__ == "__main__":
-    decode_message("decoded_preprocessed.npy", "decoded_message.txt")
\ No newline at end of file
+    decode_message("decoded_preprocessed.npy", "decoded_message.txt")
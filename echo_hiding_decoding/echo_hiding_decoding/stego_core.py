@@ -0,0 +1,827 @@
+import os
+import sys
+import json
+import time
+import wave
+import zlib
+import atexit
+import functools
+import importlib
+import contextlib
+import tracemalloc
+import numpy as np
+
+# Samples per chunk for the streamed peak scan and normalization
+CHUNK_SIZE = 1 << 20
+
+class LazyModule:
+    """
+    Stand-in for a module that is imported on first attribute access.
+
+    scipy.fft and scipy.io.wavfile cost a few hundred milliseconds to
+    import; scripts that never touch them (--help, 16-bit WAV I/O, text
+    and metric helpers) no longer pay for them at startup.
+    """
+
+    def __init__(self, name):
+        """
+        Args:
+            name (str): Dotted module name, e.g. 'scipy.fft'.
+        """
+        self._name = name
+        self._module = None
+
+    def load(self):
+        """
+        Import the module now, e.g. in a process pool initializer.
+
+        Returns:
+            module: The imported module.
+        """
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+sp_fft = LazyModule('scipy.fft')
+wavfile = LazyModule('scipy.io.wavfile')
+
+# Trace file that profiling appends to, e.g. ECHO_PROFILE=profile.json
+PROFILE_ENV = 'ECHO_PROFILE'
+# ECHO_PROFILE_MEMORY=0 skips tracemalloc, whose per-allocation hook
+# slows down the frame loops several times inside stages
+PROFILE_MEMORY_ENV = 'ECHO_PROFILE_MEMORY'
+
+def _io_counters():
+    """
+    Bytes this process has read and written so far, from /proc/self/io.
+
+    Returns:
+        tuple: (read_bytes, write_bytes), (0, 0) where /proc is not available.
+    """
+    counters = {}
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                counters[key] = int(value)
+    except (OSError, ValueError):
+        pass
+    return counters.get('rchar', 0), counters.get('wchar', 0)
+
+class Profiler:
+    """
+    Stage timer that appends one Chrome trace event per finished stage.
+
+    Each event records wall time, CPU time, bytes read and written
+    (syscall counters, so pages of a memory-mapped file are not counted)
+    and the peak tracemalloc allocation above the allocation at the
+    start of the stage. Allocations are only traced while a stage is
+    open, so imports and pool start-up outside stages run at full speed.
+    Events are appended to the trace file as soon as a stage ends, one
+    line each, so the processes of a batch run or a process pool can
+    share one file; it opens in chrome://tracing or Perfetto and is
+    summarized by summarize_trace.
+    """
+
+    def __init__(self, trace_file, memory=True):
+        """
+        Args:
+            trace_file (str): Trace file to append events to.
+            memory (bool): Trace allocations with tracemalloc.
+        """
+        self.trace_file = os.path.abspath(trace_file)
+        self.pid = os.getpid()
+        self.memory = memory
+        self._stack = []
+        # Whole process, written by close(); its peak is the largest stage peak
+        self._root = self._begin(trace=False)
+
+    def _begin(self, trace=True):
+        frame = {'alloc': 0, 'peak': 0, 'tracing': False}
+        if self.memory and trace:
+            if tracemalloc.is_tracing():
+                current, peak = tracemalloc.get_traced_memory()
+                if self._stack:
+                    self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+                if hasattr(tracemalloc, 'reset_peak'):  # Python 3.9+
+                    tracemalloc.reset_peak()
+                frame['alloc'] = frame['peak'] = current
+            else:
+                tracemalloc.start()
+                frame['tracing'] = True
+        frame.update(ts=time.time(), wall=time.perf_counter(), cpu=time.process_time(), io=_io_counters())
+        self._stack.append(frame)
+        return frame
+
+    def _end(self, frame, name, category, args):
+        wall = time.perf_counter() - frame['wall']
+        cpu = time.process_time() - frame['cpu']
+        read, written = _io_counters()
+        peak = frame['peak']
+        if tracemalloc.is_tracing():
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+        if frame['tracing']:
+            tracemalloc.stop()
+        if frame in self._stack:
+            self._stack.remove(frame)
+        if self._stack:
+            # Inner stages count towards the peak of the stage around them
+            self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+        event = {'name': name, 'cat': category, 'ph': 'X', 'pid': os.getpid(), 'tid': 0,
+                 'ts': round(frame['ts'] * 1e6), 'dur': round(wall * 1e6),
+                 'args': dict(args, cpu_ms=round(cpu * 1e3, 3), read_bytes=read - frame['io'][0],
+                              write_bytes=written - frame['io'][1])}
+        if self.memory:
+            event['args']['peak_alloc_bytes'] = peak - frame['alloc']
+        self.write_event(event)
+        return event
+
+    def write_event(self, event):
+        """
+        Append one event to the trace file.
+
+        The file is a Chrome trace in JSON array format without the
+        closing bracket, which the trace viewers accept.
+
+        Args:
+            event (dict): Chrome trace event.
+        """
+        fd = os.open(self.trace_file, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            try:
+                import fcntl
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            except ImportError:
+                pass
+            header = b"[\n" if os.fstat(fd).st_size == 0 else b""
+            os.write(fd, header + (json.dumps(event) + ",\n").encode('utf-8'))
+        finally:
+            os.close(fd)
+
+    @contextlib.contextmanager
+    def stage(self, name, **args):
+        """
+        Time the enclosed block as one stage.
+
+        Args:
+            name (str): Stage name, e.g. 'read_wav' or 'embed'.
+            **args: Extra values stored in the event, e.g. the file name.
+        """
+        frame = self._begin()
+        try:
+            yield
+        finally:
+            self._end(frame, name, 'stage', args)
+
+    def close(self):
+        """Write the whole-process event."""
+        if self._root is None:
+            return
+        script = os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else 'python'
+        self._end(self._root, script, 'process', {'argv': sys.argv[1:]})
+        self._root = None
+
+_profiler = None
+
+def enable_profiling(trace_file=None, memory=None):
+    """
+    Start recording stages to a Chrome trace file.
+
+    Also sets ECHO_PROFILE, so worker processes started from here record
+    into the same file. Calling it again while enabled does nothing.
+
+    Args:
+        trace_file (str): Trace file to append to (default: $ECHO_PROFILE,
+            else profile.json).
+        memory (bool): Trace allocations (default: unless
+            ECHO_PROFILE_MEMORY=0).
+
+    Returns:
+        Profiler: The active profiler.
+    """
+    global _profiler
+    if _profiler is None:
+        trace_file = trace_file or os.environ.get(PROFILE_ENV) or 'profile.json'
+        if memory is None:
+            memory = os.environ.get(PROFILE_MEMORY_ENV, '1') != '0'
+        _profiler = Profiler(trace_file, memory)
+        os.environ[PROFILE_ENV] = _profiler.trace_file
+        atexit.register(disable_profiling)
+    return _profiler
+
+def disable_profiling():
+    """Write the whole-process event and stop profiling, if it is enabled."""
+    global _profiler
+    if _profiler is not None and _profiler._root is not None and os.getpid() == _profiler.pid:
+        _profiler.close()
+        os.environ.pop(PROFILE_ENV, None)
+    _profiler = None
+
+def profiling_enabled():
+    """
+    Returns:
+        bool: Whether stages are being recorded.
+    """
+    return _profiler is not None
+
+def profile_stage(name, **args):
+    """
+    Context manager timing one stage; does nothing unless profiling is on.
+
+    Args:
+        name (str): Stage name.
+        **args: Extra values stored in the event.
+    """
+    if _profiler is None:
+        return contextlib.nullcontext()
+    return _profiler.stage(name, **args)
+
+def profiled(name):
+    """
+    Decorator recording every call of a function as a stage.
+
+    Args:
+        name (str): Stage name.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _profiler is None:
+                return func(*args, **kwargs)
+            with _profiler.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def add_profile_argument(parser):
+    """
+    Add the --profile [FILE] option to a script's argument parser.
+
+    Args:
+        parser (argparse.ArgumentParser): The script's parser.
+    """
+    parser.add_argument("--profile", nargs="?", const="profile.json", default=None, metavar="FILE",
+                        help=f"Append per-stage timings to a Chrome trace file (default: profile.json, env {PROFILE_ENV})")
+
+def read_trace(trace_file):
+    """
+    Read the events of a trace file, skipping a line cut short by a crash.
+
+    Args:
+        trace_file (str): Trace file written by Profiler.
+
+    Returns:
+        list: Chrome trace events.
+    """
+    events = []
+    with open(trace_file) as f:
+        for line in f:
+            line = line.strip().rstrip(',')
+            if line in ('', '[', ']'):
+                continue
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                continue
+    return events
+
+def summarize_trace(trace_file):
+    """
+    Aggregate the events of a (batch) trace per stage and script.
+
+    Args:
+        trace_file (str): Trace file written by Profiler.
+
+    Returns:
+        list: One dict per (category, name) with count, wall_s, cpu_s,
+            read_bytes, write_bytes (totals) and peak_alloc_bytes (max,
+            None without memory tracing), slowest total wall time first.
+    """
+    totals = {}
+    for event in read_trace(trace_file):
+        if event.get('ph') != 'X':
+            continue
+        row = totals.setdefault((event['cat'], event['name']), {
+            'category': event['cat'], 'name': event['name'], 'count': 0, 'wall_s': 0.0, 'cpu_s': 0.0,
+            'read_bytes': 0, 'write_bytes': 0, 'peak_alloc_bytes': None})
+        args = event.get('args', {})
+        row['count'] += 1
+        row['wall_s'] += event['dur'] / 1e6
+        row['cpu_s'] += args.get('cpu_ms', 0) / 1e3
+        row['read_bytes'] += args.get('read_bytes', 0)
+        row['write_bytes'] += args.get('write_bytes', 0)
+        if 'peak_alloc_bytes' in args:
+            row['peak_alloc_bytes'] = max(row['peak_alloc_bytes'] or 0, args['peak_alloc_bytes'])
+    return sorted(totals.values(), key=lambda row: -row['wall_s'])
+
+if os.environ.get(PROFILE_ENV):
+    enable_profiling()
+
+def wav_info(filename):
+    """
+    Read the header of a WAV file with the stdlib wave module.
+
+    Args:
+        filename (str): WAV file path.
+
+    Returns:
+        namedtuple: (nchannels, sampwidth, framerate, nframes, comptype, compname).
+    """
+    with wave.open(filename, 'rb') as wav:
+        return wav.getparams()
+
+@profiled('read_wav')
+def read_wav(filename, mmap=False):
+    """
+    Read a WAV file, returning the same (rate, data) as scipy.io.wavfile.read.
+
+    16-bit PCM, the only format the labs write, is read with the stdlib
+    wave module and numpy; other formats fall back to scipy.
+
+    Args:
+        filename (str): WAV file path.
+        mmap (bool): Memory-map the samples instead of reading them.
+
+    Returns:
+        tuple: (sample_rate, data) with data of shape (N,) or (N, channels).
+
+    Raises:
+        ValueError: If the file is not a valid WAV file.
+    """
+    try:
+        with open(filename, 'rb') as f, wave.open(f) as wav:
+            params = wav.getparams()
+            # wave stops reading at the start of the data chunk
+            offset = f.tell()
+    except (wave.Error, EOFError):
+        return wavfile.read(filename, mmap=mmap)
+    if params.sampwidth != 2:
+        return wavfile.read(filename, mmap=mmap)
+
+    channels = params.nchannels
+    nframes = min(params.nframes, (os.path.getsize(filename) - offset) // (2 * channels))
+    shape = (nframes, channels) if channels > 1 else (nframes,)
+    if nframes == 0:
+        data = np.zeros(shape, dtype='<i2')
+    elif mmap:
+        data = np.memmap(filename, dtype='<i2', mode='c', offset=offset, shape=shape)
+    else:
+        data = np.fromfile(filename, dtype='<i2', count=nframes * channels, offset=offset).reshape(shape)
+    return params.framerate, data
+
+@profiled('write_wav')
+def write_wav(filename, sample_rate, data, chunk_size=CHUNK_SIZE):
+    """
+    Write a WAV file like scipy.io.wavfile.write.
+
+    int16 data is written with the stdlib wave module, chunk by chunk;
+    other dtypes fall back to scipy.
+
+    Args:
+        filename (str): Output WAV file path.
+        sample_rate (int): Sample rate in Hz.
+        data (np.ndarray): Samples of shape (N,) or (N, channels).
+        chunk_size (int): Number of frames written per chunk.
+    """
+    if data.dtype != np.int16 or data.ndim > 2:
+        wavfile.write(filename, sample_rate, data)
+        return
+    with wave.open(filename, 'wb') as wav:
+        wav.setnchannels(1 if data.ndim == 1 else data.shape[1])
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        for start in range(0, len(data), chunk_size):
+            wav.writeframes(np.ascontiguousarray(data[start:start + chunk_size], dtype='<i2').tobytes())
+
+def pcm16_peak(data, chunk_size=CHUNK_SIZE):
+    """
+    Largest absolute sample value, scanned chunk by chunk.
+
+    Args:
+        data (np.ndarray): Integer audio samples, may be a memmap.
+        chunk_size (int): Number of samples per chunk.
+
+    Returns:
+        int: Peak absolute value.
+    """
+    peak = 0
+    for start in range(0, len(data), chunk_size):
+        chunk = data[start:start + chunk_size]
+        # Widen before abs so -32768 does not overflow
+        peak = max(peak, int(chunk.max()), -int(chunk.min()))
+    return peak
+
+@profiled('normalize')
+def save_normalized(data, output_npy, chunk_size=CHUNK_SIZE):
+    """
+    Scale 16-bit samples to float32 with peak 1 and save them as .npy.
+
+    The .npy is written through np.lib.format.open_memmap, so the peak
+    scan and the normalization run chunk by chunk and the whole signal
+    is never held in memory. The values equal
+    x / 32768 / max(|x / 32768|) computed on the full array.
+
+    Args:
+        data (np.ndarray): int16 samples, may be a memmap.
+        output_npy (str): Path to output .npy file.
+        chunk_size (int): Number of samples processed per chunk.
+    """
+    max_val = np.float32(pcm16_peak(data, chunk_size)) / np.float32(32768.0)
+    out = np.lib.format.open_memmap(output_npy, mode='w+', dtype=np.float32, shape=data.shape)
+    for start in range(0, len(data), chunk_size):
+        chunk = data[start:start + chunk_size].astype(np.float32) / np.float32(32768.0)
+        if max_val > 0:
+            chunk /= max_val
+        out[start:start + chunk_size] = chunk
+    out.flush()
+    del out
+
+def shift_signal(data, offset):
+    """
+    Move the start of a signal to a frame offset.
+
+    Args:
+        data (np.ndarray): Samples, 1D or (N x channels).
+        offset (int): Sample where the first frame starts. A negative
+            offset means the clip starts inside the first frame, which is
+            zero-padded.
+
+    Returns:
+        np.ndarray: The signal starting at the first frame.
+    """
+    if offset >= 0:
+        return data[offset:]
+    return np.concatenate((np.zeros((-offset,) + data.shape[1:], dtype=data.dtype), data))
+
+def get_bits(text):
+    """
+    Convert text to binary string (8-bit ASCII per character).
+
+    Args:
+        text (str): Input text.
+
+    Returns:
+        str: Binary string.
+    """
+    return ''.join(format(ord(c), '08b') for c in text)
+
+def length_prefixed(text):
+    """
+    Prepend the one-byte message length that stream_decode --length-prefix reads.
+
+    Args:
+        text (str): Message of 1 to 255 characters.
+
+    Returns:
+        str: chr(len(text)) followed by text.
+
+    Raises:
+        ValueError: If text is empty or longer than 255 characters.
+    """
+    if not 1 <= len(text) <= 255:
+        raise ValueError("A length-prefixed message must have 1 to 255 characters!")
+    return chr(len(text)) + text
+
+def bits_to_text(bits):
+    """
+    Pack bits into 8-bit characters, dropping trailing padding.
+
+    Args:
+        bits (np.ndarray): 0/1 values; a partial last byte is ignored.
+
+    Returns:
+        str: Decoded text without trailing NUL characters.
+    """
+    nbyte = len(bits) // 8
+    message = np.packbits(np.asarray(bits[:nbyte * 8], dtype=np.uint8)).tobytes().decode('latin-1')
+    return message.rstrip('\x00')
+
+# Payload framing: sync word, payload length in bits, payload, CRC32.
+# ASCII text can come within one bit of the sync word ('l' is 0x6C, the sync
+# word starts 0xEC), so read_payload, which guesses whether a carrier is
+# framed, needs an exact sync word and a good CRC. Decoders told the message
+# is framed tolerate up to SYNC_ERRORS flipped sync bits.
+FRAME_SYNC = 0xEC5A
+SYNC_BITS = 16
+SYNC_ERRORS = 2
+LENGTH_BITS = 32
+CRC_BITS = 32
+HEADER_BITS = SYNC_BITS + LENGTH_BITS
+FRAMING_BITS = HEADER_BITS + CRC_BITS
+
+def _uint_bits(value, nbit):
+    return (value >> np.arange(nbit - 1, -1, -1)) & 1
+
+def _bits_uint(bits):
+    return int(''.join(str(int(b)) for b in bits), 2) if len(bits) else 0
+
+def _crc_bits(bits):
+    crc = zlib.crc32(np.packbits(np.asarray(bits, dtype=np.uint8)).tobytes())
+    return _uint_bits(crc, CRC_BITS).astype(np.uint8)
+
+def frame_payload(bits):
+    """
+    Wrap payload bits in a frame: sync word, payload length, payload, CRC32.
+
+    The CRC covers the header and the payload, so a corrupted length is
+    caught as well.
+
+    Args:
+        bits (str or array-like): '0'/'1' string as from get_bits, or 0/1 values.
+
+    Returns:
+        str or np.ndarray: Framed bits, a '0'/'1' string if bits was one,
+            otherwise a uint8 array.
+    """
+    as_text = isinstance(bits, str)
+    if as_text:
+        bits = np.frombuffer(bits.encode('ascii'), dtype=np.uint8) - ord('0')
+    bits = np.asarray(bits, dtype=np.uint8)
+    if len(bits) >= 1 << LENGTH_BITS:
+        raise ValueError("Payload is too long to frame!")
+    header = np.concatenate((_uint_bits(FRAME_SYNC, SYNC_BITS), _uint_bits(len(bits), LENGTH_BITS)))
+    framed = np.concatenate((header.astype(np.uint8), bits))
+    framed = np.concatenate((framed, _crc_bits(framed)))
+    if as_text:
+        return (framed + ord('0')).tobytes().decode('ascii')
+    return framed
+
+def framed_length(payload_nbit):
+    """
+    Number of bits a framed payload takes.
+
+    Args:
+        payload_nbit (int): Payload bits.
+
+    Returns:
+        int: payload_nbit plus the header and CRC.
+    """
+    return payload_nbit + FRAMING_BITS
+
+def payload_length(header, max_errors=SYNC_ERRORS):
+    """
+    Read the declared payload length from the first HEADER_BITS bits.
+
+    Args:
+        header (array-like): At least HEADER_BITS decoded 0/1 values.
+        max_errors (int): Number of flipped sync word bits to tolerate.
+
+    Returns:
+        int: Payload length in bits.
+
+    Raises:
+        ValueError: If the bits are too few or do not start with the sync word.
+    """
+    header = np.asarray(header)
+    if (len(header) < HEADER_BITS
+            or np.count_nonzero(header[:SYNC_BITS] != _uint_bits(FRAME_SYNC, SYNC_BITS)) > max_errors):
+        raise ValueError("No payload frame header found!")
+    return _bits_uint(header[SYNC_BITS:HEADER_BITS])
+
+def unframe_payload(bits):
+    """
+    Strip the frame from decoded bits and check the CRC.
+
+    Args:
+        bits (array-like): Decoded 0/1 values starting at the frame header;
+            bits after the frame are ignored.
+
+    Returns:
+        tuple: (payload, crc_ok) where payload is a uint8 array of the
+            declared length, or shorter if bits end early (crc_ok is then
+            False).
+
+    Raises:
+        ValueError: If bits do not start with a frame header.
+    """
+    bits = np.asarray(bits, dtype=np.uint8)
+    nbit = payload_length(bits)
+    total = framed_length(nbit)
+    payload = bits[HEADER_BITS:HEADER_BITS + nbit]
+    crc_ok = len(bits) >= total and np.array_equal(_crc_bits(bits[:HEADER_BITS + nbit]), bits[HEADER_BITS + nbit:total])
+    return payload, bool(crc_ok)
+
+def read_payload(read_bits, capacity):
+    """
+    Decode a framed payload, reading no further than its declared length.
+
+    The header is decoded first; the rest of the carrier is only decoded
+    up to the end of the frame. The carrier may hold unframed text, so
+    the sync word must match exactly and the CRC must check out.
+
+    Args:
+        read_bits (callable): read_bits(start, stop) returns the decoded
+            0/1 values for bit positions [start, stop).
+        capacity (int): Number of bits the carrier holds.
+
+    Returns:
+        np.ndarray: Payload bits, or None if the carrier does not hold a
+            valid frame and should be decoded as unframed text.
+    """
+    if capacity < HEADER_BITS:
+        return None
+    header = np.asarray(read_bits(0, HEADER_BITS))
+    try:
+        total = framed_length(payload_length(header, max_errors=0))
+    except ValueError:
+        return None
+    if total > capacity:
+        return None
+    payload, crc_ok = unframe_payload(np.concatenate((header, read_bits(HEADER_BITS, total))))
+    return payload if crc_ok else None
+
+# Embedding helpers shared by the echo_steganography and time_spread_encoding
+# embedders: bit layout, mixing signal, block iteration and WAV output.
+
+def prepare_bits(signal, text, max_delay, L, framed=False):
+    """
+    Validate the embedding parameters and build the padded bit string.
+
+    Args:
+        signal (np.ndarray): Preprocessed audio signal (2D: N x channels).
+        text (str): Text to embed.
+        max_delay (int): Delay of the last echo tap (samples).
+        L (int): Frame length.
+        framed (bool): Wrap the text in a header with its length and a
+            CRC32 (see frame_payload).
+
+    Returns:
+        tuple: (bits, max_bits) where bits is padded to max_bits characters.
+
+    Raises:
+        ValueError: If signal is invalid or too short.
+    """
+    if not isinstance(signal, np.ndarray) or signal.ndim != 2:
+        raise ValueError("Signal must be a 2D NumPy array (N x channels)!")
+    if L <= max_delay:
+        raise ValueError("Frame length L must be greater than the longest echo delay!")
+
+    s_len = signal.shape[0]
+    if s_len < L * 8:
+        raise ValueError("Audio signal is too short to embed any message!")
+
+    bits = get_bits(text)
+    nframe = s_len // L
+    max_bits = nframe - (nframe % 8)
+    if framed:
+        max_chars = (max_bits - FRAMING_BITS) // 8
+        if max_chars < 1:
+            raise ValueError("Audio signal is too short to embed a framed message!")
+        if len(text) > max_chars:
+            print(f"Warning: Message truncated to {max_chars} characters.")
+            bits = bits[:max_chars * 8]
+        bits = frame_payload(bits)
+    elif len(bits) > max_bits:
+        print(f"Warning: Message truncated to {max_bits // 8} characters.")
+        bits = bits[:max_bits]
+    bits = bits + '0' * (max_bits - len(bits))
+    return bits, max_bits
+
+def signal_blocks(signal, block_size, start=0, stop=None):
+    """
+    Yield consecutive blocks of a 2D signal (N x channels).
+
+    Args:
+        signal (np.ndarray): Audio signal, may be a memmap.
+        block_size (int): Number of samples per block.
+        start (int): First sample index.
+        stop (int): One past the last sample index (default: end of signal).
+    """
+    stop = signal.shape[0] if stop is None else stop
+    for lo in range(start, stop, block_size):
+        yield np.asarray(signal[lo:min(lo + block_size, stop)])
+
+def transition_ramp(K, dtype=np.float64):
+    """
+    Raised-cosine ramp from 0 to 1 over K samples.
+
+    Args:
+        K (int): Transition length in samples.
+        dtype (np.dtype): Output dtype.
+
+    Returns:
+        np.ndarray: Ramp values.
+    """
+    return (0.5 - 0.5 * np.cos(np.pi * (np.arange(K) + 0.5) / K)).astype(dtype)
+
+def mix_weights(start, stop, L, bits_array, ramp):
+    """
+    Compute mixer(L, bits, 0, 1) for samples [start, stop) only.
+
+    Args:
+        start (int): First sample index.
+        stop (int): One past the last sample index.
+        L (int): Frame length.
+        bits_array (np.ndarray): Bits as integers.
+        ramp (np.ndarray): Transition ramp from transition_ramp.
+
+    Returns:
+        np.ndarray: Mixing signal for the requested samples.
+    """
+    # Build whole frames, then cut out [start, stop)
+    first = start // L
+    frames = np.arange(first, -(-stop // L))
+    cur = bits_array[frames].astype(ramp.dtype)
+    prev = bits_array[np.maximum(frames - 1, 0)].astype(ramp.dtype)
+    K = min(len(ramp), L)
+    m_sig = np.empty((len(frames), L), dtype=ramp.dtype)
+    m_sig[:, K:] = cur[:, np.newaxis]
+    m_sig[:, :K] = prev[:, np.newaxis] + (cur - prev)[:, np.newaxis] * ramp[:K]
+    return m_sig.ravel()[start - first * L:stop - first * L]
+
+def mixer(L, bits, lower, upper, K=None):
+    """
+    Create a mixing signal for embedding bits.
+
+    Each frame holds its bit value; the first K samples of a frame ramp
+    from the previous bit with a raised cosine to avoid hard switches.
+
+    Args:
+        L (int): Frame length.
+        bits (str): Binary string.
+        lower (float): Value for bit 0.
+        upper (float): Value for bit 1.
+        K (int): Transition length in samples (default: L // 8).
+
+    Returns:
+        np.ndarray: Mixing signal.
+    """
+    N = len(bits)
+    bits_array = np.array([int(b) for b in bits])
+    m_sig = mix_weights(0, N * L, L, bits_array, transition_ramp(L // 8 if K is None else K))
+    return lower + (upper - lower) * m_sig
+
+@profiled('audiosave')
+def audiosave(out_signal, sample_rate, filename):
+    """
+    Save audio signal as a 16-bit WAV file.
+
+    Args:
+        out_signal (np.ndarray): Audio signal to save.
+        sample_rate (int): Sample rate in Hz.
+        filename (str): Output WAV file path.
+    """
+    if np.any(np.abs(out_signal) > 1):
+        print("Warning: Clipping detected, signal normalized.")
+        out_signal = np.clip(out_signal, -1, 1)
+    out_signal_int16 = np.int16(out_signal * 32767)
+    write_wav(filename, sample_rate, out_signal_int16)
+
+def calculate_ber(original, decoded):
+    """
+    Character error rate over the common length, in percent.
+
+    Args:
+        original (str): Embedded message.
+        decoded (str): Decoded message.
+
+    Returns:
+        float: Percentage of differing characters (100.0 if either message is empty).
+    """
+    if len(original) == 0 or len(decoded) == 0:
+        return 100.0
+    min_len = min(len(original), len(decoded))
+    errors = sum(o != d for o, d in zip(original[:min_len], decoded[:min_len]))
+    ber = errors / min_len * 100
+    return ber
+
+def calculate_nc(original, decoded):
+    """
+    Normalized correlation of the character codes over the common length.
+
+    Args:
+        original (str): Embedded message.
+        decoded (str): Decoded message.
+
+    Returns:
+        float: Correlation in [0, 1] (0.0 if either message is empty).
+    """
+    if len(original) == 0 or len(decoded) == 0:
+        return 0.0
+    min_len = min(len(original), len(decoded))
+    original = original[:min_len]
+    decoded = decoded[:min_len]
+    s1 = sum(ord(o) * ord(d) for o, d in zip(original, decoded))
+    s2 = np.sqrt(sum(ord(o)**2 for o in original) * sum(ord(d)**2 for d in decoded))
+    return s1 / s2 if s2 != 0 else 0.0
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Summarize a profiling trace written with --profile or ECHO_PROFILE.")
+    parser.add_argument("trace_file", help="Trace file, e.g. profile.json")
+    args = parser.parse_args()
+
+    try:
+        rows = summarize_trace(args.trace_file)
+        print(f"{'stage':<28}{'count':>7}{'wall s':>10}{'cpu s':>10}{'read MB':>10}{'written MB':>12}{'peak alloc MB':>15}")
+        for row in rows:
+            name = row['name'] if row['category'] == 'stage' else f"[{row['name']}]"
+            peak = '-' if row['peak_alloc_bytes'] is None else f"{row['peak_alloc_bytes'] / 1e6:.1f}"
+            print(f"{name:<28}{row['count']:>7}{row['wall_s']:>10.3f}{row['cpu_s']:>10.3f}"
+                  f"{row['read_bytes'] / 1e6:>10.1f}{row['write_bytes'] / 1e6:>12.1f}{peak:>15}")
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
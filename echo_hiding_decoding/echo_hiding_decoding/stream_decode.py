@@ -0,0 +1,136 @@
+import sys
+import wave
+import argparse
+import numpy as np
+from decode_message import decode_bits
+from stego_core import HEADER_BITS, add_profile_argument, enable_profiling, framed_length, payload_length, unframe_payload
+
+CHUNK_FRAMES = 65536
+TERMINATOR = b'\x00'
+
+def wav_chunks(input_file, chunk_frames=CHUNK_FRAMES):
+    with wave.open(input_file, 'rb') as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError("Only 16-bit WAV files are supported!")
+        channels = wav.getnchannels()
+        while True:
+            raw = wav.readframes(chunk_frames)
+            if not raw:
+                break
+            yield np.frombuffer(raw, dtype='<i2').reshape(-1, channels)
+
+def pcm_chunks(stream, channels=1, chunk_frames=CHUNK_FRAMES):
+    # Raw little-endian int16 PCM, e.g. from arecord or ffmpeg -f s16le
+    frame_bytes = 2 * channels
+    read = getattr(stream, 'read1', stream.read)
+    rest = b''
+    while True:
+        raw = read(chunk_frames * frame_bytes)
+        if not raw:
+            break
+        raw = rest + raw
+        usable = len(raw) - len(raw) % frame_bytes
+        rest = raw[usable:]
+        if usable:
+            yield np.frombuffer(raw[:usable], dtype='<i2').reshape(-1, channels)
+
+def stream_bits(chunks, d0=200, d1=300, L=8192):
+    # Yield the bits of the frames completed by each chunk
+    pending = np.zeros(0, dtype=np.float32)
+    for chunk in chunks:
+        samples = chunk.astype(np.float32)
+        if samples.ndim == 2:
+            samples = samples.mean(axis=1)
+        pending = np.concatenate((pending, samples / 32768.0))
+        nframe = len(pending) // L
+        if nframe == 0:
+            continue
+        yield decode_bits(pending[:nframe * L], d0, d1, L)
+        pending = pending[nframe * L:]
+
+def stream_decode(chunks, d0=200, d1=300, L=8192, terminator=TERMINATOR, length=None, length_prefix=False):
+    # Yield each byte as soon as its 8 frames have arrived. Stops at the
+    # terminator (not yielded), after length bytes, or after the length
+    # given by a one-byte prefix (embed.py --length-prefix).
+    bits = np.zeros(0, dtype=np.uint8)
+    remaining = length
+    for new_bits in stream_bits(chunks, d0, d1, L):
+        bits = np.concatenate((bits, new_bits))
+        nbyte = len(bits) // 8
+        for byte in np.packbits(bits[:nbyte * 8]).tobytes():
+            if length_prefix:
+                if byte == 0:
+                    raise ValueError("Length prefix is 0, the message is not length-prefixed")
+                remaining = byte
+                length_prefix = False
+            elif terminator is not None and bytes([byte]) == terminator:
+                return
+            else:
+                yield bytes([byte])
+                remaining = None if remaining is None else remaining - 1
+            if remaining == 0:
+                return
+        bits = bits[nbyte * 8:]
+
+def stream_payload(chunks, d0=200, d1=300, L=8192):
+    # Message embedded with a frame header (embed.py --framed): yield each byte as
+    # soon as it has arrived, stop at the declared length and check the CRC
+    bits = np.zeros(0, dtype=np.uint8)
+    nbit = None
+    sent = 0
+    for new_bits in stream_bits(chunks, d0, d1, L):
+        bits = np.concatenate((bits, new_bits))
+        if nbit is None:
+            if len(bits) < HEADER_BITS:
+                continue
+            nbit = payload_length(bits)
+        ready = min(len(bits) - HEADER_BITS, nbit) // 8
+        for byte in np.packbits(bits[HEADER_BITS + sent * 8:HEADER_BITS + ready * 8]).tobytes():
+            yield bytes([byte])
+        sent = ready
+        if len(bits) >= framed_length(nbit):
+            if not unframe_payload(bits)[1]:
+                raise ValueError("CRC mismatch, the decoded message is corrupted")
+            return
+    raise ValueError("Audio ended before the end of the framed message")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Decode an echo-hidden message while the audio is still arriving.")
+    parser.add_argument("input", nargs='?', default="output.wav", help="16-bit WAV file, or - for raw int16 PCM on stdin")
+    parser.add_argument("--channels", type=int, default=1, help="Channels of the raw PCM on stdin")
+    parser.add_argument("--d0", type=int, default=200, help="Delay for bit 0")
+    parser.add_argument("--d1", type=int, default=300, help="Delay for bit 1")
+    parser.add_argument("--L", type=int, default=8192, help="Frame length")
+    parser.add_argument("--length", type=int, default=None, help="Stop after this many message bytes")
+    parser.add_argument("--length-prefix", action="store_true", help="First decoded byte is the message length (embed.py --length-prefix)")
+    parser.add_argument("--no-terminator", action="store_true", help="Do not stop at a NUL byte")
+    parser.add_argument("--framed", action="store_true", help="Message has a length header and CRC32 (embed.py --framed)")
+    parser.add_argument("--output", default=None, help="Also save the message to this file")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    if args.profile:
+        enable_profiling(args.profile)
+
+    try:
+        if args.input == '-':
+            chunks = pcm_chunks(sys.stdin.buffer, args.channels)
+        else:
+            chunks = wav_chunks(args.input)
+        terminator = None if args.no_terminator else TERMINATOR
+        if args.framed:
+            decoded = stream_payload(chunks, args.d0, args.d1, args.L)
+        else:
+            decoded = stream_decode(chunks, args.d0, args.d1, args.L, terminator, args.length, args.length_prefix)
+        message = b''
+        for byte in decoded:
+            message += byte
+            sys.stdout.buffer.write(byte)
+            sys.stdout.buffer.flush()
+        sys.stdout.write("\n")
+        if args.output:
+            with open(args.output, 'w') as f:
+                f.write(message.decode('latin-1'))
+            print(f"Decoded message saved to {args.output}")
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
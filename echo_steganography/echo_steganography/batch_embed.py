@@ -0,0 +1,149 @@
+import os
+import csv
+import time
+import wave
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from stego_core import add_profile_argument, enable_profiling, profile_stage
+
+def read_manifest(manifest_file):
+    """
+    Read embedding jobs from a CSV manifest with input, output and message columns.
+    
+    Args:
+        manifest_file (str): Path to the manifest CSV file.
+    
+    Returns:
+        list: (input_wav, output_wav, message) tuples.
+    
+    Raises:
+        ValueError: If the manifest is missing a column.
+    """
+    with open(manifest_file, newline='') as f:
+        reader = csv.DictReader(f)
+        missing = {'input', 'output', 'message'} - set(reader.fieldnames or [])
+        if missing:
+            raise ValueError(f"Manifest is missing column(s): {', '.join(sorted(missing))}")
+        return [(row['input'], row['output'], row['message']) for row in reader]
+
+def directory_jobs(input_dir, output_dir, message):
+    """
+    Build one job per WAV file in a directory, all with the same message.
+    
+    Args:
+        input_dir (str): Directory of host WAV files.
+        output_dir (str): Directory for the embedded WAV files (created if needed).
+        message (str): Text to embed in every file.
+    
+    Returns:
+        list: (input_wav, output_wav, message) tuples.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    names = sorted(n for n in os.listdir(input_dir) if n.lower().endswith('.wav'))
+    return [(os.path.join(input_dir, n), os.path.join(output_dir, n), message) for n in names]
+
+def _warm_worker():
+    """Import the embedding stack once per worker process."""
+    import embed  # noqa: F401
+
+def _embed_job(job, block_size, framed=False):
+    """
+    Embed one file in a worker process.
+    
+    Args:
+        job (tuple): (input_wav, output_wav, message).
+        block_size (int): Number of samples processed per block.
+        framed (bool): Embed the message with a length header and CRC32.
+    
+    Returns:
+        dict: Input, output, wall seconds, audio seconds, stage timings and error (None on success).
+    """
+    from embed import echo_embed_wav
+    input_wav, output_wav, message = job
+    result = {'input': input_wav, 'output': output_wav, 'seconds': 0.0, 'audio_seconds': 0.0,
+              'timings': {}, 'error': None}
+    t0 = time.perf_counter()
+    try:
+        with profile_stage('embed_file', input=input_wav):
+            with wave.open(input_wav, 'rb') as wav:
+                result['audio_seconds'] = wav.getnframes() / wav.getframerate()
+            result['timings'] = echo_embed_wav(input_wav, output_wav, message, block_size=block_size,
+                                                 framed=framed)
+    except Exception as e:
+        result['error'] = str(e) or type(e).__name__
+    result['seconds'] = time.perf_counter() - t0
+    return result
+
+def batch_embed(jobs, workers=None, block_size=262144, report_file=None, framed=False):
+    """
+    Embed many files across a pool of warm worker processes.
+    
+    Each worker imports numpy/scipy once and streams every file it gets
+    through echo_embed_wav, so memory per worker stays bounded by block_size.
+    
+    Args:
+        jobs (list): (input_wav, output_wav, message) tuples.
+        workers (int): Number of worker processes (default: CPU count).
+        block_size (int): Number of samples processed per block.
+        report_file (str): Optional CSV file for the per-file timings.
+        framed (bool): Embed the messages with a length header and CRC32.
+    
+    Returns:
+        list: Per-file result dicts in job order.
+    """
+    t0 = time.perf_counter()
+    results = [None] * len(jobs)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_warm_worker) as pool:
+        futures = {pool.submit(_embed_job, job, block_size, framed): i for i, job in enumerate(jobs)}
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            if result['error'] is None:
+                print(f"ok      {result['input']} -> {result['output']}  {result['seconds']:.2f} s "
+                      f"({result['audio_seconds']:.1f} s of audio)")
+            else:
+                print(f"FAILED  {result['input']}: {result['error']}")
+    wall = time.perf_counter() - t0
+    
+    done = [r for r in results if r['error'] is None]
+    audio = sum(r['audio_seconds'] for r in done)
+    print(f"Embedded {len(done)}/{len(jobs)} files, {len(jobs) - len(done)} failed")
+    print(f"Audio: {audio:.1f} s in {wall:.2f} s wall, throughput {audio / wall if wall > 0 else 0:.1f} audio-s/s")
+    
+    if report_file:
+        stages = ('open', 'scan', 'embed', 'write')
+        with open(report_file, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['input', 'output', 'audio_seconds', 'seconds'] + list(stages) + ['error'])
+            for r in results:
+                writer.writerow([r['input'], r['output'], f"{r['audio_seconds']:.3f}", f"{r['seconds']:.3f}"]
+                                + [f"{r['timings'].get(s, 0):.3f}" for s in stages] + [r['error'] or ''])
+        print(f"Per-file timings saved to {report_file}")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embed text in many WAV files in parallel.")
+    parser.add_argument("source", help="Manifest CSV (input,output,message) or a directory of WAV files")
+    parser.add_argument("--output-dir", default="embedded", help="Output directory when source is a directory")
+    parser.add_argument("--message", default=None, help="Text to embed when source is a directory")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes")
+    parser.add_argument("--block-size", type=int, default=262144, help="Samples per block")
+    parser.add_argument("--report", default=None, help="CSV file for per-file timings")
+    parser.add_argument("--framed", action="store_true", help="Add a length header and CRC32 to each message")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    if args.profile:
+        enable_profiling(args.profile)
+    
+    try:
+        if os.path.isdir(args.source):
+            if args.message is None:
+                raise ValueError("--message is required when source is a directory!")
+            jobs = directory_jobs(args.source, args.output_dir, args.message)
+        else:
+            jobs = read_manifest(args.source)
+        results = batch_embed(jobs, args.workers, args.block_size, args.report, args.framed)
+        if any(r['error'] is not None for r in results):
+            raise SystemExit(1)
+    except Exception as e:
+        print(f"Error: {e}")
@@ -0,0 +1,78 @@
+import os
+import sys
+import json
+import socket
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SOCKET_PATH = os.environ.get('ECHO_SERVICE_SOCKET', os.path.join(HERE, '.echo_service.sock'))
+
+USAGE = """usage: echo_client.py [--socket PATH] SCRIPT [ARGS ...]
+       echo_client.py [--socket PATH] --ping | --stop
+
+Run SCRIPT (e.g. task4_detect.py) with its usual ARGS on the warm
+echo_service.py. Without a running service the script is run directly."""
+
+def request(message, socket_path=SOCKET_PATH):
+    """
+    Send one JSON request to the service and return its reply.
+
+    Args:
+        message (dict): Request, e.g. {'script': ..., 'args': [...], 'cwd': ...}.
+        socket_path (str): Path of the service's Unix socket.
+
+    Returns:
+        dict: Decoded reply.
+
+    Raises:
+        OSError: If no service is listening on socket_path.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall((json.dumps(message) + "\n").encode('utf-8'))
+        with sock.makefile('rb') as reply:
+            return json.loads(reply.readline())
+
+def run(script, args, socket_path=SOCKET_PATH):
+    """
+    Run a script on the service, falling back to a local run.
+
+    Args:
+        script (str): Script name, e.g. task3_embed_positive.py.
+        args (list): The script's usual command line arguments.
+        socket_path (str): Path of the service's Unix socket.
+
+    Returns:
+        int: Exit status of the script.
+    """
+    try:
+        reply = request({'script': script, 'args': args, 'cwd': os.getcwd()}, socket_path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        # No service: same command, paying the usual startup cost
+        path = os.path.join(HERE, script if script.endswith('.py') else script + '.py')
+        os.execv(sys.executable, [sys.executable, path] + args)
+    sys.stdout.buffer.write(reply['stdout'].encode('utf-8', 'surrogateescape'))
+    sys.stdout.flush()
+    sys.stderr.write(reply['stderr'])
+    return reply['status']
+
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+    socket_path = SOCKET_PATH
+    if argv[:1] == ['--socket'] and len(argv) > 1:
+        socket_path, argv = argv[1], argv[2:]
+    if not argv or argv[0] in ('-h', '--help'):
+        print(USAGE)
+        sys.exit(0 if argv else 2)
+
+    try:
+        if argv[0] in ('--ping', '--stop'):
+            reply = request({'command': argv[0][2:]}, socket_path)
+            if argv[0] == '--ping':
+                print(f"Service on {socket_path}: {reply['jobs']} jobs served, warm modules: {', '.join(reply['modules'])}")
+            else:
+                print("Service stopping")
+            sys.exit(reply['status'])
+        sys.exit(run(argv[0], argv[1:], socket_path))
+    except OSError as e:
+        print(f"Error: no service on {socket_path} ({e})", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,199 @@
+import io
+import os
+import sys
+import json
+import time
+import runpy
+import socket
+import argparse
+import importlib
+import threading
+import traceback
+import contextlib
+import socketserver
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SOCKET_PATH = os.environ.get('ECHO_SERVICE_SOCKET', os.path.join(HERE, '.echo_service.sock'))
+
+# Imported once at startup
+WARM_PACKAGES = ('numpy', 'scipy.fft', 'scipy.io.wavfile', 'scipy.signal')
+# Lab modules, skipped when they are not in this directory
+WARM_MODULES = ('stego_core', 'echo_kernel', 'echo_engine', 'embed', 'preprocess', 'decode_message')
+
+# Not runnable as jobs
+SERVICE_SCRIPTS = ('echo_service.py', 'echo_client.py')
+
+def warm_up():
+    """
+    Import the heavy modules and build the default windows once.
+
+    Returns:
+        list: Names of the modules that were imported.
+    """
+    loaded = list(WARM_PACKAGES)
+    loaded += [name for name in WARM_MODULES if os.path.exists(os.path.join(HERE, name + '.py'))]
+    for name in loaded:
+        importlib.import_module(name)
+    if 'echo_engine' in sys.modules:
+        # Watermark frame length
+        sys.modules['echo_engine'].hann(4096)
+    return loaded
+
+def script_path(script):
+    """
+    Resolve a job's script name to a script in this directory.
+
+    Args:
+        script (str): Script name, with or without .py.
+
+    Returns:
+        str: Absolute path of the script.
+
+    Raises:
+        ValueError: If the name is not a script next to the service.
+    """
+    name = script if script.endswith('.py') else script + '.py'
+    path = os.path.join(HERE, name)
+    if os.path.basename(name) != name or name in SERVICE_SCRIPTS or not os.path.isfile(path):
+        raise ValueError(f"Unknown script: {script}")
+    return path
+
+def run_job(script, args, cwd):
+    """
+    Run one script with its usual command line inside the warm interpreter.
+
+    The script runs as __main__ with sys.argv, the working directory and
+    stdout/stderr swapped for the duration of the job. Modules it imports
+    (echo_engine, embed, ...) stay loaded, so their caches carry over to
+    the next job. stdin is empty. Profiling a job turned on with
+    --profile is turned off again when the job ends.
+
+    Args:
+        script (str): Script name, e.g. task3_embed_positive.py.
+        args (list): Command line arguments after the script name.
+        cwd (str): Client working directory relative paths resolve against.
+
+    Returns:
+        dict: Exit status, captured stdout and stderr, and wall seconds.
+
+    Raises:
+        ValueError: If script is not a script next to the service.
+    """
+    path = script_path(script)
+    out = io.TextIOWrapper(io.BytesIO(), encoding='utf-8', write_through=True)
+    err = io.TextIOWrapper(io.BytesIO(), encoding='utf-8', write_through=True)
+    saved = sys.argv, sys.stdin, os.getcwd()
+    profiling = 'stego_core' in sys.modules and sys.modules['stego_core'].profiling_enabled()
+    status = 0
+    t0 = time.perf_counter()
+    try:
+        os.chdir(cwd)
+        sys.argv = [path] + list(args)
+        sys.stdin = io.TextIOWrapper(io.BytesIO(), encoding='utf-8')
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            try:
+                runpy.run_path(path, run_name='__main__')
+            except SystemExit as e:
+                if isinstance(e.code, int) or e.code is None:
+                    status = e.code or 0
+                else:
+                    print(e.code, file=sys.stderr)
+                    status = 1
+    except Exception:
+        err.write(traceback.format_exc())
+        status = 1
+    finally:
+        if 'stego_core' in sys.modules and not profiling:
+            sys.modules['stego_core'].disable_profiling()
+        sys.argv, sys.stdin = saved[0], saved[1]
+        os.chdir(saved[2])
+    return {'status': status,
+            'stdout': out.buffer.getvalue().decode('utf-8', 'surrogateescape'),
+            'stderr': err.buffer.getvalue().decode('utf-8', 'surrogateescape'),
+            'seconds': time.perf_counter() - t0}
+
+class JobHandler(socketserver.StreamRequestHandler):
+    """One JSON request line in, one JSON reply line out."""
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return  # connection probe, e.g. from _remove_stale_socket
+        try:
+            request = json.loads(line)
+            if request.get('command') == 'ping':
+                reply = {'status': 0, 'modules': self.server.modules, 'jobs': self.server.jobs}
+            elif request.get('command') == 'stop':
+                reply = {'status': 0}
+                # shutdown() waits for serve_forever, so it cannot run in this handler
+                threading.Thread(target=self.server.shutdown).start()
+            else:
+                reply = run_job(request['script'], request.get('args', []), request.get('cwd', HERE))
+                self.server.jobs += 1
+        except (ValueError, KeyError, TypeError) as e:
+            reply = {'status': 2, 'stdout': '', 'stderr': f"Error: bad request ({e})\n"}
+        self.wfile.write((json.dumps(reply) + "\n").encode('utf-8'))
+
+class EchoService(socketserver.UnixStreamServer):
+    """Sequential Unix socket server; jobs share one warm interpreter."""
+
+    def __init__(self, socket_path, modules):
+        self.modules = modules
+        self.jobs = 0
+        super().__init__(socket_path, JobHandler)
+
+def _remove_stale_socket(socket_path):
+    """
+    Remove a socket file left behind by a service that is no longer running.
+
+    Raises:
+        RuntimeError: If a service is already listening on the socket.
+    """
+    if not os.path.exists(socket_path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            os.unlink(socket_path)
+            return
+    raise RuntimeError(f"A service is already listening on {socket_path}")
+
+def serve(socket_path=SOCKET_PATH):
+    """
+    Warm up and serve jobs on a Unix socket until stopped.
+
+    Args:
+        socket_path (str): Path of the Unix domain socket.
+    """
+    t0 = time.perf_counter()
+    modules = warm_up()
+    _remove_stale_socket(socket_path)
+    old_umask = os.umask(0o177)
+    try:
+        server = EchoService(socket_path, modules)
+    finally:
+        os.umask(old_umask)
+    print(f"Warmed up {', '.join(modules)} in {time.perf_counter() - t0:.2f} s")
+    print(f"Listening on {socket_path}")
+    sys.stdout.flush()
+    try:
+        with server:
+            server.serve_forever(poll_interval=0.2)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+    print("Service stopped")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve embed/detect/evaluate jobs from a warm interpreter.")
+    parser.add_argument("--socket", default=SOCKET_PATH, help="Unix socket path (env ECHO_SERVICE_SOCKET)")
+    args = parser.parse_args()
+
+    try:
+        serve(args.socket)
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
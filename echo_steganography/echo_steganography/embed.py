@@ -1,45 +1,165 @@
 import numpy as np
-from scipy.io import wavfile
-from scipy.signal import lfilter
 import os
+import time
+import wave
 import argparse
+from echo_kernel import EchoKernel
+from stego_core import (add_profile_argument, audiosave, enable_profiling, length_prefixed, mix_weights, mixer, prepare_bits,
+                        profile_stage, profiled, read_wav, signal_blocks, transition_ramp)
 
-def get_bits(text):
+def _with_history(blocks, history_len, history=None):
     """
-    Convert text to binary string (8-bit ASCII per character).
+    Prepend the last history_len samples of the previous block to each block.
+    
+    The history before the first block is zero unless given, so
+    ext[history_len - d + i] is the sample delayed by d for every
+    d <= history_len.
+    
+    Args:
+        blocks (iterable): Blocks of a 2D signal (N x channels).
+        history_len (int): Number of history samples to carry.
+        history (np.ndarray): Optional samples preceding the first block.
+    """
+    for block in blocks:
+        if history is None:
+            history = np.zeros((history_len, block.shape[1]), dtype=block.dtype)
+        ext = np.concatenate([history, block])
+        history = ext[len(ext) - history_len:]
+        yield ext
+
+def _add_echoes(acc, ext, k0, k1, w0, w1):
+    """
+    Add w0 * (k0 * x) + w1 * (k1 * x) to acc in place.
+    
+    Single-tap kernels are added as weighted delayed slices of ext; longer
+    kernels go through EchoKernel.convolve.
+    
+    Args:
+        acc (np.ndarray): Output block (n x channels).
+        ext (np.ndarray): History samples followed by the input block.
+        k0 (EchoKernel): Echo kernel for bit 0.
+        k1 (EchoKernel): Echo kernel for bit 1.
+        w0 (float or np.ndarray): Weight of the bit 0 echo, scalar or (n x 1).
+        w1 (float or np.ndarray): Weight of the bit 1 echo, scalar or (n x 1).
+    """
+    n = len(acc)
+    h = len(ext) - n
+    tmp = np.empty_like(acc)
+    for kernel, w in ((k0, w0), (k1, w1)):
+        if kernel.ntaps == 1:
+            d = kernel.max_delay
+            np.multiply(ext[h - d:h - d + n], w * acc.dtype.type(kernel.gains[0]), out=tmp)
+        else:
+            np.multiply(kernel.convolve(ext, axis=0)[h:], w, out=tmp)
+        acc += tmp
+
+def _echo_kernels(d0, d1, alpha, kernels):
+    """
+    Return the (k0, k1) echo kernel pair used for bits 0 and 1.
+    
+    Args:
+        d0 (int): Delay for bit 0 (samples).
+        d1 (int): Delay for bit 1 (samples).
+        alpha (float): Echo amplitude.
+        kernels (tuple): Optional (k0, k1) EchoKernel pair overriding d0/d1/alpha.
+    
+    Returns:
+        tuple: (k0, k1) EchoKernel pair.
+    
+    Raises:
+        ValueError: If a kernel has negative delays.
+    """
+    if kernels is None:
+        return EchoKernel.single(d0, alpha), EchoKernel.single(d1, alpha)
+    k0, k1 = kernels
+    if min(k0.min_delay, k1.min_delay) < 0:
+        raise ValueError("Echo kernels must not have negative delays!")
+    return k0, k1
+
+def _max_echo(blocks, k0, k1, dtype, history=None):
+    """
+    Peak of the combined echo k0 * x + k1 * x.
     
     Args:
-        text (str): Input text.
+        blocks (iterable): Blocks of the input signal.
+        k0 (EchoKernel): Echo kernel for bit 0.
+        k1 (EchoKernel): Echo kernel for bit 1.
+        dtype (np.dtype): Working dtype.
+        history (np.ndarray): Optional samples preceding the first block.
     
     Returns:
-        str: Binary string.
+        float: Peak absolute echo value.
     """
-    return ''.join(format(ord(c), '08b') for c in text)
+    dmax = max(k0.max_delay, k1.max_delay)
+    max_echo = 0
+    for ext in _with_history(blocks, dmax, history):
+        acc = np.zeros((len(ext) - dmax, ext.shape[1]), dtype=dtype)
+        _add_echoes(acc, ext, k0, k1, 1, 1)
+        max_echo = max(max_echo, acc.max(), -acc.min())
+    return max_echo
 
-def mixer(L, bits, lower, upper):
+def _echo_scale(blocks, k0, k1, dtype):
     """
-    Create a mixing signal for embedding bits.
+    Compute the factor that limits the combined echo peak to 0.5.
     
     Args:
-        L (int): Frame length.
-        bits (str): Binary string.
-        lower (float): Value for bit 0.
-        upper (float): Value for bit 1.
+        blocks (iterable): Blocks of the input signal.
+        k0 (EchoKernel): Echo kernel for bit 0.
+        k1 (EchoKernel): Echo kernel for bit 1.
+        dtype (np.dtype): Working dtype.
     
     Returns:
-        np.ndarray: Mixing signal.
-    """
-    N = len(bits)
-    indices = np.arange(N * L) // L
-    bits_array = np.array([int(b) for b in bits])
-    m_sig = np.where(bits_array[indices] == 1, upper, lower)
-    window = np.hanning(L).repeat(N)
-    return m_sig * window
+        float: Scale applied to both echoes (1.0 if no scaling is needed).
+    """
+    max_echo = _max_echo(blocks, k0, k1, dtype)
+    return 0.5 / max_echo if max_echo > 0.5 else 1.0
 
-def echo_embed(signal, text, d0=200, d1=300, alpha=0.6, L=8192):
+def _embed_blocks(blocks, bits, k0, k1, scale, L, dtype, out=None, start=0, history=None):
+    """
+    Yield (start, block) pairs of the embedded signal before peak normalization.
+    
+    Args:
+        blocks (iterable): Blocks of the input signal.
+        bits (str): Padded binary string.
+        k0 (EchoKernel): Echo kernel for bit 0.
+        k1 (EchoKernel): Echo kernel for bit 1.
+        scale (float): Echo scale from _echo_scale.
+        L (int): Frame length.
+        dtype (np.dtype): Working dtype.
+        out (np.ndarray): Optional full-length buffer the blocks are written into.
+        start (int): Sample index of the first block.
+        history (np.ndarray): Optional samples preceding the first block.
+    """
+    dmax = max(k0.max_delay, k1.max_delay)
+    bits_array = np.frombuffer(bits.encode('ascii'), dtype=np.uint8) - ord('0')
+    ramp = transition_ramp(L // 8, dtype)
+    embed_len = len(bits) * L
+    gain = dtype.type(scale)
+    for ext in _with_history(blocks, dmax, history):
+        n = len(ext) - dmax
+        if out is None:
+            acc = ext[dmax:].astype(dtype)
+        else:
+            acc = out[start:start + n]
+            acc[...] = ext[dmax:]
+        stop = min(start + n, embed_len)
+        if stop > start:
+            k = stop - start
+            mix = mix_weights(start, stop, L, bits_array, ramp)[:, np.newaxis]
+            _add_echoes(acc[:k], ext[:dmax + k], k0, k1, gain * (1 - mix), gain * mix)
+        yield start, acc
+        start += n
+
+@profiled('embed')
+def echo_embed(signal, text, d0=200, d1=300, alpha=0.6, L=8192, out=None, block_size=65536, kernels=None,
+               workers=None, framed=False):
     """
     Embed a text message into an audio signal using echo steganography.
     
+    The echoes are added as delayed slices straight into a single output
+    buffer, block by block, so no full-length temporaries are allocated.
+    Float32 signals are processed in float32.
+    
     Args:
         signal (np.ndarray): Preprocessed audio signal (2D: N x channels).
         text (str): Text to embed.
@@ -47,85 +167,411 @@ def echo_embed(signal, text, d0=200, d1=300, alpha=0.6, L=8192):
         d1 (int): Delay for bit 1 (samples).
         alpha (float): Echo amplitude.
         L (int): Frame length.
+        out (np.ndarray): Optional output buffer with the shape of signal.
+        block_size (int): Number of samples processed per block.
+        kernels (tuple): Optional (k0, k1) EchoKernel pair replacing the
+            single-tap d0/d1 echoes, e.g. multi-echo kernels.
+        workers (int): Split the signal across this many processes
+            (see echo_embed_sharded). Same output as the serial path.
+        framed (bool): Embed the text with a length header and CRC32 so
+            the decoder stops at its end and can check it.
     
     Returns:
         np.ndarray: Encoded audio signal.
     
     Raises:
-        ValueError: If signal is invalid or too short.
+        ValueError: If signal is invalid or too short, or out does not fit.
     """
-    if not isinstance(signal, np.ndarray) or signal.ndim != 2:
-        raise ValueError("Signal must be a 2D NumPy array (N x channels)!")
-    if L <= max(d0, d1):
-        raise ValueError("Frame length L must be greater than delays d0 and d1!")
-    
-    s_ch = signal.shape[1]
-    s_len = signal.shape[0]
-    if s_len < L * 8:
-        raise ValueError("Audio signal is too short to embed any message!")
-    
-    bits = get_bits(text)
-    nframe = s_len // L
-    max_bits = nframe - (nframe % 8)
-    if len(bits) > max_bits:
-        print(f"Warning: Message truncated to {max_bits // 8} characters.")
-        bits = bits[:max_bits]
-    bits = bits + '0' * (max_bits - len(bits))
-    
-    k0 = np.concatenate([np.zeros(d0), [alpha]])
-    k1 = np.concatenate([np.zeros(d1), [alpha]])
-    
-    echo_zro = np.zeros_like(signal)
-    echo_one = np.zeros_like(signal)
-    for ch in range(s_ch):
-        echo_zro[:, ch] = lfilter(k0, 1, signal[:, ch])
-        echo_one[:, ch] = lfilter(k1, 1, signal[:, ch])
-    
-    max_echo = np.max(np.abs(echo_zro + echo_one))
-    if max_echo > 0.5:
-        scale = 0.5 / max_echo
-        echo_zro *= scale
-        echo_one *= scale
-    
-    m_sig = mixer(L, bits, 0, 1)
-    mix = np.tile(m_sig, (s_ch, 1)).T
-    out = signal[:max_bits * L, :] + echo_zro[:max_bits * L, :] * (1 - mix) + echo_one[:max_bits * L, :] * mix
-    
-    if max_bits * L < s_len:
-        out = np.vstack([out, signal[max_bits * L:, :]])
-    
-    max_val = np.max(np.abs(out))
+    k0, k1 = _echo_kernels(d0, d1, alpha, kernels)
+    bits, max_bits = prepare_bits(signal, text, max(k0.max_delay, k1.max_delay), L, framed)
+    if out is None:
+        out = np.empty(signal.shape, dtype=np.result_type(signal.dtype, np.float32))
+    elif out.shape != signal.shape:
+        raise ValueError("Output buffer must have the same shape as the signal!")
+    elif np.may_share_memory(out, signal):
+        raise ValueError("Output buffer must not overlap the signal!")
+    if workers is not None and workers > 1:
+        out[...] = echo_embed_sharded(signal, bits, k0, k1, L, block_size, workers, out.dtype)
+        return out
+    
+    scale = _echo_scale(signal_blocks(signal, block_size), k0, k1, out.dtype)
+    max_val = 0
+    for _, block in _embed_blocks(signal_blocks(signal, block_size), bits, k0, k1, scale, L, out.dtype, out=out):
+        max_val = max(max_val, block.max(), -block.min())
     if max_val > 1:
-        out = out / max_val
+        out /= max_val
     return out
 
-def audiosave(out_signal, sample_rate, filename):
+def _shard_history(signal, start, history_len):
     """
-    Save audio signal as a 16-bit WAV file.
+    Return the history_len samples before start, zero-padded at the signal start.
     
     Args:
-        out_signal (np.ndarray): Audio signal to save.
+        signal (np.ndarray): Audio signal (2D: N x channels).
+        start (int): First sample of the shard.
+        history_len (int): Number of history samples.
+    """
+    history = np.zeros((history_len, signal.shape[1]), dtype=signal.dtype)
+    n = min(start, history_len)
+    if n:
+        history[history_len - n:] = signal[start - n:start]
+    return history
+
+@profiled('embed_shard')
+def _embed_shard(stage, signal_spec, out_spec, bits, k0, k1, L, block_size, start, stop, value):
+    """
+    Run one stage of echo_embed_sharded on samples [start, stop) in a worker.
+    
+    Args:
+        stage (str): 'scale' returns the echo peak, 'embed' writes the shard
+            and returns its output peak, 'normalize' divides it by value.
+        signal_spec (tuple): (shared memory name, shape, dtype) of the input.
+        out_spec (tuple): (shared memory name, shape, dtype) of the output.
+        bits (str): Padded binary string.
+        k0 (EchoKernel): Echo kernel for bit 0.
+        k1 (EchoKernel): Echo kernel for bit 1.
+        L (int): Frame length.
+        block_size (int): Number of samples processed per block.
+        start (int): First sample of the shard (a multiple of block_size).
+        stop (int): One past the last sample of the shard.
+        value (float): Echo scale for 'embed', output peak for 'normalize'.
+    """
+    from multiprocessing import shared_memory
+    shms = [shared_memory.SharedMemory(name=spec[0]) for spec in (signal_spec, out_spec)]
+    try:
+        signal, out = [np.ndarray(spec[1], dtype=spec[2], buffer=shm.buf)
+                       for spec, shm in zip((signal_spec, out_spec), shms)]
+        dmax = max(k0.max_delay, k1.max_delay)
+        blocks = signal_blocks(signal, block_size, start, stop)
+        if stage == 'scale':
+            return _max_echo(blocks, k0, k1, out.dtype, _shard_history(signal, start, dmax))
+        if stage == 'normalize':
+            out[start:stop] /= value
+            return None
+        max_val = 0
+        for _, block in _embed_blocks(blocks, bits, k0, k1, value, L, out.dtype, out=out, start=start,
+                                      history=_shard_history(signal, start, dmax)):
+            max_val = max(max_val, block.max(), -block.min())
+        return max_val
+    finally:
+        del signal, out
+        for shm in shms:
+            shm.close()
+
+def echo_embed_sharded(signal, bits, k0, k1, L, block_size, workers, dtype):
+    """
+    Embed prepared bits with the signal split into contiguous shards, one per process.
+    
+    The signal and the output live in shared memory, so workers only receive
+    shard bounds. Shards start on block_size boundaries and each one is
+    seeded with the max_delay samples before it, so every block sees the
+    same history and FFT segmentation as in the serial loop and the output
+    is bit-identical to echo_embed with workers=None. The global echo scale
+    and output peak are reduced in the parent between the three stages.
+    
+    Args:
+        signal (np.ndarray): Preprocessed audio signal (2D: N x channels).
+        bits (str): Padded binary string from prepare_bits.
+        k0 (EchoKernel): Echo kernel for bit 0.
+        k1 (EchoKernel): Echo kernel for bit 1.
+        L (int): Frame length.
+        block_size (int): Number of samples processed per block.
+        workers (int): Number of processes.
+        dtype (np.dtype): Output dtype.
+    
+    Returns:
+        np.ndarray: Encoded audio signal.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import shared_memory
+    n = signal.shape[0]
+    nblocks = -(-n // block_size)
+    edges = np.unique(np.linspace(0, nblocks, min(workers, nblocks) + 1).astype(int)) * block_size
+    shards = [(int(lo), int(min(hi, n))) for lo, hi in zip(edges[:-1], edges[1:])]
+    
+    dtype = np.dtype(dtype)
+    shm_in = shared_memory.SharedMemory(create=True, size=max(signal.nbytes, 1))
+    shm_out = shared_memory.SharedMemory(create=True, size=max(n * signal.shape[1] * dtype.itemsize, 1))
+    try:
+        shared = np.ndarray(signal.shape, dtype=signal.dtype, buffer=shm_in.buf)
+        for lo in range(0, n, block_size):
+            shared[lo:lo + block_size] = signal[lo:lo + block_size]
+        del shared
+        signal_spec = (shm_in.name, signal.shape, signal.dtype.str)
+        out_spec = (shm_out.name, signal.shape, dtype.str)
+        
+        def run(pool, stage, value):
+            futures = [pool.submit(_embed_shard, stage, signal_spec, out_spec, bits, k0, k1, L, block_size,
+                                   lo, hi, value) for lo, hi in shards]
+            return [f.result() for f in futures]
+        
+        with ProcessPoolExecutor(max_workers=len(shards)) as pool:
+            max_echo = max(run(pool, 'scale', None), default=0)
+            scale = 0.5 / max_echo if max_echo > 0.5 else 1.0
+            max_val = max(run(pool, 'embed', scale), default=0)
+            if max_val > 1:
+                run(pool, 'normalize', max_val)
+        return np.ndarray(signal.shape, dtype=dtype, buffer=shm_out.buf).copy()
+    finally:
+        for shm in (shm_in, shm_out):
+            shm.close()
+            shm.unlink()
+
+@profiled('embed_stream')
+def echo_embed_stream(signal, text, filename, sample_rate, d0=200, d1=300, alpha=0.6, L=8192,
+                      block_size=262144, kernels=None, framed=False):
+    """
+    Embed a text message block by block and write the 16-bit WAV incrementally.
+    
+    Produces the same samples as audiosave(echo_embed(...)) while keeping
+    peak memory bounded by block_size (FFT-applied kernels match when both
+    use the same block_size). The signal is read three times: once
+    for the echo scale, once for the output peak and once to write the file.
+    Echo history is carried across block boundaries.
+    
+    Args:
+        signal (np.ndarray): Preprocessed audio signal (2D: N x channels),
+            typically np.load(..., mmap_mode='r').
+        text (str): Text to embed.
+        filename (str): Output WAV file path.
         sample_rate (int): Sample rate in Hz.
+        d0 (int): Delay for bit 0 (samples).
+        d1 (int): Delay for bit 1 (samples).
+        alpha (float): Echo amplitude.
+        L (int): Frame length.
+        block_size (int): Number of samples processed per block.
+        kernels (tuple): Optional (k0, k1) EchoKernel pair replacing the
+            single-tap d0/d1 echoes.
+        framed (bool): Embed the text with a length header and CRC32.
+    
+    Raises:
+        ValueError: If signal is invalid or too short.
+    """
+    k0, k1 = _echo_kernels(d0, d1, alpha, kernels)
+    bits, max_bits = prepare_bits(signal, text, max(k0.max_delay, k1.max_delay), L, framed)
+    dtype = np.result_type(signal.dtype, np.float32)
+    
+    scale = _echo_scale(signal_blocks(signal, block_size), k0, k1, dtype)
+    max_val = 0
+    for _, block in _embed_blocks(signal_blocks(signal, block_size), bits, k0, k1, scale, L, dtype):
+        max_val = max(max_val, block.max(), -block.min())
+    
+    clipped = False
+    with wave.open(filename, 'wb') as wav:
+        wav.setnchannels(signal.shape[1])
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        for _, block in _embed_blocks(signal_blocks(signal, block_size), bits, k0, k1, scale, L, dtype):
+            if max_val > 1:
+                block /= max_val
+            if np.any(np.abs(block) > 1):
+                clipped = True
+                block = np.clip(block, -1, 1)
+            wav.writeframes(np.int16(block * 32767).astype('<i2').tobytes())
+    if clipped:
+        print("Warning: Clipping detected, signal normalized.")
+
+def _peak_candidates(x, e, bound=0.0):
+    """
+    Keep the (x, e) pairs whose |x + s * e| can be the peak for some s in [0, 1].
+    
+    |x + s * e| is convex in s, so a pair whose values at both ends of
+    [0, 1] are below a value another pair keeps for every s never holds
+    the peak.
+    
+    Args:
+        x (np.ndarray): Sample values.
+        e (np.ndarray): Echo values, same shape as x.
+        bound (float): Peak already guaranteed by earlier pairs.
+    
+    Returns:
+        tuple: (pairs, bound) with the remaining (m x 2) pairs and the updated bound.
+    """
+    y = x + e
+    keep = np.maximum(np.abs(x), np.abs(y)) >= bound
+    x, e, y = x[keep], e[keep], y[keep]
+    lower = np.where(x * y > 0, np.minimum(np.abs(x), np.abs(y)), 0)
+    if len(lower):
+        bound = max(bound, float(lower.max()))
+    keep = np.maximum(np.abs(x), np.abs(y)) >= bound
+    return np.stack((x[keep], e[keep]), axis=1), bound
+
+def _scan_raw(blocks, bits, k0, k1, L, dtype):
+    """
+    Single pass over unnormalized samples collecting everything the embed pass needs.
+    
+    Echoes are linear in the signal, so the echo peak and the output peak
+    can be measured before the normalization peak is known.
+    
+    Args:
+        blocks (iterable): Blocks of the raw signal.
+        bits (str): Padded binary string.
+        k0 (EchoKernel): Echo kernel for bit 0.
+        k1 (EchoKernel): Echo kernel for bit 1.
+        L (int): Frame length.
+        dtype (np.dtype): Working dtype.
+    
+    Returns:
+        tuple: (peak, max_echo, points) in raw units, where points holds the
+            (sample, mixed echo) pairs that can give the output peak.
+    """
+    dmax = max(k0.max_delay, k1.max_delay)
+    bits_array = np.frombuffer(bits.encode('ascii'), dtype=np.uint8) - ord('0')
+    ramp = transition_ramp(L // 8, dtype)
+    embed_len = len(bits) * L
+    peak = 0
+    max_echo = 0
+    points = np.empty((0, 2), dtype=dtype)
+    bound = 0.0
+    start = 0
+    for ext in _with_history(blocks, dmax):
+        n = len(ext) - dmax
+        x = ext[dmax:]
+        peak = max(peak, x.max(), -x.min())
+        both = np.zeros(x.shape, dtype=dtype)
+        _add_echoes(both, ext, k0, k1, 1, 1)
+        max_echo = max(max_echo, both.max(), -both.min())
+        echo = np.zeros(x.shape, dtype=dtype)
+        stop = min(start + n, embed_len)
+        if stop > start:
+            k = stop - start
+            mix = mix_weights(start, stop, L, bits_array, ramp)[:, np.newaxis]
+            _add_echoes(echo[:k], ext[:dmax + k], k0, k1, 1 - mix, mix)
+        pairs, bound = _peak_candidates(x.ravel(), echo.ravel(), bound)
+        points = np.concatenate((points, pairs))
+        points, bound = _peak_candidates(points[:, 0], points[:, 1], bound)
+        start += n
+    return float(peak), float(max_echo), points
+
+@profiled('embed_wav')
+def echo_embed_wav(input_wav, filename, text, d0=200, d1=300, alpha=0.6, L=8192, block_size=262144, kernels=None,
+                   framed=False):
+    """
+    Embed a text message straight from a 16-bit WAV into a 16-bit WAV.
+    
+    Fuses preprocess_audio and echo_embed_stream without an intermediate
+    .npy: one pass over the memory-mapped input finds the normalization
+    peak, the echo scale and the output peak, and a second pass
+    normalizes, embeds and writes int16 blocks. The result matches
+    preprocess.py followed by embed.py to within one LSB.
+    
+    Args:
+        input_wav (str): Input WAV file path.
         filename (str): Output WAV file path.
+        text (str): Text to embed.
+        d0 (int): Delay for bit 0 (samples).
+        d1 (int): Delay for bit 1 (samples).
+        alpha (float): Echo amplitude.
+        L (int): Frame length.
+        block_size (int): Number of samples processed per block.
+        kernels (tuple): Optional (k0, k1) EchoKernel pair replacing the
+            single-tap d0/d1 echoes.
+        framed (bool): Embed the text with a length header and CRC32.
+    
+    Returns:
+        dict: Seconds spent in each stage ('open', 'scan', 'embed', 'write').
+    
+    Raises:
+        ValueError: If the file is invalid, not 16-bit or too short.
     """
-    if np.any(np.abs(out_signal) > 1):
+    timings = {}
+    t0 = time.perf_counter()
+    if not os.path.exists(input_wav):
+        raise ValueError(f"File {input_wav} does not exist!")
+    try:
+        sample_rate, raw = read_wav(input_wav, mmap=True)
+    except ValueError as e:
+        raise ValueError(f"Invalid WAV file: {e}")
+    if raw.dtype != np.int16:
+        raise ValueError("Only 16-bit WAV files are supported!")
+    if raw.ndim == 1:
+        raw = raw[:, np.newaxis]
+    k0, k1 = _echo_kernels(d0, d1, alpha, kernels)
+    bits, max_bits = prepare_bits(raw, text, max(k0.max_delay, k1.max_delay), L, framed)
+    dtype = np.dtype(np.float32)
+    timings['open'] = time.perf_counter() - t0
+    
+    # Pass 1: peak, echo peak and output peak candidates in raw units
+    t0 = time.perf_counter()
+    raw_blocks = (block.astype(dtype) for block in signal_blocks(raw, block_size))
+    peak, max_echo, points = _scan_raw(raw_blocks, bits, k0, k1, L, dtype)
+    # Same normalization as preprocess_audio
+    max_val = np.float32(peak) / np.float32(32768.0)
+    unit = peak if peak > 0 else 32768.0
+    scale = 0.5 * unit / max_echo if max_echo / unit > 0.5 else 1.0
+    out_peak = np.max(np.abs(points[:, 0] + scale * points[:, 1].astype(np.float64))) / unit if len(points) else 0
+    timings['scan'] = time.perf_counter() - t0
+    
+    # Pass 2: normalize, embed and write 16-bit frames
+    def normalized_blocks():
+        for block in signal_blocks(raw, block_size):
+            block = block.astype(dtype) / np.float32(32768.0)
+            if max_val > 0:
+                block /= max_val
+            yield block
+    
+    timings['embed'] = 0.0
+    timings['write'] = 0.0
+    clipped = False
+    with wave.open(filename, 'wb') as wav:
+        wav.setnchannels(raw.shape[1])
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        blocks = _embed_blocks(normalized_blocks(), bits, k0, k1, scale, L, dtype)
+        while True:
+            t0 = time.perf_counter()
+            item = next(blocks, None)
+            timings['embed'] += time.perf_counter() - t0
+            if item is None:
+                break
+            t0 = time.perf_counter()
+            block = item[1]
+            if out_peak > 1:
+                block /= dtype.type(out_peak)
+            if np.any(np.abs(block) > 1):
+                clipped = True
+                block = np.clip(block, -1, 1)
+            wav.writeframes(np.int16(block * 32767).astype('<i2').tobytes())
+            timings['write'] += time.perf_counter() - t0
+    if clipped:
         print("Warning: Clipping detected, signal normalized.")
-        out_signal = np.clip(out_signal, -1, 1)
-    out_signal_int16 = np.int16(out_signal * 32767)
-    wavfile.write(filename, sample_rate, out_signal_int16)
+    return timings
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Embed text in preprocessed audio using echo steganography.")
-    parser.add_argument("input_npy", help="Input preprocessed .npy file")
+    parser.add_argument("input_npy", help="Input preprocessed .npy file, or a 16-bit WAV to embed in one go")
     parser.add_argument("output_wav", help="Output WAV file")
     parser.add_argument("text", help="Text to embed")
     parser.add_argument("--rate", type=int, default=44100, help="Sample rate")
+    parser.add_argument("--stream", action="store_true", help="Embed block by block with bounded memory")
+    parser.add_argument("--block-size", type=int, default=262144, help="Samples per block in --stream and WAV input modes")
+    parser.add_argument("--workers", type=int, default=None, help="Processes sharing one file in the default (.npy) mode")
+    parser.add_argument("--framed", action="store_true", help="Add a length header and CRC32 so the decoder stops at the message end")
+    parser.add_argument("--length-prefix", action="store_true", help="Prepend a one-byte message length (stream_decode.py --length-prefix)")
+    add_profile_argument(parser)
     args = parser.parse_args()
+    if args.profile:
+        enable_profiling(args.profile)
     
     try:
-        signal = np.load(args.input_npy)
-        out_signal = echo_embed(signal, args.text, d0=200, d1=300, alpha=0.6, L=8192)
-        audiosave(out_signal, args.rate, args.output_wav)
+        if args.length_prefix:
+            args.text = length_prefixed(args.text)
+        if args.input_npy.lower().endswith('.wav'):
+            timings = echo_embed_wav(args.input_npy, args.output_wav, args.text, d0=200, d1=300, alpha=0.6, L=8192,
+                                     block_size=args.block_size, framed=args.framed)
+            print("Stage timings: " + ", ".join(f"{stage} {sec:.3f} s" for stage, sec in timings.items())
+                  + f", total {sum(timings.values()):.3f} s")
+        elif args.stream:
+            with profile_stage('load_npy'):
+                signal = np.load(args.input_npy, mmap_mode='r')
+            echo_embed_stream(signal, args.text, args.output_wav, args.rate, d0=200, d1=300, alpha=0.6, L=8192,
+                              block_size=args.block_size, framed=args.framed)
+        else:
+            with profile_stage('load_npy'):
+                signal = np.load(args.input_npy, mmap_mode='r')
+            out_signal = echo_embed(signal, args.text, d0=200, d1=300, alpha=0.6, L=8192, workers=args.workers,
+                                    framed=args.framed)
+            audiosave(out_signal, args.rate, args.output_wav)
         print(f"Signal with hidden message saved to {args.output_wav}")
     except Exception as e:
         print(f"Error: {e}")
\ No newline at end of file
@@ -1,20 +1,55 @@
 import numpy as np
-from scipy.io import wavfile
 import argparse
+from stego_core import write_wav
 
-def generate_sine_wave(duration=2.0, sample_rate=44100, frequency=440.0, amplitude=0.5, stereo=False):
+CONTENTS = ('sine', 'noise', 'music')
+
+def _music(t, frequency, rng, note_length=0.25, harmonics=3):
+    """
+    Music-like test signal: random pentatonic notes with harmonics and decaying envelopes.
+    
+    Args:
+        t (np.ndarray): Time points in seconds.
+        frequency (float): Base note frequency in Hz.
+        rng (np.random.Generator): Random generator for the melody.
+        note_length (float): Note duration in seconds.
+        harmonics (int): Number of harmonics per note.
+    
+    Returns:
+        np.ndarray: Signal with peak at most 1.
+    """
+    note = (t / note_length).astype(np.int64)
+    steps = rng.choice([0, 2, 4, 7, 9, 12], size=note[-1] + 1 if len(note) else 0)
+    f = frequency * 2.0 ** (steps[note] / 12.0)
+    tn = t - note * note_length
+    envelope = np.exp(-4.0 * tn / note_length)
+    signal = np.zeros_like(t)
+    for h in range(1, harmonics + 1):
+        signal += np.sin(2 * np.pi * h * f * tn) / h
+    return signal * envelope / sum(1.0 / h for h in range(1, harmonics + 1))
+
+def generate_sine_wave(duration=2.0, sample_rate=44100, frequency=440.0, amplitude=0.5, stereo=False,
+                       content='sine', seed=None):
     """
     Generate a sine wave audio signal and save it as a 16-bit WAV file.
     
+    content='noise' and content='music' give white Gaussian noise and a
+    music-like melody instead, e.g. as benchmark inputs.
+    
     Args:
         duration (float): Duration of the signal in seconds.
         sample_rate (int): Sample rate in Hz (default: 44100).
         frequency (float): Frequency of the sine wave in Hz (default: 440.0, A4 note).
         amplitude (float): Amplitude of the signal (0 to 1, default: 0.5).
         stereo (bool): If True, generate stereo signal (default: False).
+        content (str): 'sine', 'noise' or 'music' (default: 'sine').
+        seed (int): Random seed for 'noise' and 'music'.
     
     Returns:
         tuple: (sample_rate, signal) where signal is a NumPy array.
+    
+    Raises:
+        ValueError: If content is unknown.
     """
     # Calculate number of samples
     num_samples = int(duration * sample_rate)
@@ -22,8 +57,16 @@ def generate_sine_wave(duration=2.0, sample_rate=44100, frequency=440.0, amplitu
     # Generate time points
     t = np.linspace(0, duration, num_samples, endpoint=False)
     
-    # Generate sine wave
-    signal = amplitude * np.sin(2 * np.pi * frequency * t)
+    # Generate sine wave, noise (about 3 sigma at amplitude) or melody
+    rng = np.random.default_rng(seed)
+    if content == 'sine':
+        signal = amplitude * np.sin(2 * np.pi * frequency * t)
+    elif content == 'noise':
+        signal = amplitude * np.clip(rng.standard_normal(num_samples) / 3, -1, 1)
+    elif content == 'music':
+        signal = amplitude * _music(t, frequency, rng)
+    else:
+        raise ValueError(f"Unknown content: {content}")
     
     # Convert to stereo if requested
     if stereo:
@@ -45,7 +88,7 @@ def save_wav(signal, sample_rate, filename):
     signal_int16 = np.int16(signal * 32767)
     
     # Save to WAV file
-    wavfile.write(filename, sample_rate, signal_int16)
+    write_wav(filename, sample_rate, signal_int16)
     print("Saved audio to {}".format(filename))
 
 if __name__ == "__main__":
@@ -55,6 +98,8 @@ if __name__ == "__main__":
     parser.add_argument("--frequency", type=float, default=440.0, help="Sine wave frequency in Hz (default: 440.0)")
     parser.add_argument("--amplitude", type=float, default=0.5, help="Amplitude (0 to 1, default: 0.5)")
     parser.add_argument("--stereo", action="store_true", help="Generate stereo signal")
+    parser.add_argument("--content", choices=CONTENTS, default='sine', help="Sine wave, white noise or music-like notes (default: sine)")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for noise and music")
     args = parser.parse_args()
     
     try:
@@ -63,7 +108,9 @@ if __name__ == "__main__":
             sample_rate=44100,
             frequency=args.frequency,
             amplitude=args.amplitude,
-            stereo=args.stereo
+            stereo=args.stereo,
+            content=args.content,
+            seed=args.seed
         )
         save_wav(signal, sample_rate, args.output_file)
     except Exception as e:
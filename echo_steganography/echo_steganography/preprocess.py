@@ -1,15 +1,19 @@
 import numpy as np
-from scipy.io import wavfile
 import os
 import argparse
+from stego_core import CHUNK_SIZE, add_profile_argument, enable_profiling, read_wav, save_normalized
 
-def preprocess_audio(input_wav, output_npy):
+def preprocess_audio(input_wav, output_npy, chunk_size=CHUNK_SIZE):
     """
     Preprocess a WAV file by normalizing and saving as a NumPy array.
     
+    The WAV is memory-mapped and normalized chunk by chunk by
+    save_normalized, so the whole signal is never held in memory.
+    
     Args:
         input_wav (str): Path to input WAV file.
         output_npy (str): Path to output .npy file.
+        chunk_size (int): Number of samples processed per chunk.
     
     Returns:
         int: Sample rate of the audio.
@@ -21,25 +25,20 @@ def preprocess_audio(input_wav, output_npy):
         raise ValueError(f"File {input_wav} does not exist!")
     
     try:
-        sample_rate, data = wavfile.read(input_wav)
+        sample_rate, data = read_wav(input_wav, mmap=True)
     except ValueError as e:
         raise ValueError(f"Invalid WAV file: {e}")
     
     if data.dtype != np.int16:
         raise ValueError("Only 16-bit WAV files are supported!")
     
-    # Normalize to [-1, 1]
-    data = data.astype(np.float32) / 32768.0
-    max_val = np.max(np.abs(data))
-    if max_val > 0:
-        data = data / max_val
-    
     # Handle mono/stereo
     if data.ndim == 1:
         data = data[:, np.newaxis]
     
-    # Save as .npy
-    np.save(output_npy, data)
+    # Normalize to [-1, 1]
+    save_normalized(data, output_npy, chunk_size)
+    
     print(f"Preprocessed audio saved to {output_npy}")
     return sample_rate
 
@@ -47,7 +46,10 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Preprocess audio for echo steganography.")
     parser.add_argument("input_wav", help="Input WAV file")
     parser.add_argument("output_npy", help="Output .npy file")
+    add_profile_argument(parser)
     args = parser.parse_args()
+    if args.profile:
+        enable_profiling(args.profile)
     
     try:
         preprocess_audio(args.input_wav, args.output_npy)
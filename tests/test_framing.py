@@ -0,0 +1,46 @@
+import os
+import sys
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'echo_steganography', 'echo_steganography'),
+                os.path.join(ROOT, 'echo_hiding_decoding', 'echo_hiding_decoding')]
+
+from embed import echo_embed
+from decode_message import decode_message
+from stego_core import bits_to_text, frame_payload, get_bits, read_payload
+
+L = 8192
+
+def _bits(text):
+    return np.frombuffer(get_bits(text).encode('ascii'), dtype=np.uint8) - ord('0')
+
+def _read(bits):
+    return read_payload(lambda start, stop: bits[start:stop], len(bits))
+
+def _embed_decode(tmp_path, text, framed=False):
+    # Enough frames for the text and its frame, as echo_embed pads to a whole byte
+    nframe = 8 * len(text) + 96
+    signal = np.random.default_rng(0).normal(0, 0.1, (nframe * L, 1)).astype(np.float32)
+    np.save(tmp_path / 'stego.npy', echo_embed(signal, text, framed=framed))
+    decode_message(str(tmp_path / 'stego.npy'), str(tmp_path / 'message.txt'))
+    return (tmp_path / 'message.txt').read_text()
+
+def test_framed_payload_round_trip():
+    bits = frame_payload(_bits("Framed hello"))
+    assert bits_to_text(_read(bits)) == "Framed hello"
+
+def test_near_sync_text_is_not_a_frame():
+    # 'l' is 0x6C, one bit from the 0xEC that starts the sync word
+    assert _read(_bits("lZebra crossing ahead")) is None
+
+def test_corrupted_frame_decodes_as_text():
+    bits = frame_payload(_bits("Framed hello"))
+    bits[-1] ^= 1
+    assert _read(bits) is None
+
+def test_decode_near_sync_text(tmp_path):
+    assert _embed_decode(tmp_path, "lZebra crossing ahead") == "lZebra crossing ahead"
+
+def test_decode_framed_text(tmp_path):
+    assert _embed_decode(tmp_path, "lZebra crossing ahead", framed=True) == "lZebra crossing ahead"
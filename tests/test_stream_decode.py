@@ -0,0 +1,37 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'echo_steganography', 'echo_steganography'),
+                os.path.join(ROOT, 'echo_hiding_decoding', 'echo_hiding_decoding')]
+
+from embed import echo_embed
+from stream_decode import stream_decode, wav_chunks
+from stego_core import audiosave, length_prefixed
+
+L = 8192
+
+def _stream(tmp_path, text, **options):
+    # Room for the text and some padding frames after it
+    nframe = 8 * len(text) + 32
+    signal = np.random.default_rng(0).normal(0, 0.1, (nframe * L, 1)).astype(np.float32)
+    audiosave(echo_embed(signal, text), 44100, str(tmp_path / 'stego.wav'))
+    return b''.join(stream_decode(wav_chunks(str(tmp_path / 'stego.wav')), **options))
+
+def test_length_prefix_round_trip(tmp_path):
+    # No terminator: only the prefix stops the decoder before the padding
+    decoded = _stream(tmp_path, length_prefixed("Hello, prefix"), terminator=None, length_prefix=True)
+    assert decoded == b"Hello, prefix"
+
+def test_zero_length_prefix_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        _stream(tmp_path, "\x00Hello", terminator=None, length_prefix=True)
+
+def test_length_prefixed_limits():
+    assert length_prefixed("ab") == "\x02ab"
+    with pytest.raises(ValueError):
+        length_prefixed("")
+    with pytest.raises(ValueError):
+        length_prefixed("x" * 256)
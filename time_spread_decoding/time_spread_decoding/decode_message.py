@@ -1,20 +1,74 @@
+import random
+import argparse
 import numpy as np
+from stego_core import add_profile_argument, bits_to_text, enable_profiling, profile_stage, read_payload, sp_fft
 
-def decode_message(input_file, output_file, delay=100):
-    data = np.load(input_file)
-    binary = ""
-    for i in range(0, len(data) - delay, delay):
-        segment = data[i:i + delay]
-        echo_energy = np.sum(np.abs(segment))
-        binary += '1' if echo_energy > 0.1 else '0'
-    message = ""
-    for i in range(0, len(binary), 8):
-        byte = binary[i:i + 8]
-        if len(byte) == 8:
-            message += chr(int(byte, 2))
+LOG_FLOOR = 1e-12
+BATCH_FRAMES = 256
+
+def pn_sequence(length=1023, key=0):
+    # Same chips as pn_sequence in time_spread_encoding/embed.py: +1/-1 from random.Random(key)
+    bits = random.Random(key).getrandbits(length)
+    chips = np.array([int(b) for b in format(bits, f'0{length}b')], dtype=np.float64)
+    return 2 * chips - 1
+
+def despread_basis(pn, delays, L):
+    # Correlating the cepstrum c = irfft(log|X|) with the PN at lag d is linear in log|X|:
+    # sum_k pn[k] c[d + k] = log|X| @ basis[:, i]. rfft(pn) gives all lags at once, so each
+    # frame costs one rfft and a (L/2 + 1) x len(delays) product, whatever the PN length.
+    if max(delays) + len(pn) > L:
+        raise ValueError("Frame length L must be greater than the delays plus the PN length!")
+    freqs = np.arange(L // 2 + 1)
+    weights = np.full(len(freqs), 2.0 / L)
+    weights[0] = 1.0 / L
+    if L % 2 == 0:
+        weights[-1] = 1.0 / L  # Nyquist bin
+    pn_spec = np.conj(sp_fft.rfft(pn, n=L))
+    return np.stack([weights * np.real(np.exp(2j * np.pi * freqs * d / L) * pn_spec) for d in delays], axis=1)
+
+def log_spectrum(frames, workers=None):
+    spectrum = np.abs(sp_fft.rfft(frames, axis=-1, workers=workers))
+    spectrum += LOG_FLOOR
+    return np.log(spectrum, out=spectrum)
+
+def despread(data, basis, L, workers=None, start=0, stop=None):
+    # PN correlation of frames [start, stop) at each delay, BATCH_FRAMES frames at a time (data can be a memmap)
+    nframe = len(data) // L if stop is None else min(stop, len(data) // L)
+    scores = np.empty((max(nframe - start, 0), basis.shape[1]))
+    for lo in range(start, nframe, BATCH_FRAMES):
+        hi = min(lo + BATCH_FRAMES, nframe)
+        block = np.asarray(data[lo * L:hi * L])
+        if block.ndim == 2:
+            block = block.mean(axis=1)
+        scores[lo - start:hi - start] = log_spectrum(block.reshape(hi - lo, L), workers) @ basis
+    return scores
+
+def decode_bits(data, d0=200, d1=300, L=8192, pn_length=1023, key=0, workers=None, start=0, stop=None):
+    basis = despread_basis(pn_sequence(pn_length, key), (d0, d1), L)
+    scores = despread(data, basis, L, workers, start, stop)
+    return (scores[:, 1] > scores[:, 0]).astype(np.uint8)
+
+def decode_message(input_file, output_file, d0=200, d1=300, L=8192, pn_length=1023, key=0):
+    data = np.load(input_file, mmap_mode='r')
+    with profile_stage('decode'):
+        # Framed message (exact sync word, good CRC): read only up to the declared
+        # length. Anything else is unframed text.
+        payload = read_payload(lambda start, stop: decode_bits(data, d0, d1, L, pn_length, key, start=start, stop=stop),
+                               len(data) // L)
+        if payload is None:
+            payload = decode_bits(data, d0, d1, L, pn_length, key)
+        message = bits_to_text(payload)
     with open(output_file, 'w') as f:
         f.write(message)
     print(f"Decoded message saved to {output_file}")
 
 if __name__ == "__main__":
-    decode_message("decoded_preprocessed.npy", "decoded_message.txt")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Decode a time-spread echo hidden message.")
+    parser.add_argument("--key", type=int, default=0, help="Secret key the PN sequence was embedded with")
+    parser.add_argument("--pn-length", type=int, default=1023, help="Number of PN chips in the echo kernel")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    if args.profile:
+        enable_profiling(args.profile)
+
+    decode_message("decoded_preprocessed.npy", "decoded_message.txt", pn_length=args.pn_length, key=args.key)
@@ -1,15 +1,12 @@
 import numpy as np
-from scipy.io import wavfile
+from stego_core import CHUNK_SIZE, read_wav, save_normalized
 
-def prepare_data(input_file, output_file):
-    sample_rate, data = wavfile.read(input_file)
+def prepare_data(input_file, output_file, chunk_size=CHUNK_SIZE):
+    # Memory-mapped in and out: peak scan and normalization run chunk by chunk
+    sample_rate, data = read_wav(input_file, mmap=True)
     if data.dtype != np.int16:
         raise ValueError("Only 16-bit WAV files are supported!")
-    data = data.astype(np.float32) / 32768.0
-    max_val = np.max(np.abs(data))
-    if max_val > 0:
-        data = data / max_val
-    np.save(output_file, data)
+    save_normalized(data, output_file, chunk_size)
     print(f"Normalized data saved to {output_file}")
 
 if __name__ == "__main__":
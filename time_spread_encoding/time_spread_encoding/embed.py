@@ -1,44 +1,136 @@
 import numpy as np
-from scipy.io import wavfile
-from scipy.signal import lfilter
-import os
+import wave
+import random
 import argparse
+from echo_kernel import EchoKernel
+from stego_core import (add_profile_argument, audiosave, enable_profiling, mix_weights, prepare_bits, profile_stage,
+                        profiled, signal_blocks, transition_ramp)
 
-def get_bits(text):
+def pn_sequence(length=1023, key=0):
     """
-    Convert text to binary string (8-bit ASCII per character).
+    Generate the pseudo-noise sequence that spreads the echo.
+    
+    The sequence is drawn from Python's random.Random seeded with the
+    key, whose getrandbits stream does not change between Python or
+    numpy versions, so the decoder can rebuild it from the key alone.
     
     Args:
-        text (str): Input text.
+        length (int): Number of chips.
+        key (int): Secret key seeding the sequence.
     
     Returns:
-        str: Binary string.
+        np.ndarray: Chips of +1.0 and -1.0.
     """
-    return ''.join(format(ord(c), '08b') for c in text)
+    if length < 1:
+        raise ValueError("PN sequence length must be positive!")
+    bits = random.Random(key).getrandbits(length)
+    chips = np.array([int(b) for b in format(bits, f'0{length}b')], dtype=np.float64)
+    return 2 * chips - 1
 
-def mixer(L, bits, lower, upper):
+def pn_kernel(pn, alpha):
     """
-    Create a mixing signal for embedding bits.
+    Build the spread echo kernel alpha / sqrt(len(pn)) * pn at delay 0.
+    
+    The echo carries the same energy as a single echo of amplitude alpha,
+    spread over len(pn) taps of much lower amplitude.
     
     Args:
-        L (int): Frame length.
-        bits (str): Binary string.
-        lower (float): Value for bit 0.
-        upper (float): Value for bit 1.
+        pn (np.ndarray): PN chips from pn_sequence.
+        alpha (float): Echo amplitude.
+    
+    Returns:
+        EchoKernel: Kernel applied with FFT overlap-add.
+    """
+    return EchoKernel.from_array(alpha / np.sqrt(len(pn)) * pn)
+
+def _spread_echoes(blocks, kernel, d0, d1, dtype):
+    """
+    Yield (block, echo0, echo1) with the spread echoes at delays d0 and d1.
+    
+    Both echoes use the same PN kernel, so each block is convolved once
+    (FFT overlap-add) and the two echoes are slices of that convolution.
+    The last d1 + len(pn) - 1 input samples are carried over to the next
+    block, so the result does not depend on the block size.
+    
+    Args:
+        blocks (iterable): Blocks of the input signal.
+        kernel (EchoKernel): PN kernel from pn_kernel.
+        d0 (int): Delay for bit 0 (samples).
+        d1 (int): Delay for bit 1 (samples).
+        dtype (np.dtype): Working dtype.
+    """
+    hist = max(d0, d1) + kernel.max_delay
+    history = None
+    for block in blocks:
+        block = block.astype(dtype, copy=False)
+        if history is None:
+            history = np.zeros((hist, block.shape[1]), dtype=dtype)
+        ext = np.concatenate([history, block])
+        history = ext[len(ext) - hist:]
+        n = len(block)
+        conv = kernel.convolve(ext, axis=0)
+        yield block, conv[hist - d0:hist - d0 + n], conv[hist - d1:hist - d1 + n]
+
+def _echo_scale(blocks, kernel, d0, d1, dtype):
+    """
+    Compute the factor that limits the combined echo peak to 0.5.
+    
+    Args:
+        blocks (iterable): Blocks of the input signal.
+        kernel (EchoKernel): PN kernel from pn_kernel.
+        d0 (int): Delay for bit 0 (samples).
+        d1 (int): Delay for bit 1 (samples).
+        dtype (np.dtype): Working dtype.
     
     Returns:
-        np.ndarray: Mixing signal.
+        float: Scale applied to both echoes (1.0 if no scaling is needed).
     """
-    N = len(bits)
-    indices = np.arange(N * L) // L
-    bits_array = np.array([int(b) for b in bits])
-    m_sig = np.where(bits_array[indices] == 1, upper, lower)
-    window = np.hanning(L).repeat(N)
-    return m_sig * window
+    max_echo = 0
+    for _, echo0, echo1 in _spread_echoes(blocks, kernel, d0, d1, dtype):
+        both = echo0 + echo1
+        max_echo = max(max_echo, both.max(), -both.min())
+    return 0.5 / max_echo if max_echo > 0.5 else 1.0
 
-def echo_embed(signal, text, d0=200, d1=300, alpha=0.6, L=8192):
+def _embed_blocks(blocks, bits, kernel, d0, d1, scale, L, dtype):
     """
-    Embed a text message into an audio signal using echo steganography.
+    Yield (start, block) pairs of the embedded signal before peak normalization.
+    
+    Args:
+        blocks (iterable): Blocks of the input signal.
+        bits (str): Padded binary string.
+        kernel (EchoKernel): PN kernel from pn_kernel.
+        d0 (int): Delay for bit 0 (samples).
+        d1 (int): Delay for bit 1 (samples).
+        scale (float): Echo scale from _echo_scale.
+        L (int): Frame length.
+        dtype (np.dtype): Working dtype.
+    """
+    bits_array = np.frombuffer(bits.encode('ascii'), dtype=np.uint8) - ord('0')
+    ramp = transition_ramp(L // 8, dtype)
+    embed_len = len(bits) * L
+    gain = dtype.type(scale)
+    start = 0
+    for block, echo0, echo1 in _spread_echoes(blocks, kernel, d0, d1, dtype):
+        n = len(block)
+        out = block.copy()
+        stop = min(start + n, embed_len)
+        if stop > start:
+            k = stop - start
+            mix = mix_weights(start, stop, L, bits_array, ramp)[:, np.newaxis]
+            out[:k] += gain * ((1 - mix) * echo0[:k] + mix * echo1[:k])
+        yield start, out
+        start += n
+
+@profiled('embed')
+def echo_embed(signal, text, d0=200, d1=300, alpha=0.1, L=8192, pn_length=1023, key=0, block_size=262144,
+               framed=False):
+    """
+    Embed a text message into an audio signal using time-spread echo hiding.
+    
+    Bit 0 and bit 1 frames carry the echo k * x delayed by d0 and d1,
+    where k is the key's PN sequence scaled to alpha / sqrt(pn_length).
+    The echo is computed block by block with FFT overlap-add, so the cost
+    grows with log(pn_length) rather than pn_length.
     
     Args:
         signal (np.ndarray): Preprocessed audio signal (2D: N x channels).
@@ -47,6 +139,11 @@ def echo_embed(signal, text, d0=200, d1=300, alpha=0.6, L=8192):
         d1 (int): Delay for bit 1 (samples).
         alpha (float): Echo amplitude.
         L (int): Frame length.
+        pn_length (int): Number of PN chips.
+        key (int): Secret key seeding the PN sequence.
+        block_size (int): Number of samples processed per block.
+        framed (bool): Embed the text with a length header and CRC32 so
+            the decoder stops at its end and can check it.
     
     Returns:
         np.ndarray: Encoded audio signal.
@@ -54,78 +151,102 @@ def echo_embed(signal, text, d0=200, d1=300, alpha=0.6, L=8192):
     Raises:
         ValueError: If signal is invalid or too short.
     """
-    if not isinstance(signal, np.ndarray) or signal.ndim != 2:
-        raise ValueError("Signal must be a 2D NumPy array (N x channels)!")
-    if L <= max(d0, d1):
-        raise ValueError("Frame length L must be greater than delays d0 and d1!")
-    
-    s_ch = signal.shape[1]
-    s_len = signal.shape[0]
-    if s_len < L * 8:
-        raise ValueError("Audio signal is too short to embed any message!")
-    
-    bits = get_bits(text)
-    nframe = s_len // L
-    max_bits = nframe - (nframe % 8)
-    if len(bits) > max_bits:
-        print(f"Warning: Message truncated to {max_bits // 8} characters.")
-        bits = bits[:max_bits]
-    bits = bits + '0' * (max_bits - len(bits))
-    
-    k0 = np.concatenate([np.zeros(d0), [alpha]])
-    k1 = np.concatenate([np.zeros(d1), [alpha]])
-    
-    echo_zro = np.zeros_like(signal)
-    echo_one = np.zeros_like(signal)
-    for ch in range(s_ch):
-        echo_zro[:, ch] = lfilter(k0, 1, signal[:, ch])
-        echo_one[:, ch] = lfilter(k1, 1, signal[:, ch])
-    
-    max_echo = np.max(np.abs(echo_zro + echo_one))
-    if max_echo > 0.5:
-        scale = 0.5 / max_echo
-        echo_zro *= scale
-        echo_one *= scale
-    
-    m_sig = mixer(L, bits, 0, 1)
-    mix = np.tile(m_sig, (s_ch, 1)).T
-    out = signal[:max_bits * L, :] + echo_zro[:max_bits * L, :] * (1 - mix) + echo_one[:max_bits * L, :] * mix
-    
-    if max_bits * L < s_len:
-        out = np.vstack([out, signal[max_bits * L:, :]])
+    kernel = pn_kernel(pn_sequence(pn_length, key), alpha)
+    bits, max_bits = prepare_bits(signal, text, max(d0, d1) + kernel.max_delay, L, framed)
+    dtype = np.result_type(signal.dtype, np.float32)
+    
+    scale = _echo_scale(signal_blocks(signal, block_size), kernel, d0, d1, dtype)
+    out = np.empty(signal.shape, dtype=dtype)
+    for start, block in _embed_blocks(signal_blocks(signal, block_size), bits, kernel, d0, d1, scale, L, dtype):
+        out[start:start + len(block)] = block
     
     max_val = np.max(np.abs(out))
     if max_val > 1:
-        out = out / max_val
+        out /= max_val
     return out
 
-def audiosave(out_signal, sample_rate, filename):
+@profiled('embed_stream')
+def echo_embed_stream(signal, text, filename, sample_rate, d0=200, d1=300, alpha=0.1, L=8192, pn_length=1023,
+                      key=0, block_size=262144, framed=False):
     """
-    Save audio signal as a 16-bit WAV file.
+    Embed a text message block by block and write the 16-bit WAV incrementally.
+    
+    Produces the same samples as audiosave(echo_embed(...)) while keeping
+    peak memory bounded by block_size. The signal is read three times:
+    once for the echo scale, once for the output peak and once to write
+    the file.
     
     Args:
-        out_signal (np.ndarray): Audio signal to save.
-        sample_rate (int): Sample rate in Hz.
+        signal (np.ndarray): Preprocessed audio signal (2D: N x channels),
+            typically np.load(..., mmap_mode='r').
+        text (str): Text to embed.
         filename (str): Output WAV file path.
+        sample_rate (int): Sample rate in Hz.
+        d0 (int): Delay for bit 0 (samples).
+        d1 (int): Delay for bit 1 (samples).
+        alpha (float): Echo amplitude.
+        L (int): Frame length.
+        pn_length (int): Number of PN chips.
+        key (int): Secret key seeding the PN sequence.
+        block_size (int): Number of samples processed per block.
+        framed (bool): Embed the text with a length header and CRC32.
+    
+    Raises:
+        ValueError: If signal is invalid or too short.
     """
-    if np.any(np.abs(out_signal) > 1):
+    kernel = pn_kernel(pn_sequence(pn_length, key), alpha)
+    bits, max_bits = prepare_bits(signal, text, max(d0, d1) + kernel.max_delay, L, framed)
+    dtype = np.result_type(signal.dtype, np.float32)
+    
+    scale = _echo_scale(signal_blocks(signal, block_size), kernel, d0, d1, dtype)
+    max_val = 0
+    for _, block in _embed_blocks(signal_blocks(signal, block_size), bits, kernel, d0, d1, scale, L, dtype):
+        max_val = max(max_val, np.max(np.abs(block)))
+    
+    clipped = False
+    with wave.open(filename, 'wb') as wav:
+        wav.setnchannels(signal.shape[1])
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        for _, block in _embed_blocks(signal_blocks(signal, block_size), bits, kernel, d0, d1, scale, L, dtype):
+            if max_val > 1:
+                block /= max_val
+            if np.any(np.abs(block) > 1):
+                clipped = True
+                block = np.clip(block, -1, 1)
+            wav.writeframes(np.int16(block * 32767).astype('<i2').tobytes())
+    if clipped:
         print("Warning: Clipping detected, signal normalized.")
-        out_signal = np.clip(out_signal, -1, 1)
-    out_signal_int16 = np.int16(out_signal * 32767)
-    wavfile.write(filename, sample_rate, out_signal_int16)
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Embed text in preprocessed audio using echo steganography.")
+    parser = argparse.ArgumentParser(description="Embed text in preprocessed audio using time-spread echo hiding.")
     parser.add_argument("input_npy", help="Input preprocessed .npy file")
     parser.add_argument("output_wav", help="Output WAV file")
     parser.add_argument("text", help="Text to embed")
     parser.add_argument("--rate", type=int, default=44100, help="Sample rate")
+    parser.add_argument("--key", type=int, default=0, help="Secret key seeding the PN sequence (decoder needs the same key)")
+    parser.add_argument("--pn-length", type=int, default=1023, help="Number of PN chips in the echo kernel")
+    parser.add_argument("--alpha", type=float, default=0.1, help="Echo amplitude, spread over the PN chips")
+    parser.add_argument("--stream", action="store_true", help="Embed block by block with bounded memory")
+    parser.add_argument("--block-size", type=int, default=262144, help="Samples per block")
+    parser.add_argument("--framed", action="store_true", help="Add a length header and CRC32 so the decoder stops at the message end")
+    add_profile_argument(parser)
     args = parser.parse_args()
+    if args.profile:
+        enable_profiling(args.profile)
     
     try:
-        signal = np.load(args.input_npy)
-        out_signal = echo_embed(signal, args.text, d0=200, d1=300, alpha=0.6, L=8192)
-        audiosave(out_signal, args.rate, args.output_wav)
+        with profile_stage('load_npy'):
+            signal = np.load(args.input_npy, mmap_mode='r')
+        if args.stream:
+            echo_embed_stream(signal, args.text, args.output_wav, args.rate, d0=200, d1=300, alpha=args.alpha, L=8192,
+                              pn_length=args.pn_length, key=args.key, block_size=args.block_size,
+                              framed=args.framed)
+        else:
+            out_signal = echo_embed(signal, args.text, d0=200, d1=300, alpha=args.alpha, L=8192,
+                                    pn_length=args.pn_length, key=args.key, block_size=args.block_size,
+                                    framed=args.framed)
+            audiosave(out_signal, args.rate, args.output_wav)
         print(f"Signal with hidden message saved to {args.output_wav}")
     except Exception as e:
-        print(f"Error: {e}")
\ No newline at end of file
+        print(f"Error: {e}")
@@ -0,0 +1,673 @@
+import struct
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from stego_core import HEADER_BITS, payload_length, profiled, shift_signal, sp_fft
+from fec import decode_framed, encoded_length, fec_decode, framed_encoded_length
+from echo_kernel import EchoKernel
+
+# Tham số cố định
+FRAME_LENGTH = 4096
+CONTROL_STRENGTH = 0.2
+OVERLAP = 0.5
+NEGATIVE_DELAY = 4
+BATCH_FRAMES = 16
+BLOCK_FRAMES = 256
+DETECT_BATCH_FRAMES = 1024
+LOG_FLOOR = 0.00001
+SYNC_STEPS = 16
+SYNC_FRAMES = 256
+DELAY_STEP = 10
+MAX_BITS_PER_FRAME = 4
+INTERLEAVE_FRAMES = 8
+# File bit nhị phân: magic, phiên bản, num_reps, tên mã FEC (16 byte), số bit, sau đó np.packbits
+BITS_MAGIC = b'EWMB'
+BITS_VERSION = 1
+BITS_HEADER = struct.Struct('<4sBB16sQ')
+
+# Định nghĩa các delay, chỉ số [secret key, watermark]
+DELAY_TABLE = np.array([[130, 120],   # Cho secret key = 0: delay00, delay01
+                        [110, 100]])  # Cho secret key = 1: delay10, delay11
+
+def delay_table(bits_per_frame=1):
+    # Bảng delay M-ary, chỉ số [secret key, ký hiệu k bit]: mỗi key có 2^k delay cách nhau DELAY_STEP,
+    # key = 1 dùng các delay nhỏ nhất. bits_per_frame = 1 cho đúng DELAY_TABLE.
+    if not 1 <= bits_per_frame <= MAX_BITS_PER_FRAME:
+        raise ValueError(f"bits_per_frame must be between 1 and {MAX_BITS_PER_FRAME}!")
+    nsymbol = 2 ** bits_per_frame
+    delays = DELAY_TABLE.min() + DELAY_STEP * np.arange(2 * nsymbol)
+    return np.stack((delays[nsymbol:][::-1], delays[:nsymbol][::-1]))
+
+def frame_count(nbit, bits_per_frame=1):
+    # Số frame cần để mang nbit bit, k bit mỗi frame (xem pack_symbols)
+    block = bits_per_frame * INTERLEAVE_FRAMES
+    return nbit // block * INTERLEAVE_FRAMES + min(nbit % block, INTERLEAVE_FRAMES)
+
+def frame_capacity(nframe, bits_per_frame=1):
+    # Số bit mang được trong nframe frame; khối cuối chưa đủ INTERLEAVE_FRAMES frame chỉ mang 1 bit mỗi frame
+    return nframe // INTERLEAVE_FRAMES * bits_per_frame * INTERLEAVE_FRAMES + nframe % INTERLEAVE_FRAMES
+
+def pack_symbols(bits, bits_per_frame=1):
+    # Gom bit thành ký hiệu k bit theo khối INTERLEAVE_FRAMES frame: bit thứ j của khối nằm ở frame j % 8
+    # của khối, là chữ số thứ j // 8 (bit đầu là bit cao). Các bản lặp liền nhau của repetition code rơi
+    # vào các frame khác nhau, và vị trí của một bit không phụ thuộc tổng số bit (đọc được header trước).
+    block = bits_per_frame * INTERLEAVE_FRAMES
+    padded = np.zeros(-(-len(bits) // block) * block, dtype=np.intp)
+    padded[:len(bits)] = bits
+    weights = 1 << np.arange(bits_per_frame - 1, -1, -1)
+    symbols = weights @ padded.reshape(-1, bits_per_frame, INTERLEAVE_FRAMES)
+    return symbols.ravel()[:frame_count(len(bits), bits_per_frame)]
+
+def unpack_symbols(symbols, bits_per_frame=1):
+    # Ngược lại của pack_symbols, symbols có shape (..., số frame)
+    symbols = np.asarray(symbols, dtype=np.intp)
+    nframe = symbols.shape[-1]
+    padded = np.zeros(symbols.shape[:-1] + (-(-nframe // INTERLEAVE_FRAMES) * INTERLEAVE_FRAMES,), dtype=np.intp)
+    padded[..., :nframe] = symbols
+    padded = padded.reshape(symbols.shape[:-1] + (-1, 1, INTERLEAVE_FRAMES))
+    shifts = np.arange(bits_per_frame - 1, -1, -1)[:, np.newaxis]
+    bits = (padded >> shifts) & 1
+    return bits.reshape(symbols.shape[:-1] + (-1,))
+
+MODES = ('positive', 'negative', 'forward')
+DETECT_METHODS = ('full', 'sparse')
+
+_hann_cache = {}
+
+def hann(frame_length):
+    # Hann window chỉ tính một lần cho mỗi độ dài frame. Cùng công thức (và cùng kết quả từng bit) như
+    # scipy.signal.windows.hann, nhưng không phải import scipy.signal (mất vài giây khi khởi động).
+    window = _hann_cache.get(frame_length)
+    if window is None:
+        if frame_length <= 1:
+            window = np.ones(frame_length)
+        else:
+            window = np.zeros(frame_length)
+            phase = np.linspace(-np.pi, np.pi, frame_length)
+            window += 0.5 * np.cos(0 * phase)
+            window += 0.5 * np.cos(phase)
+        _hann_cache[frame_length] = window
+    return window
+
+@profiled('read_params')
+def read_params(params_file):
+    params = {}
+    with open(params_file, 'r') as f:
+        for line in f:
+            key, value = line.strip().split('=')
+            # Giá trị không phải số (ví dụ fec=conv) giữ dạng chuỗi
+            params[key] = int(value) if value.lstrip('-').isdigit() else value
+    return params
+
+@profiled('read_bits')
+def read_bits(bits_file):
+    # Tự nhận dạng định dạng: file nhị phân (write_bits binary=True) hoặc file văn bản mỗi dòng một bit
+    with open(bits_file, 'rb') as f:
+        data = f.read()
+    info = _bits_header(data, bits_file)
+    if info is None:
+        return np.array(data.split(), dtype=np.int64)
+    packed = np.frombuffer(data, dtype=np.uint8, offset=BITS_HEADER.size)
+    if len(packed) * 8 < info['nbit']:
+        raise ValueError(f"{bits_file}: truncated bit file!")
+    return np.unpackbits(packed, count=info['nbit']).astype(np.int64)
+
+def _bits_header(data, bits_file):
+    if not data.startswith(BITS_MAGIC):
+        return None
+    if len(data) < BITS_HEADER.size:
+        raise ValueError(f"{bits_file}: truncated bit file!")
+    _, version, num_reps, code, nbit = BITS_HEADER.unpack_from(data)
+    if version != BITS_VERSION:
+        raise ValueError(f"{bits_file}: unsupported bit file version {version}!")
+    return {'nbit': nbit, 'code': code.rstrip(b'\0').decode('ascii'), 'num_reps': num_reps}
+
+def read_bits_header(bits_file):
+    # Số bit, mã FEC và num_reps ghi trong file nhị phân (None với file văn bản)
+    with open(bits_file, 'rb') as f:
+        return _bits_header(f.read(BITS_HEADER.size), bits_file)
+
+@profiled('write_bits')
+def write_bits(bits_file, bits, code='none', num_reps=1, binary=False):
+    # Văn bản: mỗi dòng một bit. Nhị phân: header (magic, phiên bản, num_reps, mã FEC, số bit) rồi 8 bit mỗi byte
+    bits = np.asarray(bits)
+    if not binary:
+        with open(bits_file, 'w') as f:
+            f.write(''.join(f"{int(bit)}\n" for bit in bits))
+        return
+    with open(bits_file, 'wb') as f:
+        f.write(BITS_HEADER.pack(BITS_MAGIC, BITS_VERSION, num_reps, code.encode('ascii'), len(bits)))
+        f.write(np.packbits(bits != 0).tobytes())
+
+def select_delays(secret_key, wmark, bits_per_frame=1):
+    # Chọn delay cho từng frame bằng tra bảng: secret key của frame chọn hàng, k bit watermark chọn cột
+    symbols = pack_symbols(wmark, bits_per_frame)
+    return delay_table(bits_per_frame)[np.asarray(secret_key[:len(symbols)], dtype=np.intp), symbols]
+
+def make_kernels(mode, delays, control_strength=CONTROL_STRENGTH, negative_delay=NEGATIVE_DELAY):
+    # Kernel echo cho từng delay theo kiểu nhúng
+    if mode == 'positive':
+        return {d: EchoKernel.single(d, control_strength) for d in delays}
+    if mode == 'negative':
+        return {d: EchoKernel([d, d + negative_delay], [control_strength, -control_strength]) for d in delays}
+    if mode == 'forward':
+        return {d: EchoKernel.single(-d, control_strength) for d in delays}
+    raise ValueError(f"Unknown embedding mode: {mode}")
+
+def frame_view(signal, frame_shift, nframe, frame_length=FRAME_LENGTH):
+    # Chia frame không sao chép dữ liệu: frame i = signal[i * frame_shift: i * frame_shift + frame_length]
+    return sliding_window_view(signal, frame_length)[::frame_shift][:nframe]
+
+def _clear_outside(echo, first_col, d, lead, lag, frame_length):
+    # Đặt 0 các mẫu echo lấy từ ngoài frame (cột c < d hoặc c >= frame_length + d), echo chứa
+    # các cột [first_col, first_col + số cột) của frame. Chỉ lead cột đầu và lag cột cuối frame bị ảnh hưởng.
+    width = echo.shape[1]
+    nlead = min(max(lead - first_col, 0), width)
+    if nlead:
+        cols = np.arange(first_col, first_col + nlead)
+        echo[:, :nlead][cols < d] = 0
+    nlag = min(max(first_col + width - (frame_length - lag), 0), width)
+    if nlag:
+        cols = np.arange(first_col + width - nlag, first_col + width)
+        echo[:, width - nlag:][cols >= frame_length + d] = 0
+
+def embed_frames(host_signal, delays, kernels, segments, start, stop, prev_tail, frame_shift,
+                 frame_length=FRAME_LENGTH, batch_frames=BATCH_FRAMES):
+    # Nhúng các frame [start, stop) vào segments (mỗi hàng là frame_shift mẫu của tín hiệu ra).
+    # Đuôi của frame trước start được cộng từ prev_tail (None: để người gọi cộng sau);
+    # trả về đuôi của frame cuối.
+    if start >= stop:
+        return prev_tail
+    keys = np.unique(delays[start:stop]).tolist()
+    if any(kernels[d].use_fft() for d in keys):
+        return _embed_frames_grouped(host_signal, delays, kernels, segments, start, stop, prev_tail, frame_shift,
+                                     frame_length, batch_frames)
+    tail_length = frame_length - frame_shift
+    window = hann(frame_length)
+
+    # Bảng tap (delay, gain) theo từng delay, đúng thứ tự tap của kernel; tap thiếu có gain 0
+    ntap = max(kernels[d].ntaps for d in keys)
+    tap_delays = np.zeros((len(keys), ntap), dtype=np.int64)
+    tap_gains = np.zeros((len(keys), ntap))
+    for row, d in enumerate(keys):
+        tap_delays[row, :kernels[d].ntaps] = kernels[d].delays
+        tap_gains[row, :kernels[d].ntaps] = kernels[d].gains
+    tap_delays = np.clip(tap_delays, -frame_length, frame_length)
+    shared_gains = [gains[0] if (gains == gains[0]).all() else None for gains in tap_gains.T]
+    # Số mẫu trước đầu frame (echo trễ) và sau cuối frame (echo sớm) mà tap có thể chạm tới
+    lead = max(int(tap_delays.max()), 0)
+    lag = max(-int(tap_delays.min()), 0)
+
+    # Bộ đệm đoạn host của một lô: lead mẫu trước frame đầu, lag mẫu sau frame cuối (ngoài host là 0).
+    # Tap có cùng gain cho mọi frame được nhân gain trên đoạn host một lần rồi mới gather.
+    # Mỗi frame được xử lý thành hai nửa: đầu (frame_shift mẫu, ghi thẳng vào segments) và đuôi.
+    span = (batch_frames - 1) * frame_shift + frame_length + lead + lag
+    region = np.empty(span)
+    sources = [region if gain is None else np.empty(span) for gain in shared_gains]
+    head_views = [sliding_window_view(source, frame_shift) for source in sources]
+    tail_views = [sliding_window_view(source, tail_length) for source in sources]
+    host_heads = sliding_window_view(region, frame_shift)[lead::frame_shift]
+    host_tails = sliding_window_view(region, tail_length)[lead + frame_shift::frame_shift]
+    frame_starts = np.arange(batch_frames) * frame_shift + lead
+    tail_buf = np.empty((batch_frames, tail_length))
+
+    for lo in range(start, stop, batch_frames):
+        hi = min(lo + batch_frames, stop)
+        row = np.searchsorted(keys, delays[lo:hi])
+        starts = frame_starts[:hi - lo]
+
+        a = lo * frame_shift - lead
+        inside = slice(max(-a, 0), min(a + span, len(host_signal)) - a)
+        region[:inside.start] = 0
+        region[inside] = host_signal[a + inside.start:a + inside.stop]
+        region[inside.stop:] = 0
+
+        # Mỗi tap: lấy frame trễ d của tất cả frame bằng một phép gather, bỏ phần rơi ra ngoài frame,
+        # rồi cộng vào frame gốc (cùng thứ tự cộng như EchoKernel.add_to)
+        heads = segments[lo:hi]
+        tails = tail_buf[:hi - lo]
+        for tap in range(ntap):
+            d = tap_delays[row, tap][:, np.newaxis]
+            if shared_gains[tap] is not None:
+                np.multiply(region, shared_gains[tap], out=sources[tap])
+            head_echo = head_views[tap][starts - d[:, 0]]
+            tail_echo = tail_views[tap][starts + frame_shift - d[:, 0]]
+            if shared_gains[tap] is None:
+                head_echo *= tap_gains[row, tap][:, np.newaxis]
+                tail_echo *= tap_gains[row, tap][:, np.newaxis]
+            _clear_outside(head_echo, 0, d, lead, lag, frame_length)
+            _clear_outside(tail_echo, frame_shift, d, lead, lag, frame_length)
+            if tap == 0:
+                np.add(head_echo, host_heads[:hi - lo], out=heads)
+                np.add(tail_echo, host_tails[:hi - lo], out=tails)
+            else:
+                heads += head_echo
+                tails += tail_echo
+
+        # Áp dụng Hann window
+        heads *= window[:frame_shift]
+        tails *= window[frame_shift:]
+
+        # Cộng chồng lấp (overlap-add) phần đuôi của frame trước
+        if prev_tail is not None:
+            heads[0, :tail_length] += prev_tail
+        heads[1:, :tail_length] += tails[:-1]
+        prev_tail = tails[-1].copy()
+
+    return prev_tail
+
+def _embed_frames_grouped(host_signal, delays, kernels, segments, start, stop, prev_tail, frame_shift,
+                          frame_length=FRAME_LENGTH, batch_frames=BATCH_FRAMES):
+    # Như embed_frames cho kernel dài (FFT): nhóm các frame cùng delay và dùng EchoKernel.add_to
+    tail_length = frame_length - frame_shift
+    window = hann(frame_length)
+    frames = frame_view(host_signal, frame_shift, stop, frame_length)
+    echoed_buf = np.empty((batch_frames, frame_length))
+    tails = np.empty((batch_frames, tail_length))
+
+    for lo in range(start, stop, batch_frames):
+        hi = min(lo + batch_frames, stop)
+        batch_delays = delays[lo:hi]
+
+        # Sắp xếp frame theo delay để mỗi nhóm delay là một khối liên tục
+        order = np.argsort(batch_delays, kind='stable')
+        sorted_delays = batch_delays[order]
+        batch = frames[lo:hi][order]
+        echoed = echoed_buf[:hi - lo]
+        echoed[...] = batch
+
+        # Tạo echo cho tất cả frame cùng delay
+        bounds = [0] + (np.flatnonzero(np.diff(sorted_delays)) + 1).tolist() + [len(order)]
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            kernels[int(sorted_delays[a])].add_to(echoed[a:b], batch[a:b])
+
+        # Áp dụng Hann window
+        echoed *= window
+
+        # Cộng chồng lấp (overlap-add) phần đuôi của frame trước
+        segments[lo + order] = echoed[:, :frame_shift]
+        batch_tails = tails[:hi - lo]
+        batch_tails[order] = echoed[:, frame_shift:]
+        if prev_tail is not None:
+            segments[lo, :tail_length] += prev_tail
+        segments[lo + 1:hi, :tail_length] += batch_tails[:-1]
+        prev_tail = batch_tails[-1].copy()
+
+    return prev_tail
+
+@profiled('embed')
+def fit_embed_nbit(wmark_extended, secret_key_extended, embed_nbit, bits_per_frame=1, framed=False):
+    # Giới hạn embed_nbit, mỗi frame mang bits_per_frame bit và dùng một bit secret key. Watermark có header
+    # không được cắt bớt: bên phát hiện sẽ chỉ thấy CRC sai
+    if framed and len(wmark_extended) > embed_nbit:
+        raise ValueError(f"Framed watermark has {len(wmark_extended)} bits but the host holds only {embed_nbit}, "
+                         f"generate it with fewer bits (task1 --effective_nbit)!")
+    return min(embed_nbit, len(wmark_extended), len(secret_key_extended) * bits_per_frame)
+
+def embed_echo(host_signal, wmark_extended, secret_key_extended, frame_shift, embed_nbit, mode,
+               kernels=None, frame_length=FRAME_LENGTH, batch_frames=BATCH_FRAMES, workers=None, bits_per_frame=1,
+               framed=False):
+    embed_nbit = fit_embed_nbit(wmark_extended, secret_key_extended, embed_nbit, bits_per_frame, framed)
+    nframe = frame_count(embed_nbit, bits_per_frame)
+    tail_length = frame_length - frame_shift
+    if tail_length > frame_shift:
+        raise ValueError("Frame overlap must not exceed frame_shift!")
+
+    if nframe > 0 and (nframe - 1) * frame_shift + frame_length > len(host_signal):
+        raise ValueError(f"Host signal is too short for {embed_nbit} watermark bits!")
+
+    delays = select_delays(secret_key_extended[:nframe], wmark_extended[:embed_nbit], bits_per_frame)
+    if kernels is None:
+        kernels = make_kernels(mode, np.unique(delays).tolist())
+    if workers is not None and workers > 1 and nframe > 1:
+        return embed_echo_sharded(host_signal, delays, kernels, frame_shift, frame_length, batch_frames, workers)
+
+    # Khởi tạo tín hiệu nhúng, phần còn lại giữ nguyên tín hiệu gốc
+    echoed_signal = np.empty(len(host_signal))
+    echoed_signal[frame_shift * nframe:] = host_signal[frame_shift * nframe:]
+    segments = echoed_signal[:frame_shift * nframe].reshape(nframe, frame_shift)
+    embed_frames(host_signal, delays, kernels, segments, 0, nframe, np.zeros(tail_length), frame_shift,
+                 frame_length, batch_frames)
+    return echoed_signal
+
+def embed_echo_blocks(host_signal, wmark_extended, secret_key_extended, frame_shift, embed_nbit, mode,
+                      kernels=None, frame_length=FRAME_LENGTH, batch_frames=BATCH_FRAMES, block_frames=BLOCK_FRAMES,
+                      bits_per_frame=1, framed=False):
+    # Như embed_echo nhưng trả về tín hiệu nhúng từng khối block_frames * frame_shift mẫu (giống hệt từng bit),
+    # để ghi file mà không giữ cả tín hiệu float64 trong bộ nhớ. Khối trả về dùng chung bộ đệm, dùng xong mới
+    # lấy khối tiếp theo.
+    embed_nbit = fit_embed_nbit(wmark_extended, secret_key_extended, embed_nbit, bits_per_frame, framed)
+    nframe = frame_count(embed_nbit, bits_per_frame)
+    tail_length = frame_length - frame_shift
+    if tail_length > frame_shift:
+        raise ValueError("Frame overlap must not exceed frame_shift!")
+    if nframe > 0 and (nframe - 1) * frame_shift + frame_length > len(host_signal):
+        raise ValueError(f"Host signal is too short for {embed_nbit} watermark bits!")
+
+    delays = select_delays(secret_key_extended[:nframe], wmark_extended[:embed_nbit], bits_per_frame)
+    if kernels is None:
+        kernels = make_kernels(mode, np.unique(delays).tolist())
+
+    # Mỗi khối chỉ cần host từ frame đầu của khối: echo không lấy mẫu ngoài frame
+    buf = np.empty((block_frames, frame_shift))
+    prev_tail = np.zeros(tail_length)
+    for lo in range(0, nframe, block_frames):
+        hi = min(lo + block_frames, nframe)
+        prev_tail = embed_frames(host_signal[lo * frame_shift:], delays[lo:hi], kernels, buf, 0, hi - lo,
+                                 prev_tail, frame_shift, frame_length, batch_frames)
+        yield buf[:hi - lo].ravel()
+
+    # Phần còn lại giữ nguyên tín hiệu gốc
+    for lo in range(frame_shift * nframe, len(host_signal), block_frames * frame_shift):
+        yield np.asarray(host_signal[lo:lo + block_frames * frame_shift], dtype=np.float64)
+
+@profiled('embed_shard')
+def _embed_shard(host_spec, out_len, delays, kernels, start, stop, first, frame_shift, frame_length, batch_frames):
+    # Chạy trong process con: đọc/ghi trực tiếp trên shared memory của process chính
+    from multiprocessing import shared_memory
+    host_shm = shared_memory.SharedMemory(name=host_spec[0])
+    out_shm = shared_memory.SharedMemory(name=host_spec[3])
+    host_signal = np.ndarray(host_spec[1], dtype=host_spec[2], buffer=host_shm.buf)
+    echoed_signal = np.ndarray(out_len, dtype=np.float64, buffer=out_shm.buf)
+    segments = echoed_signal[:frame_shift * len(delays)].reshape(len(delays), frame_shift)
+    prev_tail = np.zeros(frame_length - frame_shift) if first else None
+    tail = embed_frames(host_signal, delays, kernels, segments, start, stop, prev_tail, frame_shift,
+                        frame_length, batch_frames)
+    del host_signal, echoed_signal, segments
+    host_shm.close()
+    out_shm.close()
+    return tail
+
+def embed_echo_sharded(host_signal, delays, kernels, frame_shift, frame_length=FRAME_LENGTH,
+                       batch_frames=BATCH_FRAMES, workers=None):
+    # Chia các frame thành workers đoạn liên tiếp, mỗi process con nhúng một đoạn trên shared memory.
+    # Đuôi Hann của frame cuối mỗi đoạn được cộng vào frame đầu đoạn sau (cùng một phép cộng
+    # như bản tuần tự), nên kết quả giống hệt từng bit.
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import shared_memory
+    import os
+    workers = workers or os.cpu_count()
+    embed_nbit = len(delays)
+    # Tính window trước để các process con (fork) dùng lại cache
+    hann(frame_length)
+    host_signal = np.asarray(host_signal)
+    host_shm = shared_memory.SharedMemory(create=True, size=max(host_signal.nbytes, 1))
+    out_shm = shared_memory.SharedMemory(create=True, size=max(len(host_signal) * 8, 1))
+    try:
+        host = np.ndarray(host_signal.shape, dtype=host_signal.dtype, buffer=host_shm.buf)
+        host[...] = host_signal
+        echoed_signal = np.ndarray(len(host_signal), dtype=np.float64, buffer=out_shm.buf)
+        echoed_signal[frame_shift * embed_nbit:] = host[frame_shift * embed_nbit:]
+
+        host_spec = (host_shm.name, host.shape, host.dtype.str, out_shm.name)
+        bounds = np.unique(np.linspace(0, embed_nbit, workers + 1).astype(int))
+        with ProcessPoolExecutor(max_workers=len(bounds) - 1) as pool:
+            futures = [pool.submit(_embed_shard, host_spec, len(host), delays, kernels, int(lo), int(hi), lo == 0,
+                                   frame_shift, frame_length, batch_frames)
+                       for lo, hi in zip(bounds[:-1], bounds[1:])]
+            tails = [future.result() for future in futures]
+
+        # Nối các đoạn: cộng đuôi của đoạn trước vào frame đầu của đoạn sau
+        segments = echoed_signal[:frame_shift * embed_nbit].reshape(embed_nbit, frame_shift)
+        for lo, tail in zip(bounds[1:-1], tails[:-1]):
+            segments[lo, :len(tail)] += tail
+        result = echoed_signal.copy()
+        del host, echoed_signal, segments
+    finally:
+        host_shm.close()
+        host_shm.unlink()
+        out_shm.close()
+        out_shm.unlink()
+    return result
+
+def log_spectrum(frames, log_floor=LOG_FLOOR, workers=None):
+    # log(fft(x)^2 + floor) của từng frame, chỉ nửa phổ dương (rfft)
+    spec = sp_fft.rfft(frames, axis=-1, workers=workers)
+    np.square(spec, out=spec)
+    spec += log_floor
+    # log phức = log|z| + i*arg(z), tách ra nhanh hơn np.log trên số phức
+    log_spec = np.empty_like(spec)
+    np.log(np.abs(spec), out=log_spec.real)
+    np.arctan2(spec.imag, spec.real, out=log_spec.imag)
+    return log_spec
+
+def cepstrum(frames, log_floor=LOG_FLOOR, workers=None):
+    # Cepstrum của từng frame: ifft(log(fft(x)^2 + floor)).real, tính bằng rfft/irfft
+    return sp_fft.irfft(log_spectrum(frames, log_floor, workers), n=frames.shape[-1], axis=-1, workers=workers)
+
+_basis_cache = {}
+
+def quefrency_basis(frame_length, quefrencies):
+    # Ma trận cos/sin để tính irfft chỉ tại các quefrency cần dùng.
+    # Hàng xen kẽ (thực, ảo) khớp với log_spec.view(np.float64).
+    key = (frame_length, tuple(quefrencies))
+    basis = _basis_cache.get(key)
+    if basis is None:
+        nbins = frame_length // 2 + 1
+        k = np.arange(nbins)[:, np.newaxis]
+        angle = 2 * np.pi * ((k * np.asarray(quefrencies)[np.newaxis, :]) % frame_length) / frame_length
+        weight = np.full((nbins, 1), 2.0 / frame_length)
+        weight[0] = 1.0 / frame_length
+        if frame_length % 2 == 0:
+            weight[-1] = 1.0 / frame_length
+        basis = np.empty((2 * nbins, len(quefrencies)))
+        basis[0::2] = weight * np.cos(angle)
+        basis[1::2] = -weight * np.sin(angle)
+        # irfft bỏ qua phần ảo của bin DC và Nyquist
+        basis[1] = 0
+        if frame_length % 2 == 0:
+            basis[-1] = 0
+        _basis_cache[key] = basis
+    return basis
+
+def cepstrum_bins(frames, quefrencies, method='full', log_floor=LOG_FLOOR, workers=None):
+    # Giá trị cepstrum tại các quefrency cần dùng, shape (số frame, số quefrency)
+    if method == 'sparse':
+        log_spec = log_spectrum(frames, log_floor, workers)
+        return log_spec.view(np.float64) @ quefrency_basis(frames.shape[-1], quefrencies)
+    if method == 'full':
+        return cepstrum(frames, log_floor, workers)[:, quefrencies]
+    raise ValueError(f"Unknown detection method: {method}")
+
+def detection_quefrencies(signal_type, negative_delay=NEGATIVE_DELAY, bits_per_frame=1):
+    # Các delay có thể dùng, thêm delay + NEGATIVE_DELAY cho signal2
+    delays = np.unique(delay_table(bits_per_frame))
+    if signal_type == 'signal2':
+        return delays, np.concatenate((delays, delays + negative_delay))
+    return delays, delays
+
+def delay_scores(values, ndelay, signal_type):
+    # Điểm của từng delay: ceps[d] hoặc ceps[d] - ceps[d + NEGATIVE_DELAY] cho signal2
+    if signal_type == 'signal2':
+        return values[:, :ndelay] - values[:, ndelay:]
+    return values
+
+def frame_scores(eval_signal, frame_shift, nframe, signal_type, frame_length=FRAME_LENGTH,
+                 negative_delay=NEGATIVE_DELAY, log_floor=LOG_FLOOR, workers=None, batch_frames=DETECT_BATCH_FRAMES,
+                 method='full', bits_per_frame=1):
+    # Điểm cepstrum của từng delay cho từng frame, cepstrum chỉ tính một lần
+    frames = frame_view(eval_signal, frame_shift, nframe, frame_length)
+    delays, quefrencies = detection_quefrencies(signal_type, negative_delay, bits_per_frame)
+    scores = np.empty((len(frames), len(delays)))
+    for start in range(0, len(frames), batch_frames):
+        stop = min(start + batch_frames, len(frames))
+        values = cepstrum_bins(frames[start:stop], quefrencies, method, log_floor, workers)
+        scores[start:stop] = delay_scores(values, len(delays), signal_type)
+    return delays, scores
+
+@profiled('detect')
+def detect_bits(eval_signal, secret_key, frame_shift, embed_nbit, signal_type, frame_length=FRAME_LENGTH,
+                negative_delay=NEGATIVE_DELAY, log_floor=LOG_FLOOR, workers=None, batch_frames=DETECT_BATCH_FRAMES,
+                method='full', bits_per_frame=1):
+    # Giới hạn embed_nbit
+    embed_nbit = min(embed_nbit, len(secret_key) * bits_per_frame)
+    nframe = frame_count(embed_nbit, bits_per_frame)
+    delays, scores = frame_scores(eval_signal, frame_shift, nframe, signal_type, frame_length,
+                                  negative_delay, log_floor, workers, batch_frames, method, bits_per_frame)
+
+    # Ký hiệu của frame: delay mạnh nhất trong 2^k delay do secret key chọn (k = 1: so sánh delay bit 1 với bit 0)
+    key = np.asarray(secret_key[:len(scores)], dtype=np.intp)
+    pos = np.searchsorted(delays, delay_table(bits_per_frame))[key]
+    symbols = np.argmax(np.take_along_axis(scores, pos, axis=1), axis=1)
+    if bits_per_frame == 1:
+        return symbols.astype(np.float64)
+    # Frame thiếu (audio bị cắt) giải ra ký hiệu 0 để các bit còn lại giữ đúng vị trí
+    symbols = np.concatenate((symbols, np.zeros(nframe - len(symbols), dtype=symbols.dtype)))
+    return unpack_symbols(symbols, bits_per_frame)[:embed_nbit].astype(np.float64)
+
+@profiled('detect_framed')
+def detect_framed(eval_signal, secret_key, frame_shift, embed_nbit, signal_type, code='repetition', num_reps=3,
+                  frame_length=FRAME_LENGTH, negative_delay=NEGATIVE_DELAY, log_floor=LOG_FLOOR, workers=None,
+                  batch_frames=DETECT_BATCH_FRAMES, method='full', bits_per_frame=1):
+    # Watermark có header (task1 --framed): phát hiện các frame của header trước, sau đó chỉ phát hiện
+    # tới hết độ dài khai báo thay vì cả embed_nbit bit
+    options = dict(frame_length=frame_length, negative_delay=negative_delay, log_floor=log_floor, workers=workers,
+                   batch_frames=batch_frames, method=method, bits_per_frame=bits_per_frame)
+    nheader = min(encoded_length(HEADER_BITS, code, num_reps), embed_nbit)
+    header = detect_bits(eval_signal, secret_key, frame_shift, nheader, signal_type, **options)
+    nbit = framed_encoded_length(payload_length(fec_decode(header, HEADER_BITS, code, num_reps)), code, num_reps)
+    return detect_bits(eval_signal, secret_key, frame_shift, min(nbit, embed_nbit), signal_type, **options)
+
+def recover_watermark(detected_bits, effective_nbit, rep_code=True, num_reps=3):
+    # Giải mã repetition coding: bit = 1 nếu trung bình num_reps bit phát hiện >= 0.5
+    # (không dùng repetition code: chỉ cắt/thêm 0 cho đủ effective_nbit bit)
+    return fec_decode(detected_bits, effective_nbit, 'repetition' if rep_code else 'none', num_reps)
+
+def recover_payload(detected_bits, code='repetition', num_reps=3):
+    # Watermark có header: giải mã FEC, bỏ header và kiểm tra CRC; trả về (payload, crc_ok)
+    return decode_framed(detected_bits, code, num_reps)
+
+@profiled('evaluate')
+def evaluate_watermark(host_signal, eval_signal, wmark_original, detected_bits, effective_nbit, rep_code=True,
+                       num_reps=3, code=None):
+    # BER (%) của watermark khôi phục và SNR (dB) của tín hiệu đã nhúng so với tín hiệu gốc
+    # (code: mã sửa lỗi trong fec.py, thay cho rep_code)
+    if code is None:
+        code = 'repetition' if rep_code else 'none'
+    wmark_recovered = fec_decode(detected_bits, effective_nbit, code, num_reps)
+    ber = np.sum(np.abs(wmark_recovered - wmark_original)) / effective_nbit * 100
+    host = host_signal.astype(np.float32)
+    snr = 10 * np.log10(np.sum(np.square(host)) / np.sum(np.square(host - eval_signal.astype(np.float32))))
+    return ber, snr
+
+@profiled('score_keys')
+def score_keys(eval_signal, keys, frame_shift, embed_nbit, signal_type, watermark=None, frame_length=FRAME_LENGTH,
+               negative_delay=NEGATIVE_DELAY, log_floor=LOG_FLOOR, workers=None, batch_frames=DETECT_BATCH_FRAMES,
+               method='full', bits_per_frame=1):
+    # Chấm điểm nhiều secret key (ma trận số key x số bit) chỉ với một lần tính cepstrum
+    keys = np.atleast_2d(np.asarray(keys, dtype=np.intp))
+    embed_nbit = min(embed_nbit, keys.shape[1] * bits_per_frame)
+    nframe = frame_count(embed_nbit, bits_per_frame)
+    delays, scores = frame_scores(eval_signal, frame_shift, nframe, signal_type, frame_length,
+                                  negative_delay, log_floor, workers, batch_frames, method, bits_per_frame)
+    nbit = len(scores) if bits_per_frame == 1 else embed_nbit
+    keys = keys[:, :len(scores)]
+
+    # key_ber: tỉ lệ frame mà delay mạnh nhất không thuộc nhóm delay do key chọn
+    table = delay_table(bits_per_frame)
+    strongest_set = np.isin(delays[np.argmax(scores, axis=1)], table[1]).astype(np.intp)
+    key_ber = np.mean(keys != strongest_set, axis=1) * 100
+
+    # Ký hiệu phát hiện với từng key: chỉ phụ thuộc bit key của frame
+    pos = np.searchsorted(delays, table)
+    symbols_key1 = np.argmax(scores[:, pos[1]], axis=1)
+    symbols_key0 = np.argmax(scores[:, pos[0]], axis=1)
+    symbols = np.where(keys == 1, symbols_key1, symbols_key0)
+    if bits_per_frame > 1:
+        symbols = np.concatenate((symbols, np.zeros((len(keys), nframe - len(scores)), dtype=symbols.dtype)), axis=1)
+    detected_bits = unpack_symbols(symbols, bits_per_frame)[:, :nbit]
+
+    result = {'key_ber': key_ber, 'detected_bits': detected_bits}
+    if watermark is not None:
+        wmark = np.asarray(watermark)[:nbit]
+        result['ber'] = np.mean(detected_bits[:, :len(wmark)] != wmark, axis=1) * 100
+    # Xếp hạng: theo BER nếu có watermark, ngược lại theo key_ber
+    result['rank'] = np.argsort(result.get('ber', key_ber), kind='stable')
+    return result
+
+def detect_cost(eval_signal, frame_shift, nframe, signal_type, frame_length=FRAME_LENGTH,
+                negative_delay=NEGATIVE_DELAY, log_floor=LOG_FLOOR, workers=None, repeat=3, bits_per_frame=1,
+                batch_frames=DETECT_BATCH_FRAMES):
+    # So sánh thời gian mỗi frame giữa cepstrum đầy đủ và chỉ tính các bin cần dùng. Chỉ đo tối đa batch_frames
+    # frame đầu, qua đúng đường tính theo lô của frame_scores, nên bộ nhớ không tăng theo độ dài file
+    import time
+    nsample = min(nframe, batch_frames, max((len(eval_signal) - frame_length) // frame_shift + 1, 0))
+    if nsample == 0:
+        raise ValueError("No full frame to measure the detection cost on!")
+    cost = {}
+    for method in DETECT_METHODS:
+        best = None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            frame_scores(eval_signal, frame_shift, nsample, signal_type, frame_length, negative_delay, log_floor,
+                         workers, batch_frames, method, bits_per_frame)
+            elapsed = time.perf_counter() - t0
+            best = elapsed if best is None else min(best, elapsed)
+        cost[method] = best / nsample
+    return cost
+
+def power_cepstrum_bins(frames, quefrencies, log_floor=LOG_FLOOR, workers=None):
+    # Chỉ phần thực của log phổ (log|X|^2), rẻ hơn log phức; đủ để dò vị trí echo
+    spec = sp_fft.rfft(frames, axis=-1, workers=workers)
+    power = np.square(spec.real)
+    power += np.square(spec.imag)
+    power += log_floor
+    np.log(power, out=power)
+    return power @ quefrency_basis(frames.shape[-1], quefrencies)[0::2]
+
+def key_preference(delays, scores, bits_per_frame=1):
+    # Delay mạnh nhất của nhóm key = 1 trừ delay mạnh nhất của nhóm key = 0, cho từng frame
+    pos = np.searchsorted(delays, delay_table(bits_per_frame))
+    return scores[:, pos[1]].max(axis=1) - scores[:, pos[0]].max(axis=1)
+
+@profiled('sync')
+def sync_offset(eval_signal, secret_key, frame_shift, nframe, signal_type, frame_length=FRAME_LENGTH,
+                negative_delay=NEGATIVE_DELAY, log_floor=LOG_FLOOR, workers=None, batch_frames=DETECT_BATCH_FRAMES,
+                method='sparse', bits_per_frame=1):
+    # Tìm vị trí frame đầu tiên khi audio có thêm đoạn ở đầu hoặc bị cắt đầu.
+    # Secret key là mẫu đồng bộ: frame nào đúng vị trí thì delay mạnh nhất thuộc cặp do key chọn.
+    nframe = min(nframe, len(secret_key))
+    sign = 2.0 * np.asarray(secret_key[:nframe]) - 1
+
+    # Bước thô: cepstrum của các frame con ngắn (bước hop) chỉ tính một lần; điểm của frame
+    # bắt đầu ở mọi bội số của hop là trung bình các frame con nằm trong nó (cumsum)
+    hop = max(frame_shift // SYNC_STEPS, 1)
+    width = min(max(frame_shift // 4, 2 * int(delay_table(bits_per_frame).max() + negative_delay)), frame_length)
+    nsub = (len(eval_signal) - width) // hop + 1
+    per_frame = (frame_length - width) // hop + 1
+    if nsub < per_frame:
+        return 0
+    delays, quefrencies = detection_quefrencies(signal_type, negative_delay, bits_per_frame)
+    sub_frames = frame_view(eval_signal, hop, nsub, width)
+    sub_scores = np.empty((nsub, len(delays)))
+    for start in range(0, nsub, batch_frames):
+        stop = min(start + batch_frames, nsub)
+        values = power_cepstrum_bins(sub_frames[start:stop], quefrencies, log_floor, workers)
+        sub_scores[start:stop] = delay_scores(values, len(delays), signal_type)
+    cum = np.concatenate((np.zeros((1, len(delays))), np.cumsum(sub_scores, axis=0)))
+    preference = key_preference(delays, cum[per_frame:] - cum[:-per_frame], bits_per_frame)
+
+    # Tương quan chéo bằng FFT với mẫu key (mỗi bit cách nhau frame_shift / hop vị trí):
+    # corr[j] = sum_i sign[i] * preference[j + i * steps]. Cho phép j < 0 (đầu đoạn
+    # watermark bị cắt) tới một nửa số frame.
+    steps = max(frame_shift // hop, 1)
+    pattern = np.zeros((nframe - 1) * steps + 1)
+    pattern[::steps] = sign
+    nfft = sp_fft.next_fast_len(len(preference) + len(pattern) - 1, real=True)
+    corr = sp_fft.irfft(sp_fft.rfft(preference, nfft) * np.conj(sp_fft.rfft(pattern, nfft)), nfft)
+    back = (nframe // 2) * steps
+    lags = np.concatenate((corr[nfft - back:], corr[:len(preference)]))
+    coarse = (int(np.argmax(lags)) - back) * hop
+
+    # Bước tinh: thử các vị trí quanh kết quả thô với frame đầy đủ
+    ntest = min(nframe, SYNC_FRAMES)
+    best, offset = -np.inf, coarse
+    for candidate in range(coarse - hop, coarse + hop + 1, max(hop // 4, 1)):
+        shifted = shift_signal(eval_signal, candidate)
+        if len(shifted) < frame_length:
+            break
+        _, scores = frame_scores(shifted, frame_shift, ntest, signal_type, frame_length, negative_delay,
+                                 log_floor, workers, batch_frames, method, bits_per_frame)
+        score = np.mean(sign[:len(scores)] * key_preference(delays, scores, bits_per_frame))
+        if score > best:
+            best, offset = score, candidate
+    return offset
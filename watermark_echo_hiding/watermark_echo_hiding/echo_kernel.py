@@ -0,0 +1,182 @@
+import numpy as np
+from stego_core import sp_fft
+
+# Kernels with more taps than this are applied with FFT overlap-add
+DIRECT_MAX_TAPS = 32
+
+class EchoKernel:
+    """
+    Echo kernel h made of (delay, gain) taps, applied as y[n] = sum g * x[n - d].
+
+    Negative delays are allowed and give forward (pre-)echoes. Kernels with a
+    handful of taps are applied as shifted adds; longer ones (multi-echo or
+    dense kernels with hundreds of taps) use an FFT overlap-add convolution
+    whose kernel spectra are cached per FFT size.
+    """
+
+    def __init__(self, delays, gains):
+        """
+        Args:
+            delays (array-like): Tap delays in samples.
+            gains (array-like): Tap gains, same length as delays.
+
+        Raises:
+            ValueError: If the taps are empty or mismatched.
+        """
+        self.delays = np.atleast_1d(np.asarray(delays, dtype=np.int64))
+        self.gains = np.atleast_1d(np.asarray(gains, dtype=np.float64))
+        if self.delays.ndim != 1 or self.delays.shape != self.gains.shape or len(self.delays) == 0:
+            raise ValueError("Echo kernel needs matching, non-empty delays and gains!")
+        self.min_delay = int(self.delays.min())
+        self.max_delay = int(self.delays.max())
+        self._spectra = {}
+
+    @classmethod
+    def single(cls, delay, gain):
+        """
+        Build a one-tap kernel, e.g. [0]*delay + [gain].
+
+        Args:
+            delay (int): Echo delay in samples.
+            gain (float): Echo amplitude.
+
+        Returns:
+            EchoKernel: The kernel.
+        """
+        return cls([delay], [gain])
+
+    @classmethod
+    def from_array(cls, h, offset=0):
+        """
+        Build a kernel from a dense impulse response.
+
+        Args:
+            h (array-like): Impulse response, h[k] is the gain at delay offset + k.
+            offset (int): Delay of h[0] in samples.
+
+        Returns:
+            EchoKernel: The kernel with the non-zero taps of h.
+        """
+        h = np.asarray(h, dtype=np.float64)
+        taps = np.flatnonzero(h)
+        return cls(taps + offset, h[taps])
+
+    @property
+    def ntaps(self):
+        return len(self.delays)
+
+    @property
+    def length(self):
+        """int: Span of the kernel in samples."""
+        return self.max_delay - self.min_delay + 1
+
+    def dense(self):
+        """
+        Returns:
+            np.ndarray: Impulse response starting at delay min_delay.
+        """
+        h = np.zeros(self.length)
+        np.add.at(h, self.delays - self.min_delay, self.gains)
+        return h
+
+    def spectrum(self, nfft):
+        """
+        Real FFT of the dense kernel zero-padded to nfft, cached per size.
+
+        Args:
+            nfft (int): FFT size.
+
+        Returns:
+            np.ndarray: Kernel spectrum (nfft // 2 + 1 bins).
+        """
+        spec = self._spectra.get(nfft)
+        if spec is None:
+            spec = sp_fft.rfft(self.dense(), n=nfft)
+            self._spectra[nfft] = spec
+        return spec
+
+    def use_fft(self, method='auto'):
+        if method == 'auto':
+            return self.ntaps > DIRECT_MAX_TAPS
+        return method == 'fft'
+
+    def add_to(self, out, x, axis=-1, method='auto', workers=None):
+        """
+        Add the echo of x to out in place, out += h * x.
+
+        Samples outside x are taken as zero, so each row along axis is
+        treated as an independent frame. Shifted adds are applied tap by tap
+        in the order the taps were given.
+
+        Args:
+            out (np.ndarray): Accumulator with the shape of x.
+            x (np.ndarray): Input signal or batch of frames.
+            axis (int): Time axis.
+            method (str): 'auto', 'direct' or 'fft'.
+            workers (int): Number of FFT workers (scipy.fft).
+        """
+        if self.use_fft(method):
+            out += self.convolve(x, axis=axis, method='fft', workers=workers)
+            return
+        n = x.shape[axis]
+        out_t = np.moveaxis(out, axis, -1)
+        x_t = np.moveaxis(x, axis, -1)
+        for d, g in zip(self.delays.tolist(), self.gains.tolist()):
+            if abs(d) >= n:
+                continue
+            if d >= 0:
+                out_t[..., d:] += g * x_t[..., :n - d]
+            else:
+                out_t[..., :n + d] += g * x_t[..., -d:]
+
+    def convolve(self, x, axis=-1, method='auto', workers=None):
+        """
+        Compute y = h * x with the same length and alignment as x.
+
+        Args:
+            x (np.ndarray): Input signal or batch of frames.
+            axis (int): Time axis.
+            method (str): 'auto', 'direct' or 'fft'.
+            workers (int): Number of FFT workers (scipy.fft).
+
+        Returns:
+            np.ndarray: Echo signal, float dtype of x (at least float32).
+        """
+        dtype = np.result_type(x.dtype, np.float32)
+        if not self.use_fft(method):
+            y = np.zeros(x.shape, dtype=dtype)
+            self.add_to(y, x, axis=axis, method='direct')
+            return y
+
+        x_t = np.moveaxis(x, axis, -1)
+        n = x_t.shape[-1]
+        K = self.length
+        # With several segments S >= 7K, so each tail only overlaps the next one
+        nfft = sp_fft.next_fast_len(max(8 * K, 1024), real=True)
+        if n + K - 1 <= nfft:
+            nfft = sp_fft.next_fast_len(n + K - 1, real=True)
+        S = nfft - K + 1
+        nseg = -(-n // S)
+
+        pad = [(0, 0)] * (x_t.ndim - 1) + [(0, nseg * S - n)]
+        segs = np.pad(x_t, pad).reshape(x_t.shape[:-1] + (nseg, S))
+        spec = sp_fft.rfft(segs, n=nfft, axis=-1, workers=workers)
+        spec *= self.spectrum(nfft)
+        conv = sp_fft.irfft(spec, n=nfft, axis=-1, workers=workers)
+
+        if nseg == 1:
+            full = conv[..., 0, :]
+        else:
+            # Overlap-add: heads in place, tails shifted by one segment
+            full = np.zeros(x_t.shape[:-1] + (nseg + 1, S), dtype=conv.dtype)
+            full[..., :nseg, :] = conv[..., :S]
+            full[..., 1:, :K - 1] += conv[..., S:]
+            full = full.reshape(x_t.shape[:-1] + ((nseg + 1) * S,))
+
+        # full[m] is the echo at sample m + min_delay
+        y = np.zeros(x_t.shape, dtype=dtype)
+        lo = min(max(self.min_delay, 0), n)
+        hi = min(n, full.shape[-1] + self.min_delay)
+        if hi > lo:
+            y[..., lo:hi] = full[..., lo - self.min_delay:hi - self.min_delay]
+        return np.moveaxis(y, -1, axis)
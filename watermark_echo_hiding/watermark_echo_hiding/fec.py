@@ -0,0 +1,236 @@
+import itertools
+import numpy as np
+from stego_core import CRC_BITS, HEADER_BITS, frame_payload, payload_length, profiled, unframe_payload
+
+# Tham số cố định
+# Mỗi bit mã được nhúng vào NUM_REPS frame liên tiếp (repetition code bên trong): echo giữ nguyên qua nhiều
+# frame bị nhiễu từ frame bên cạnh ít hơn hẳn, nên các mã bên dưới là mã ngoài trên các bit đã lặp
+NUM_REPS = 3
+# Mã chập tốc độ 1/2, độ dài ràng buộc 7 (đa thức 171, 133 hệ 8), kết thúc sau mỗi khối CONV_BLOCK bit
+CONV_K = 7
+CONV_POLYS = (0o171, 0o133)
+CONV_BLOCK = 256
+# BCH(15, 7) sửa 2 lỗi: g(x) = x^8 + x^7 + x^6 + x^4 + 1
+BCH_POLY = 0b111010001
+
+# repetition: chỉ lặp NUM_REPS lần; none: không mã hóa, không lặp
+CODES = ('repetition', 'hamming74', 'bch15_7', 'conv', 'none')
+
+def _poly_mod(value, poly):
+    # Phần dư của phép chia đa thức trên GF(2)
+    nbit = poly.bit_length()
+    while value.bit_length() >= nbit:
+        value ^= poly << (value.bit_length() - nbit)
+    return value
+
+def _block_code(parity, t):
+    # Mã khối hệ thống [I | P]: ma trận sinh, ma trận kiểm tra và bảng mẫu lỗi (trọng số <= t) theo syndrome
+    k, r = parity.shape
+    n = k + r
+    generator = np.hstack((np.eye(k, dtype=np.intp), parity))
+    check = np.hstack((parity.T, np.eye(r, dtype=np.intp)))
+    weights = 1 << np.arange(r - 1, -1, -1)
+    table = np.zeros((1 << r, n), dtype=np.intp)
+    for w in range(1, t + 1):
+        for pos in itertools.combinations(range(n), w):
+            error = np.zeros(n, dtype=np.intp)
+            error[list(pos)] = 1
+            table[(check @ error % 2) @ weights] = error
+    return generator, check, weights, table
+
+# Hamming(7, 4): mỗi cột của phần kiểm tra khác nhau và khác 0
+HAMMING74 = _block_code(np.array([[1, 1, 0], [1, 0, 1], [0, 1, 1], [1, 1, 1]]), 1)
+# BCH(15, 7): hàng i của P là x^(8 + i) mod g(x)
+BCH15_7 = _block_code(np.array([[(_poly_mod(1 << (8 + i), BCH_POLY) >> (7 - j)) & 1 for j in range(8)]
+                                for i in range(7)]), 2)
+BLOCK_CODES = {'hamming74': HAMMING74, 'bch15_7': BCH15_7}
+
+def _interleave_order(n):
+    # Ghi theo hàng, đọc theo cột của bảng khoảng sqrt(n) x sqrt(n): các bit mã liền nhau cách nhau
+    # khoảng sqrt(n) vị trí, nên một đoạn audio khó nhúng (lỗi liên tiếp) rơi vào nhiều từ mã khác nhau
+    depth = max(int(np.ceil(np.sqrt(n))), 1)
+    j = np.arange(n)
+    return np.lexsort((j // depth, j % depth))
+
+def interleave(bits):
+    return np.asarray(bits)[_interleave_order(len(bits))]
+
+def deinterleave(bits):
+    out = np.empty_like(np.asarray(bits))
+    out[_interleave_order(len(bits))] = bits
+    return out
+
+def _reps(code, num_reps):
+    return 1 if code == 'none' else num_reps
+
+def _outer_length(nbit, code):
+    # Số bit sau mã ngoài (trước khi lặp)
+    if code in ('repetition', 'none'):
+        return nbit
+    if code in BLOCK_CODES:
+        k, n = BLOCK_CODES[code][0].shape
+        return -(-nbit // k) * n
+    if code == 'conv':
+        return 2 * (nbit + len(_conv_blocks(nbit)) * (CONV_K - 1))
+    raise ValueError(f"Unknown FEC code: {code}")
+
+def encoded_length(nbit, code='repetition', num_reps=NUM_REPS):
+    # Số bit sau khi mã hóa nbit bit
+    return _outer_length(nbit, code) * _reps(code, num_reps)
+
+def decoded_length(nenc, code='repetition', num_reps=NUM_REPS):
+    # Số bit lớn nhất mã hóa được vào nenc bit
+    nouter = nenc // _reps(code, num_reps)
+    if code in ('repetition', 'none'):
+        return nouter
+    if code in BLOCK_CODES:
+        k, n = BLOCK_CODES[code][0].shape
+        return nouter // n * k
+    if code == 'conv':
+        word = 2 * (CONV_BLOCK + CONV_K - 1)
+        return nouter // word * CONV_BLOCK + max((nouter % word) // 2 - (CONV_K - 1), 0)
+    raise ValueError(f"Unknown FEC code: {code}")
+
+def _pad(bits, n):
+    # Cắt hoặc thêm 0 cho đủ n bit
+    padded = np.zeros(n, dtype=np.intp)
+    used = min(len(bits), n)
+    padded[:used] = np.asarray(bits[:used])
+    return padded
+
+def _conv_taps():
+    # Hệ số của u[t], u[t-1], ..., u[t-K+1] cho từng đa thức (bit cao là u[t])
+    return np.array([[(poly >> (CONV_K - 1 - i)) & 1 for i in range(CONV_K)] for poly in CONV_POLYS])
+
+def _conv_blocks(nbit):
+    # Độ dài các khối CONV_BLOCK bit (khối cuối có thể ngắn hơn)
+    sizes = [CONV_BLOCK] * (nbit // CONV_BLOCK)
+    return sizes + [nbit % CONV_BLOCK] if nbit % CONV_BLOCK else sizes
+
+def conv_encode(bits):
+    # Mỗi khối được thêm K-1 bit 0 để kết thúc ở trạng thái 0; đầu ra xen kẽ hai đa thức.
+    # Các bit 0 này đưa thanh ghi về 0, nên mã hóa cả chuỗi một lần giống hệt mã hóa từng khối
+    bits = np.asarray(bits, dtype=np.intp)
+    tail = np.zeros(CONV_K - 1, dtype=np.intp)
+    edges = np.cumsum([0] + _conv_blocks(len(bits)))
+    u = np.concatenate([bits[:0]] + [part for lo, hi in zip(edges[:-1], edges[1:]) for part in (bits[lo:hi], tail)])
+    out = np.zeros((len(u), len(CONV_POLYS)), dtype=np.intp)
+    for j, taps in enumerate(_conv_taps()):
+        if len(u):
+            out[:, j] = np.convolve(u, taps)[:len(u)] % 2
+    return out.ravel()
+
+_trellis = {}
+
+def _conv_branch_metrics():
+    # Trạng thái là K-1 bit vào gần nhất (bit cao là bit mới nhất). Trạng thái sau ns = b * 2^(K-2) + j
+    # có hai trạng thái trước 2j + x (x = 0, 1), giống nhau với b = 0 và b = 1 (butterfly).
+    # Trả về khoảng cách Hamming của nhánh (ns, x) theo từng ký hiệu 2 bit nhận được: shape (4, 2^(K-1), 2)
+    if not _trellis:
+        nstate = 1 << (CONV_K - 1)
+        ns = np.arange(nstate)[:, np.newaxis]
+        register = ((ns >> (CONV_K - 2)) << (CONV_K - 1)) | ((ns << 1) & (nstate - 1)) | np.arange(2)
+        expected = np.zeros_like(register)
+        for poly in CONV_POLYS:
+            parity = np.zeros_like(register)
+            for i in range(CONV_K):
+                parity ^= (register >> i) & (poly >> i) & 1
+            expected = (expected << 1) | parity
+        distance = np.array([[bin(a ^ b).count('1') for b in range(4)] for a in range(4)], dtype=np.int32)
+        _trellis['branch'] = np.moveaxis(distance[expected], -1, 0)
+    return _trellis['branch']
+
+def viterbi_decode(received, nbit):
+    # Viterbi quyết định cứng cho một khối đã kết thúc, vector hóa theo trạng thái và theo hàng:
+    # received có shape (số khối, 2 * (nbit + K - 1))
+    branch = _conv_branch_metrics()
+    nstate = branch.shape[1]
+    received = np.asarray(received, dtype=np.intp)
+    nrow = received.shape[0]
+    symbols = received[:, 0::2] * 2 + received[:, 1::2]
+    nstep = symbols.shape[1]
+
+    # Bắt đầu ở trạng thái 0
+    metric = np.full((nrow, nstate), 1 << 20, dtype=np.int32)
+    metric[:, 0] = 0
+    decisions = np.empty((nstep, nrow, nstate), dtype=bool)
+    for t in range(nstep):
+        candidates = (metric.reshape(nrow, 1, nstate // 2, 2) +
+                      branch[symbols[:, t]].reshape(nrow, 2, nstate // 2, 2)).reshape(nrow, nstate, 2)
+        decisions[t] = candidates[..., 1] < candidates[..., 0]
+        metric = np.minimum(candidates[..., 0], candidates[..., 1])
+
+    # Truy vết ngược từ trạng thái 0 (đã thêm K-1 bit 0 khi mã hóa)
+    rows = np.arange(nrow)
+    state = np.zeros(nrow, dtype=np.intp)
+    bits = np.empty((nrow, nstep), dtype=np.intp)
+    for t in range(nstep - 1, -1, -1):
+        bits[:, t] = state >> (CONV_K - 2)
+        state = ((state << 1) & (nstate - 1)) | decisions[t, rows, state]
+    return bits[:, :nbit]
+
+def conv_decode(received, nbit):
+    # Giải mã các khối đầy đủ cùng lúc, khối cuối ngắn hơn giải mã riêng
+    blocks = _conv_blocks(nbit)
+    nfull = nbit // CONV_BLOCK
+    word = 2 * (CONV_BLOCK + CONV_K - 1)
+    parts = [viterbi_decode(received[:nfull * word].reshape(nfull, word), CONV_BLOCK).ravel()] if nfull else []
+    if len(blocks) > nfull:
+        parts.append(viterbi_decode(received[np.newaxis, nfull * word:], blocks[-1])[0])
+    return np.concatenate(parts) if parts else np.zeros(0, dtype=np.intp)
+
+def fec_encode(bits, code='repetition', num_reps=NUM_REPS):
+    # Mã ngoài, xáo trộn (interleave) các bit mã, rồi lặp mỗi bit num_reps lần
+    bits = np.asarray(bits, dtype=np.intp)
+    if code in BLOCK_CODES:
+        generator = BLOCK_CODES[code][0]
+        k = generator.shape[0]
+        bits = interleave((_pad(bits, -(-len(bits) // k) * k).reshape(-1, k) @ generator % 2).ravel())
+    elif code == 'conv':
+        bits = interleave(conv_encode(bits))
+    elif code not in ('repetition', 'none'):
+        raise ValueError(f"Unknown FEC code: {code}")
+    return np.repeat(bits, _reps(code, num_reps))
+
+@profiled('fec_decode')
+def fec_decode(bits, nbit, code='repetition', num_reps=NUM_REPS):
+    # Giải mã nbit bit từ các bit phát hiện (thiếu thì coi là 0, thừa thì bỏ)
+    nouter = _outer_length(nbit, code)
+    reps = _reps(code, num_reps)
+    received = _pad(bits, nouter * reps)
+    # Repetition: bit = 1 nếu trung bình reps bit phát hiện >= 0.5
+    received = (received.reshape(nouter, reps).sum(axis=1) / reps >= 0.5).astype(np.intp)
+    if code in BLOCK_CODES:
+        generator, check, weights, table = BLOCK_CODES[code]
+        k, n = generator.shape
+        words = deinterleave(received).reshape(-1, n)
+        # Sửa lỗi theo syndrome, phần đầu của từ mã là bit dữ liệu
+        words ^= table[(words @ check.T % 2) @ weights]
+        received = words[:, :k].ravel()[:nbit]
+    elif code == 'conv':
+        received = conv_decode(deinterleave(received), nbit)
+    elif code not in ('repetition', 'none'):
+        raise ValueError(f"Unknown FEC code: {code}")
+    return received.astype(np.float64)
+
+def framed_encoded_length(nbit, code='repetition', num_reps=NUM_REPS):
+    # Header và phần còn lại (payload + CRC) được mã hóa riêng để đọc được header trước
+    return encoded_length(HEADER_BITS, code, num_reps) + encoded_length(nbit + CRC_BITS, code, num_reps)
+
+def max_framed_payload(nenc, code='repetition', num_reps=NUM_REPS):
+    # Payload lớn nhất có header vừa trong nenc bit
+    rest = nenc - encoded_length(HEADER_BITS, code, num_reps)
+    return max(decoded_length(rest, code, num_reps) - CRC_BITS, 0)
+
+def encode_framed(payload, code='repetition', num_reps=NUM_REPS):
+    framed = frame_payload(payload)
+    return np.concatenate((fec_encode(framed[:HEADER_BITS], code, num_reps),
+                           fec_encode(framed[HEADER_BITS:], code, num_reps)))
+
+def decode_framed(bits, code='repetition', num_reps=NUM_REPS):
+    # Giải mã header trước, sau đó chỉ phần có độ dài khai báo; trả về (payload, crc_ok)
+    head = encoded_length(HEADER_BITS, code, num_reps)
+    header = fec_decode(bits[:head], HEADER_BITS, code, num_reps)
+    nbit = min(payload_length(header) + CRC_BITS, decoded_length(len(bits) - head, code, num_reps))
+    body = fec_decode(bits[head:head + encoded_length(nbit, code, num_reps)], nbit, code, num_reps)
+    return unframe_payload(np.concatenate((header, body)))
@@ -2,39 +2,45 @@
 
 import argparse
 import numpy as np
+from echo_engine import write_bits
+from fec import CODES, encode_framed, fec_encode
+from stego_core import add_profile_argument, enable_profiling
 
 # Tham số cố định
 EFFECTIVE_NBIT = 40
 NUM_REPS = 3
 REP_CODE = True
 
-def task1_generate_keys(watermark_original_file, watermark_extended_file, secret_key_file):
+def task1_generate_keys(watermark_original_file, watermark_extended_file, secret_key_file, effective_nbit=EFFECTIVE_NBIT,
+                        framed=False, code=None, binary=False):
     # Tạo watermark ngẫu nhiên
-    wmark_original = np.random.randint(2, size=EFFECTIVE_NBIT)
+    wmark_original = np.random.randint(2, size=effective_nbit)
 
     # Lưu watermark gốc
-    with open(watermark_original_file, 'w') as f:
-        for d in wmark_original:
-            f.write("%d\n" % d)
+    write_bits(watermark_original_file, wmark_original, binary=binary)
 
-    # Mở rộng watermark
-    wmark_extended = np.repeat(wmark_original, NUM_REPS) if REP_CODE else wmark_original
+    # Mã sửa lỗi (mặc định: repetition code)
+    if code is None:
+        code = 'repetition' if REP_CODE else 'none'
+    reps = 1 if code == 'none' else NUM_REPS
+
+    # Mở rộng watermark. Có header: thêm sync word, độ dài và CRC32 để bên phát hiện dừng đúng ở cuối watermark
+    if framed:
+        wmark_extended = encode_framed(wmark_original, code, NUM_REPS)
+    else:
+        wmark_extended = fec_encode(wmark_original, code, NUM_REPS)
 
     # Lưu watermark mở rộng
-    with open(watermark_extended_file, 'w') as f:
-        for d in wmark_extended:
-            f.write("%d\n" % d)
+    write_bits(watermark_extended_file, wmark_extended, code, reps, binary)
 
     # Tạo secret key ngẫu nhiên
-    secret_key = np.random.randint(2, size=EFFECTIVE_NBIT)
+    secret_key = np.random.randint(2, size=len(wmark_extended) // reps)
 
-    # Mở rộng secret key
-    secret_key_extended = np.repeat(secret_key, NUM_REPS) if REP_CODE else secret_key
+    # Mở rộng secret key như watermark: delay giữ nguyên trong các frame lặp lại
+    secret_key_extended = np.repeat(secret_key, reps)
 
     # Lưu secret key
-    with open(secret_key_file, 'w') as f:
-        for d in secret_key_extended:
-            f.write("%d\n" % d)
+    write_bits(secret_key_file, secret_key_extended, code, reps, binary)
     print("Watermark and secret key generated successfully.")
 
 def main():
@@ -42,12 +48,23 @@ def main():
     parser.add_argument("--watermark_original_file", type=str, default="watermark_ori.dat", help="Output file for original watermark")
     parser.add_argument("--watermark_extended_file", type=str, default="watermark_extended.dat", help="Output file for extended watermark")
     parser.add_argument("--secret_key_file", type=str, default="secret_key.dat", help="Output file for secret key")
+    parser.add_argument("--effective_nbit", type=int, default=EFFECTIVE_NBIT, help="Number of watermark bits")
+    parser.add_argument("--framed", action="store_true", help="Add a length header and CRC32 to the watermark (needs task2 --framed)")
+    parser.add_argument("--fec", type=str, choices=CODES, default=None, help="Error-correcting code (default: repetition, same as task2 --fec)")
+    parser.add_argument("--binary", action="store_true", help="Write bit-packed files instead of one bit per line (read back automatically)")
+    add_profile_argument(parser)
     args = parser.parse_args()
+    if args.profile:
+        enable_profiling(args.profile)
 
     task1_generate_keys(
         args.watermark_original_file,
         args.watermark_extended_file,
-        args.secret_key_file
+        args.secret_key_file,
+        args.effective_nbit,
+        args.framed,
+        args.fec,
+        args.binary
     )
 
 if __name__ == '__main__':
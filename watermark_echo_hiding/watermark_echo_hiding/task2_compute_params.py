@@ -2,7 +2,9 @@
 
 import argparse
 import numpy as np
-from scipy.io import wavfile
+from echo_engine import MAX_BITS_PER_FRAME, frame_capacity
+from fec import CODES, decoded_length, encoded_length, max_framed_payload
+from stego_core import add_profile_argument, enable_profiling, read_wav
 
 # Tham số cố định
 FRAME_LENGTH = 4096
@@ -14,45 +16,82 @@ MAX_EFFECTIVE_NBIT = 40
 def fix(xs):
     return np.floor(xs) if xs >= 0 else np.ceil(xs)
 
-def task2_compute_params(host_signal_file, output_file):
-    # Đọc file âm thanh
-    _, host_signal = wavfile.read(host_signal_file)
-    signal_len = len(host_signal)
-
+def compute_params(signal_len, bits_per_frame=1, max_effective_nbit=MAX_EFFECTIVE_NBIT, framed=False, code=None):
     # Tính toán tham số
     frame_shift = int(FRAME_LENGTH * (1 - OVERLAP))
     overlap_length = int(FRAME_LENGTH * OVERLAP)
-    embed_nbit = fix((signal_len - overlap_length) / frame_shift)
+    embed_nbit = max(fix((signal_len - overlap_length) / frame_shift), 0)
+
+    # M-ary: mỗi frame mang bits_per_frame bit (chọn 1 trong 2^k delay)
+    if not 1 <= bits_per_frame <= MAX_BITS_PER_FRAME:
+        raise ValueError(f"bits_per_frame must be between 1 and {MAX_BITS_PER_FRAME}!")
+    embed_nbit = frame_capacity(int(embed_nbit), bits_per_frame)
 
-    if REP_CODE:
-        effective_nbit = np.floor(embed_nbit / NUM_REPS)
-        effective_nbit = min(effective_nbit, MAX_EFFECTIVE_NBIT)
-        embed_nbit = effective_nbit * NUM_REPS
-    else:
-        effective_nbit = embed_nbit
+    # Giới hạn số bit watermark (max_effective_nbit = 0: dùng hết độ dài file). Watermark có header
+    # không cần giới hạn: bên phát hiện dừng ở độ dài khai báo trong header.
+    if framed:
+        max_effective_nbit = 0
+
+    # Mã sửa lỗi: số bit watermark lớn nhất mà bản mã hóa vừa với embed_nbit (mặc định: repetition code)
+    if code is None:
+        code = 'repetition' if REP_CODE else 'none'
+    effective_nbit = decoded_length(embed_nbit, code, NUM_REPS)
+    if max_effective_nbit > 0 and REP_CODE:
+        effective_nbit = min(effective_nbit, max_effective_nbit)
+    embed_nbit = encoded_length(effective_nbit, code, NUM_REPS)
 
     # Chuyển sang kiểu int
-    frame_shift = int(frame_shift)
-    effective_nbit = int(effective_nbit)
-    embed_nbit = int(embed_nbit)
+    return {'frame_shift': int(frame_shift), 'embed_nbit': int(embed_nbit), 'effective_nbit': int(effective_nbit),
+            'bits_per_frame': bits_per_frame, 'framed': framed, 'fec': code}
+
+def task2_compute_params(host_signal_file, output_file, bits_per_frame=1, max_effective_nbit=MAX_EFFECTIVE_NBIT,
+                         framed=False, code=None):
+    # Đọc file âm thanh
+    _, host_signal = read_wav(host_signal_file)
+    params = compute_params(len(host_signal), bits_per_frame, max_effective_nbit, framed, code)
+    frame_shift = params['frame_shift']
+    embed_nbit = params['embed_nbit']
+    effective_nbit = params['effective_nbit']
+    code = params['fec']
 
     # Lưu tham số
     with open(output_file, 'w') as f:
         f.write(f"frame_shift={frame_shift}\n")
         f.write(f"embed_nbit={embed_nbit}\n")
         f.write(f"effective_nbit={effective_nbit}\n")
+        # Chỉ ghi khi dùng M-ary, file tham số mặc định giữ nguyên
+        if bits_per_frame > 1:
+            f.write(f"bits_per_frame={bits_per_frame}\n")
+        if framed:
+            f.write("framed=1\n")
+        if code != 'repetition':
+            f.write(f"fec={code}\n")
 
     print(f"frame_shift = {frame_shift}")
     print(f"embed_nbit = {embed_nbit}")
     print(f"effective_nbit = {effective_nbit}")
+    if bits_per_frame > 1:
+        print(f"bits_per_frame = {bits_per_frame}")
+    if code != 'repetition':
+        print(f"fec = {code}")
+    if framed:
+        print(f"max payload = {max_framed_payload(embed_nbit, code, NUM_REPS)} bits")
 
 def main():
     parser = argparse.ArgumentParser(description="Compute embedding parameters.")
     parser.add_argument("--host_signal_file", type=str, default="bass_half.wav", help="Input audio file")
     parser.add_argument("--output_file", type=str, default="embed_params.dat", help="Output file for parameters")
+    parser.add_argument("--bits_per_frame", type=int, default=1, help=f"Bits carried by each frame (1 to {MAX_BITS_PER_FRAME}), one of 2^k delays per frame")
+    parser.add_argument("--max_effective_nbit", type=int, default=MAX_EFFECTIVE_NBIT, help="Cap on watermark bits, 0 for as many as the file holds")
+    parser.add_argument("--framed", action="store_true", help="Watermark has a length header and CRC32 (task1 --framed), no cap")
+    parser.add_argument("--fec", type=str, choices=CODES, default=None, help="Error-correcting code (default: repetition, same as task1 --fec)")
+    add_profile_argument(parser)
     args = parser.parse_args()
+    if args.profile:
+        enable_profiling(args.profile)
 
-    task2_compute_params(args.host_signal_file, args.output_file)
+    task2_compute_params(args.host_signal_file, args.output_file, args.bits_per_frame, args.max_effective_nbit,
+                         args.framed, args.fec)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
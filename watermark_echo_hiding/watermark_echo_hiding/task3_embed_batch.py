@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from echo_engine import MODES, delay_table, embed_echo_blocks, hann, make_kernels, read_bits, read_params
+from stego_core import add_profile_argument, enable_profiling, profile_stage, read_wav
+from task2_compute_params import compute_params
+
+# Tham số cố định
+FRAME_LENGTH = 4096
+CONTROL_STRENGTH = 0.2
+NEGATIVE_DELAY = 4
+
+def read_manifest(manifest_file, watermark_extended_file, mode, params_file):
+    # Mỗi dòng: host_signal_file, output_file, secret_key_file, (watermark_extended_file), (mode), (params_file)
+    with open(manifest_file, newline='') as f:
+        reader = csv.DictReader(f)
+        missing = {'host_signal_file', 'output_file', 'secret_key_file'} - set(reader.fieldnames or [])
+        if missing:
+            raise ValueError(f"Manifest is missing column(s): {', '.join(sorted(missing))}")
+        return [{'host_signal_file': row['host_signal_file'],
+                 'output_file': row['output_file'],
+                 'secret_key_file': row['secret_key_file'],
+                 'watermark_extended_file': row.get('watermark_extended_file') or watermark_extended_file,
+                 'mode': row.get('mode') or mode,
+                 'params_file': row.get('params_file') or params_file} for row in reader]
+
+def warm_worker():
+    # Tính Hann window một lần cho mỗi process con
+    hann(FRAME_LENGTH)
+
+def host_params(params_file, signal_len):
+    # Tham số cho một file host: frame_shift/M-ary/FEC theo file tham số, embed_nbit và effective_nbit giới hạn theo số frame
+    # của chính file host (cùng cách tính như task2), nên một file tham số dùng được cho host dài ngắn khác nhau
+    params = read_params(params_file)
+    capacity = compute_params(signal_len, params.get('bits_per_frame', 1), 0, bool(params.get('framed')),
+                              params.get('fec'))
+    if capacity['embed_nbit'] <= 0:
+        raise ValueError("Host signal is too short to embed a watermark!")
+    params['embed_nbit'] = min(params['embed_nbit'], capacity['embed_nbit'])
+    params['effective_nbit'] = min(params.get('effective_nbit', capacity['effective_nbit']), capacity['effective_nbit'])
+    return params
+
+def embed_job(job):
+    # Nhúng một file trong process con, trả về thời gian và lỗi (nếu có)
+    result = dict(job, seconds=0.0, audio_seconds=0.0, error=None)
+    t0 = time.perf_counter()
+    try:
+        with profile_stage('embed_file', file=job['host_signal_file']):
+            if job['mode'] not in MODES:
+                raise ValueError(f"Unknown embedding mode: {job['mode']}")
+            sr, host_signal = read_wav(job['host_signal_file'], mmap=True)
+            result['audio_seconds'] = len(host_signal) / sr
+            params = host_params(job['params_file'], len(host_signal))
+            bits_per_frame = params.get('bits_per_frame', 1)
+            kernels = make_kernels(job['mode'], delay_table(bits_per_frame).ravel().tolist(), CONTROL_STRENGTH,
+                                   negative_delay=NEGATIVE_DELAY)
+            blocks = embed_echo_blocks(host_signal, read_bits(job['watermark_extended_file']),
+                                       read_bits(job['secret_key_file']), params['frame_shift'], params['embed_nbit'],
+                                       job['mode'], kernels=kernels, frame_length=FRAME_LENGTH,
+                                       bits_per_frame=bits_per_frame, framed=bool(params.get('framed')))
+
+            # Ghi từng khối 16-bit, không giữ cả tín hiệu float64 và bản int16 của nó trong bộ nhớ
+            with wave.open(job['output_file'], 'wb') as wav:
+                wav.setnchannels(1 if host_signal.ndim == 1 else host_signal.shape[1])
+                wav.setsampwidth(2)
+                wav.setframerate(sr)
+                for block in blocks:
+                    wav.writeframes(block.astype('<i2').tobytes())
+    except Exception as e:
+        result['error'] = str(e) or type(e).__name__
+    result['seconds'] = time.perf_counter() - t0
+    return result
+
+def task3_embed_batch(manifest_file, watermark_extended_file, params_file, mode='positive', workers=None,
+                      report_file=None):
+    jobs = read_manifest(manifest_file, watermark_extended_file, mode, params_file)
+
+    # Các process con được giữ lại cho nhiều file, numpy/scipy chỉ import một lần mỗi process
+    t0 = time.perf_counter()
+    results = [None] * len(jobs)
+    with ProcessPoolExecutor(max_workers=workers, initializer=warm_worker) as pool:
+        futures = {pool.submit(embed_job, job): i for i, job in enumerate(jobs)}
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            if result['error'] is None:
+                print(f"ok      {result['host_signal_file']} -> {result['output_file']} ({result['mode']})  "
+                      f"{result['seconds']:.2f} s")
+            else:
+                print(f"FAILED  {result['host_signal_file']}: {result['error']}")
+    wall = time.perf_counter() - t0
+
+    # Tổng kết: số file lỗi và thông lượng (giây âm thanh / giây thực)
+    done = [r for r in results if r['error'] is None]
+    audio = sum(r['audio_seconds'] for r in done)
+    print(f"Watermarked {len(done)}/{len(jobs)} files, {len(jobs) - len(done)} failed")
+    print(f"Audio: {audio:.1f} s in {wall:.2f} s wall, throughput {audio / wall if wall > 0 else 0:.1f} audio-s/s")
+
+    if report_file:
+        with open(report_file, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['host_signal_file', 'output_file', 'mode', 'audio_seconds', 'seconds', 'error'])
+            for r in results:
+                writer.writerow([r['host_signal_file'], r['output_file'], r['mode'], f"{r['audio_seconds']:.3f}",
+                                 f"{r['seconds']:.3f}", r['error'] or ''])
+        print(f"Per-file timings saved to {report_file}")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Embed watermarks into many audio files in parallel.")
+    parser.add_argument("--manifest_file", type=str, required=True, help="CSV with host_signal_file, output_file, secret_key_file[, watermark_extended_file, mode, params_file]")
+    parser.add_argument("--watermark_extended_file", type=str, default="watermark_extended.dat", help="Extended watermark file for rows without one")
+    parser.add_argument("--params_file", type=str, default="embed_params.dat", help="Parameters file for rows without one (embed_nbit is capped to each host's length)")
+    parser.add_argument("--mode", type=str, choices=MODES, default='positive', help="Echo type for rows without one")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes")
+    parser.add_argument("--report_file", type=str, default=None, help="Output CSV file for per-file timings")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    if args.profile:
+        enable_profiling(args.profile)
+
+    results = task3_embed_batch(
+        args.manifest_file,
+        args.watermark_extended_file,
+        args.params_file,
+        args.mode,
+        args.workers,
+        args.report_file
+    )
+    if any(r['error'] is not None for r in results):
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -2,75 +2,40 @@
 
 import argparse
 import numpy as np
-from scipy.io import wavfile
-from scipy.signal import windows
+from echo_engine import delay_table, embed_echo, make_kernels, read_bits, read_params
+from stego_core import add_profile_argument, enable_profiling, read_wav, write_wav
 
 # Tham số cố định
 FRAME_LENGTH = 4096
 CONTROL_STRENGTH = 0.2
-OVERLAP = 0.5
 
-def task3_embed_positive(host_signal_file, watermark_extended_file, secret_key_file, params_file, output_file):
+def task3_embed_positive(host_signal_file, watermark_extended_file, secret_key_file, params_file, output_file, kernels=None,
+                         workers=None):
     # Đọc file âm thanh
-    sr, host_signal = wavfile.read(host_signal_file)
-    signal_len = len(host_signal)
+    sr, host_signal = read_wav(host_signal_file)
 
     # Đọc tham số
-    params = {}
-    with open(params_file, 'r') as f:
-        for line in f:
-            key, value = line.strip().split('=')
-            params[key] = int(value)
+    params = read_params(params_file)
     frame_shift = params['frame_shift']
     embed_nbit = params['embed_nbit']
+    bits_per_frame = params.get('bits_per_frame', 1)
+    framed = bool(params.get('framed'))
 
     # Đọc watermark và secret key
-    with open(watermark_extended_file, 'r') as f:
-        wmark_extended = np.array([int(line.strip()) for line in f])
-    with open(secret_key_file, 'r') as f:
-        secret_key_extended = np.array([int(line.strip()) for line in f])
+    wmark_extended = read_bits(watermark_extended_file)
+    secret_key_extended = read_bits(secret_key_file)
 
-    # Giới hạn embed_nbit
-    embed_nbit = min(embed_nbit, len(wmark_extended), len(secret_key_extended))
+    # Kernel echo cho từng delay (có thể truyền kernel nhiều tap qua tham số kernels)
+    if kernels is None:
+        kernels = make_kernels('positive', delay_table(bits_per_frame).ravel().tolist(), CONTROL_STRENGTH)
 
-    # Định nghĩa các delay
-    delay11, delay10 = 100, 110  # Cho secret key = 1
-    delay01, delay00 = 120, 130  # Cho secret key = 0
-
-    # Khởi tạo tín hiệu nhúng
-    echoed_signal = np.zeros(frame_shift * embed_nbit)
-    prev = np.zeros(FRAME_LENGTH)
-
-    pointer = 0
-    for i in range(embed_nbit):
-        frame = host_signal[pointer: pointer + FRAME_LENGTH]
-
-        # Chọn delay
-        if secret_key_extended[i] == 1:
-            delay = delay11 if wmark_extended[i] == 1 else delay10
-        else:
-            delay = delay01 if wmark_extended[i] == 1 else delay00
-
-        # Tạo positive echo
-        echo = CONTROL_STRENGTH * np.concatenate((np.zeros(delay), frame[:FRAME_LENGTH - delay]))
-
-        # Tạo frame đã nhúng
-        echoed_frame = frame + echo
-
-        # Áp dụng Hann window
-        overlap_length = int(FRAME_LENGTH * OVERLAP)
-        echoed_frame = echoed_frame * windows.hann(FRAME_LENGTH)
-        echoed_signal[frame_shift * i: frame_shift * (i+1)] = np.concatenate(
-            (prev[frame_shift:FRAME_LENGTH] + echoed_frame[:overlap_length], echoed_frame[overlap_length:frame_shift]))
-        prev = echoed_frame
-
-        pointer += frame_shift
-
-    # Nối phần còn lại
-    echoed_signal = np.concatenate((echoed_signal, host_signal[len(echoed_signal):]))
+    # Nhúng tất cả frame theo lô (workers > 1: chia frame cho nhiều process)
+    echoed_signal = embed_echo(host_signal, wmark_extended, secret_key_extended, frame_shift, embed_nbit,
+                               'positive', kernels=kernels, frame_length=FRAME_LENGTH, workers=workers,
+                               bits_per_frame=bits_per_frame, framed=framed)
 
     # Lưu file âm thanh
-    wavfile.write(output_file, sr, echoed_signal.astype(np.int16))
+    write_wav(output_file, sr, echoed_signal.astype(np.int16))
 
 def main():
     parser = argparse.ArgumentParser(description="Embed watermark using positive echo.")
@@ -79,14 +44,19 @@ def main():
     parser.add_argument("--secret_key_file", type=str, default="secret_key.dat", help="Secret key file")
     parser.add_argument("--params_file", type=str, default="embed_params.dat", help="Parameters file")
     parser.add_argument("--output_file", type=str, default="wmed_signal1.wav", help="Output watermarked audio file")
+    parser.add_argument("--workers", type=int, default=None, help="Number of processes sharing the frames")
+    add_profile_argument(parser)
     args = parser.parse_args()
+    if args.profile:
+        enable_profiling(args.profile)
 
     task3_embed_positive(
         args.host_signal_file,
         args.watermark_extended_file,
         args.secret_key_file,
         args.params_file,
-        args.output_file
+        args.output_file,
+        workers=args.workers
     )
 
     print(f"Watermarked by positive echo saved to {args.output_file}")
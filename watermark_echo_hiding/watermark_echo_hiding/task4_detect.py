@@ -1,63 +1,62 @@
 #!/usr/bin/env python3
 
 import argparse
-import numpy as np
-from scipy.io import wavfile
+from echo_engine import DETECT_METHODS, detect_bits, detect_cost, detect_framed, frame_count, read_bits, read_params, shift_signal, sync_offset, write_bits
+from stego_core import add_profile_argument, enable_profiling, read_wav
 
 # Tham số cố định
 FRAME_LENGTH = 4096
 OVERLAP = 0.5
 NEGATIVE_DELAY = 4
 LOG_FLOOR = 0.00001
+REP_CODE = True
+NUM_REPS = 3
 
-def task4_detect(watermark_signal_file, secret_key_file, params_file, output_file, signal_type):
+def task4_detect(watermark_signal_file, secret_key_file, params_file, output_file, signal_type, workers=None,
+                 method='full', compare_cost=False, sync=False, binary=False):
     # Đọc file âm thanh đã nhúng
-    _, eval_signal = wavfile.read(watermark_signal_file)
+    _, eval_signal = read_wav(watermark_signal_file)
 
     # Đọc tham số
-    params = {}
-    with open(params_file, 'r') as f:
-        for line in f:
-            key, value = line.strip().split('=')
-            params[key] = int(value)
+    params = read_params(params_file)
     frame_shift = params['frame_shift']
     embed_nbit = params['embed_nbit']
+    bits_per_frame = params.get('bits_per_frame', 1)
+    nframe = frame_count(embed_nbit, bits_per_frame)
+    code = params.get('fec', 'repetition' if REP_CODE else 'none')
 
     # Đọc secret key
-    with open(secret_key_file, 'r') as f:
-        secret_key = np.array([int(line.strip()) for line in f])
+    secret_key = read_bits(secret_key_file)
 
-    # Giới hạn embed_nbit
-    embed_nbit = min(embed_nbit, len(secret_key))
+    # Đồng bộ frame khi audio bị cắt đầu hoặc có thêm đoạn ở đầu
+    if sync:
+        offset = sync_offset(eval_signal, secret_key, frame_shift, nframe, signal_type,
+                             frame_length=FRAME_LENGTH, negative_delay=NEGATIVE_DELAY, log_floor=LOG_FLOOR,
+                             workers=workers, bits_per_frame=bits_per_frame)
+        eval_signal = shift_signal(eval_signal, offset)
+        print(f"Frame offset: {offset} samples")
 
-    # Định nghĩa các delay
-    delay11, delay10 = 100, 110  # Cho secret key = 1
-    delay01, delay00 = 120, 130  # Cho secret key = 0
+    # So sánh chi phí mỗi frame giữa hai cách tính cepstrum
+    if compare_cost:
+        cost = detect_cost(eval_signal, frame_shift, min(nframe, len(secret_key)), signal_type,
+                           frame_length=FRAME_LENGTH, negative_delay=NEGATIVE_DELAY, log_floor=LOG_FLOOR,
+                           workers=workers, bits_per_frame=bits_per_frame)
+        print("Per-frame cost: " + ", ".join(f"{m} {c * 1e6:.1f} us" for m, c in cost.items()))
+        print(f"Faster method: {min(cost, key=cost.get)}")
 
-    # Phát hiện bit
-    detected_bits = np.zeros(embed_nbit)
-    pointer = 0
-    for i in range(embed_nbit):
-        wmarked_frame = eval_signal[pointer: pointer + FRAME_LENGTH]
-        ceps = np.fft.ifft(np.log(np.square(np.fft.fft(wmarked_frame)) + LOG_FLOOR)).real
-
-        if secret_key[i] == 1:
-            if signal_type == 'signal2':
-                detected_bits[i] = 1 if (ceps[delay11] - ceps[delay11 + NEGATIVE_DELAY]) > (ceps[delay10] - ceps[delay10 + NEGATIVE_DELAY]) else 0
-            else:
-                detected_bits[i] = 1 if ceps[delay11] > ceps[delay10] else 0
-        else:
-            if signal_type == 'signal2':
-                detected_bits[i] = 1 if (ceps[delay01] - ceps[delay01 + NEGATIVE_DELAY]) > (ceps[delay00] - ceps[delay00 + NEGATIVE_DELAY]) else 0
-            else:
-                detected_bits[i] = 1 if ceps[delay01] > ceps[delay00] else 0
-
-        pointer += frame_shift
+    # Phát hiện bit: cepstrum của tất cả frame tính theo lô, M-ary lấy argmax trên 2^k delay.
+    # Watermark có header: chỉ phát hiện tới hết độ dài khai báo.
+    if params.get('framed'):
+        detected_bits = detect_framed(eval_signal, secret_key, frame_shift, embed_nbit, signal_type, code, NUM_REPS,
+                                      frame_length=FRAME_LENGTH, negative_delay=NEGATIVE_DELAY, log_floor=LOG_FLOOR,
+                                      workers=workers, method=method, bits_per_frame=bits_per_frame)
+    else:
+        detected_bits = detect_bits(eval_signal, secret_key, frame_shift, embed_nbit, signal_type,
+                                    frame_length=FRAME_LENGTH, negative_delay=NEGATIVE_DELAY, log_floor=LOG_FLOOR,
+                                    workers=workers, method=method, bits_per_frame=bits_per_frame)
 
     # Lưu kết quả phát hiện
-    with open(output_file, 'w') as f:
-        for bit in detected_bits:
-            f.write(f"{int(bit)}\n")
+    write_bits(output_file, detected_bits, code, 1 if code == 'none' else NUM_REPS, binary)
     print(f"Detected bits saved to {output_file}")
     print(f"Detected bits: {detected_bits}")
     
@@ -69,14 +68,27 @@ def main():
     parser.add_argument("--params_file", type=str, default="embed_params.dat", help="Parameters file")
     parser.add_argument("--output_file", type=str, default="detected_bits.dat", help="Output file for detected bits")
     parser.add_argument("--signal_type", type=str, choices=['signal1', 'signal2', 'signal3'], required=True, help="Type of signal (signal1, signal2, signal3)")
+    parser.add_argument("--workers", type=int, default=None, help="Number of FFT worker threads")
+    parser.add_argument("--method", type=str, choices=DETECT_METHODS, default='full', help="Full cepstrum or only the needed quefrency bins")
+    parser.add_argument("--compare_cost", action="store_true", help="Report per-frame cost of both detection methods")
+    parser.add_argument("--sync", action="store_true", help="Search for the first frame in cropped or offset audio")
+    parser.add_argument("--binary", action="store_true", help="Write the detected bits bit-packed instead of one per line")
+    add_profile_argument(parser)
     args = parser.parse_args()
+    if args.profile:
+        enable_profiling(args.profile)
 
     task4_detect(
         args.watermark_signal_file,
         args.secret_key_file,
         args.params_file,
         args.output_file,
-        args.signal_type
+        args.signal_type,
+        args.workers,
+        args.method,
+        args.compare_cost,
+        args.sync,
+        args.binary
     )
 
 if __name__ == '__main__':
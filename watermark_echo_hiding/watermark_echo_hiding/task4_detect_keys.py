@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+import argparse
+import numpy as np
+from echo_engine import DETECT_METHODS, read_bits, read_params, score_keys
+from stego_core import add_profile_argument, enable_profiling, read_wav
+
+# Tham số cố định
+FRAME_LENGTH = 4096
+NEGATIVE_DELAY = 4
+LOG_FLOOR = 0.00001
+
+def task4_detect_keys(watermark_signal_file, secret_key_files, params_file, signal_type, watermark_extended_file=None,
+                      output_file=None, top=10, workers=None, method='full'):
+    # Đọc file âm thanh đã nhúng
+    _, eval_signal = read_wav(watermark_signal_file)
+
+    # Đọc tham số
+    params = read_params(params_file)
+    frame_shift = params['frame_shift']
+    embed_nbit = params['embed_nbit']
+    bits_per_frame = params.get('bits_per_frame', 1)
+
+    # Đọc tất cả secret key thành một ma trận
+    keys = [read_bits(f) for f in secret_key_files]
+    nbit = min(len(k) for k in keys)
+    keys = np.stack([k[:nbit] for k in keys])
+    wmark_extended = read_bits(watermark_extended_file) if watermark_extended_file else None
+
+    # Chấm điểm tất cả key trong một lần duyệt
+    result = score_keys(eval_signal, keys, frame_shift, embed_nbit, signal_type, watermark=wmark_extended,
+                        frame_length=FRAME_LENGTH, negative_delay=NEGATIVE_DELAY, log_floor=LOG_FLOOR,
+                        workers=workers, method=method, bits_per_frame=bits_per_frame)
+
+    # Lưu kết quả xếp hạng
+    rows = []
+    for rank, i in enumerate(result['rank'], 1):
+        row = [rank, secret_key_files[i], result['key_ber'][i]]
+        if 'ber' in result:
+            row.append(result['ber'][i])
+        rows.append(row)
+    if output_file:
+        with open(output_file, 'w') as f:
+            f.write("rank,secret_key_file,key_ber" + (",ber" if 'ber' in result else "") + "\n")
+            for row in rows:
+                f.write(",".join([str(row[0]), row[1]] + [f"{v:.2f}" for v in row[2:]]) + "\n")
+        print(f"Key scores saved to {output_file}")
+
+    print(f"Scored {len(secret_key_files)} keys over {result['detected_bits'].shape[1]} frames")
+    for row in rows[:top]:
+        line = f"{row[0]:4d}  {row[1]}  key BER: {row[2]:.2f}%"
+        if len(row) > 3:
+            line += f"  BER: {row[3]:.2f}%"
+        print(line)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank candidate secret keys against one watermarked audio file.")
+    parser.add_argument("--watermark_signal_file", type=str, required=True, help="Input watermarked audio file")
+    parser.add_argument("--secret_key_files", type=str, nargs='+', required=True, help="Candidate secret key files")
+    parser.add_argument("--params_file", type=str, default="embed_params.dat", help="Parameters file")
+    parser.add_argument("--signal_type", type=str, choices=['signal1', 'signal2', 'signal3'], required=True, help="Type of signal (signal1, signal2, signal3)")
+    parser.add_argument("--watermark_extended_file", type=str, default=None, help="Extended watermark file, ranks keys by BER when given")
+    parser.add_argument("--output_file", type=str, default=None, help="Output CSV file for the ranked keys")
+    parser.add_argument("--top", type=int, default=10, help="Number of keys to print")
+    parser.add_argument("--workers", type=int, default=None, help="Number of FFT worker threads")
+    parser.add_argument("--method", type=str, choices=DETECT_METHODS, default='full', help="Full cepstrum or only the needed quefrency bins")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    if args.profile:
+        enable_profiling(args.profile)
+
+    task4_detect_keys(
+        args.watermark_signal_file,
+        args.secret_key_files,
+        args.params_file,
+        args.signal_type,
+        args.watermark_extended_file,
+        args.output_file,
+        args.top,
+        args.workers,
+        args.method
+    )
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,8 @@
 #!/usr/bin/env python3
 
 import argparse
-import numpy as np
-from scipy.io import wavfile
+from echo_engine import evaluate_watermark, read_bits, read_params, recover_payload
+from stego_core import add_profile_argument, enable_profiling, read_wav
 
 # Tham số cố định
 REP_CODE = True
@@ -10,42 +10,32 @@ NUM_REPS = 3
 
 def task5_evaluate(host_signal_file, watermark_signal_file, watermark_original_file, detected_bits_file, params_file):
     # Đọc file âm thanh
-    _, host_signal = wavfile.read(host_signal_file)
-    _, eval_signal = wavfile.read(watermark_signal_file)
+    _, host_signal = read_wav(host_signal_file)
+    _, eval_signal = read_wav(watermark_signal_file)
 
     # Đọc tham số
-    params = {}
-    with open(params_file, 'r') as f:
-        for line in f:
-            key, value = line.strip().split('=')
-            params[key] = int(value)
+    params = read_params(params_file)
     effective_nbit = params['effective_nbit']
 
     # Đọc watermark gốc
-    with open(watermark_original_file, 'r') as f:
-        wmark_original = np.array([int(line.strip()) for line in f])
+    wmark_original = read_bits(watermark_original_file)
 
     # Đọc bit phát hiện
-    with open(detected_bits_file, 'r') as f:
-        detected_bits = np.array([int(line.strip()) for line in f])
+    detected_bits = read_bits(detected_bits_file)
 
-    # Xử lý repetition coding
-    if REP_CODE:
-        wmark_recovered = np.zeros(effective_nbit)
-        count = 0
-        for i in range(effective_nbit):
-            ave = np.sum(detected_bits[count:count + NUM_REPS]) / NUM_REPS
-            wmark_recovered[i] = 1 if ave >= 0.5 else 0
-            count += NUM_REPS
-    else:
-        wmark_recovered = detected_bits
-
-    # Tính BER
-    ber = np.sum(np.abs(wmark_recovered - wmark_original)) / effective_nbit * 100
+    # Mã sửa lỗi ghi trong file tham số (task2 --fec), mặc định repetition code
+    code = params.get('fec', 'repetition' if REP_CODE else 'none')
 
-    # Tính SNR
-    snr = 10 * np.log10(np.sum(np.square(host_signal.astype(np.float32))) /
-                        np.sum(np.square(host_signal.astype(np.float32) - eval_signal.astype(np.float32))))
+    # Watermark có header: giải mã FEC, bỏ header và kiểm tra CRC trước khi tính BER
+    if params.get('framed'):
+        payload, crc_ok = recover_payload(detected_bits, code, NUM_REPS)
+        print(f"Payload: {len(payload)} bits, CRC {'OK' if crc_ok else 'mismatch'}")
+        ber, snr = evaluate_watermark(host_signal, eval_signal, wmark_original, payload, len(wmark_original),
+                                      rep_code=False)
+    else:
+        # Giải mã FEC, tính BER và SNR
+        ber, snr = evaluate_watermark(host_signal, eval_signal, wmark_original, detected_bits, effective_nbit,
+                                      num_reps=NUM_REPS, code=code)
 
     # Lưu kết quả
     print(f"BER: {ber:.2f}%")
@@ -63,7 +53,10 @@ def main():
     parser.add_argument("--detected_bits_file", type=str, required=True, help="Detected bits file")
     parser.add_argument("--params_file", type=str, default="embed_params.dat", help="Parameters file")
     # parser.add_argument("--output_file", type=str, default="results.txt", help="Output file for results")
+    add_profile_argument(parser)
     args = parser.parse_args()
+    if args.profile:
+        enable_profiling(args.profile)
 
     task5_evaluate(
         args.host_signal_file,
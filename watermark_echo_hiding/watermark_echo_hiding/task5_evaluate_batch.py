@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from echo_engine import DETECT_METHODS, detect_bits, detect_framed, evaluate_watermark, hann, read_bits, recover_payload
+from stego_core import add_profile_argument, enable_profiling, profile_stage, read_wav, sp_fft
+from task3_embed_batch import host_params
+
+# Tham số cố định
+FRAME_LENGTH = 4096
+NEGATIVE_DELAY = 4
+LOG_FLOOR = 0.00001
+REP_CODE = True
+NUM_REPS = 3
+
+REPORT_FIELDS = ['watermark_signal_file', 'signal_type', 'secret_key_file', 'host_signal_file', 'params_file', 'ber',
+                 'snr', 'seconds', 'error']
+
+def params_mtime(params_file):
+    # Thời điểm sửa file tham số, để checkpoint không dùng lại kết quả tính với tham số cũ
+    try:
+        return os.path.getmtime(params_file)
+    except OSError:
+        return None
+
+def read_manifest(manifest_file, secret_key_file, host_signal_file, watermark_original_file, params_file):
+    # Mỗi dòng: watermark_signal_file, signal_type, (secret_key_file), (host_signal_file), (watermark_original_file),
+    # (params_file), cùng cột params_file như manifest của task3_embed_batch
+    with open(manifest_file, newline='') as f:
+        reader = csv.DictReader(f)
+        missing = {'watermark_signal_file', 'signal_type'} - set(reader.fieldnames or [])
+        if missing:
+            raise ValueError(f"Manifest is missing column(s): {', '.join(sorted(missing))}")
+        return [{'watermark_signal_file': row['watermark_signal_file'],
+                 'signal_type': row['signal_type'],
+                 'secret_key_file': row.get('secret_key_file') or secret_key_file,
+                 'host_signal_file': row.get('host_signal_file') or host_signal_file,
+                 'watermark_original_file': row.get('watermark_original_file') or watermark_original_file,
+                 'params_file': row.get('params_file') or params_file,
+                 'params_mtime': params_mtime(row.get('params_file') or params_file)}
+                for row in reader]
+
+def job_key(job):
+    return (job['watermark_signal_file'], job['signal_type'], job['secret_key_file'], job.get('params_file'),
+            job.get('params_mtime'))
+
+def read_checkpoint(checkpoint_file):
+    # Kết quả đã xong từ lần chạy trước (mỗi dòng một JSON), chỉ giữ các file không lỗi
+    done = {}
+    if checkpoint_file and os.path.exists(checkpoint_file):
+        with open(checkpoint_file, 'r') as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue  # dòng cuối bị ghi dở khi process bị dừng
+                if row.get('error') is None:
+                    done[job_key(row)] = row
+    return done
+
+def warm_worker():
+    # Import scipy.fft và tính Hann window (bằng numpy, lưu cache) một lần cho mỗi process con
+    hann(FRAME_LENGTH)
+    sp_fft.load()
+
+def audit_job(job, method):
+    # Phát hiện và đánh giá một file, BER/SNR tính trong bộ nhớ
+    row = {field: job.get(field) for field in REPORT_FIELDS}
+    row['params_mtime'] = job.get('params_mtime')
+    t0 = time.perf_counter()
+    try:
+        with profile_stage('audit_file', file=job['watermark_signal_file']):
+            # Tham số giống hệt lúc nhúng: file tham số của dòng, embed_nbit giới hạn theo độ dài file host
+            _, host_signal = read_wav(job['host_signal_file'], mmap=True)
+            params = host_params(job['params_file'], len(host_signal))
+            _, eval_signal = read_wav(job['watermark_signal_file'], mmap=True)
+            secret_key = read_bits(job['secret_key_file'])
+            options = dict(frame_length=FRAME_LENGTH, negative_delay=NEGATIVE_DELAY, log_floor=LOG_FLOOR,
+                           method=method, bits_per_frame=params.get('bits_per_frame', 1))
+            code = params.get('fec', 'repetition' if REP_CODE else 'none')
+            wmark_original = read_bits(job['watermark_original_file'])
+            if params.get('framed'):
+                # Watermark có header: chỉ phát hiện tới hết độ dài khai báo, BER tính trên payload
+                detected_bits = detect_framed(eval_signal, secret_key, params['frame_shift'], params['embed_nbit'],
+                                              job['signal_type'], code, NUM_REPS, **options)
+                payload, _ = recover_payload(detected_bits, code, NUM_REPS)
+                ber, snr = evaluate_watermark(host_signal, eval_signal, wmark_original, payload, len(wmark_original),
+                                              rep_code=False)
+            else:
+                detected_bits = detect_bits(eval_signal, secret_key, params['frame_shift'], params['embed_nbit'],
+                                            job['signal_type'], **options)
+                # Host ngắn chỉ mang phần đầu của watermark (effective_nbit đã giới hạn theo host)
+                effective_nbit = params['effective_nbit']
+                ber, snr = evaluate_watermark(host_signal, eval_signal, wmark_original[:effective_nbit], detected_bits,
+                                              effective_nbit, num_reps=NUM_REPS, code=code)
+            row['ber'] = float(ber)
+            row['snr'] = float(snr)
+    except Exception as e:
+        row['error'] = str(e) or type(e).__name__
+    row['seconds'] = time.perf_counter() - t0
+    return row
+
+def write_report(rows, output_file):
+    # Báo cáo tổng hợp: JSON nếu đuôi .json, ngược lại CSV
+    if output_file.lower().endswith('.json'):
+        with open(output_file, 'w') as f:
+            json.dump([{k: row[k] for k in REPORT_FIELDS} for row in rows], f, indent=2)
+        return
+    with open(output_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(REPORT_FIELDS)
+        for row in rows:
+            writer.writerow(['' if row[k] is None else f"{row[k]:.2f}" if isinstance(row[k], float) else row[k]
+                             for k in REPORT_FIELDS])
+
+def task5_evaluate_batch(manifest_file, output_file, secret_key_file, host_signal_file, watermark_original_file,
+                         params_file, workers=None, checkpoint_file=None, method='full'):
+    jobs = read_manifest(manifest_file, secret_key_file, host_signal_file, watermark_original_file, params_file)
+    if checkpoint_file is None:
+        checkpoint_file = output_file + '.ckpt'
+
+    # Bỏ qua các file đã xong trong checkpoint
+    done = read_checkpoint(checkpoint_file)
+    todo = [job for job in jobs if job_key(job) not in done]
+    if done:
+        print(f"Resuming: {len(jobs) - len(todo)} of {len(jobs)} files already done")
+
+    t0 = time.perf_counter()
+    with open(checkpoint_file, 'a') as ckpt, \
+            ProcessPoolExecutor(max_workers=workers, initializer=warm_worker) as pool:
+        futures = [pool.submit(audit_job, job, method) for job in todo]
+        for count, future in enumerate(as_completed(futures), 1):
+            row = future.result()
+            done[job_key(row)] = row
+            ckpt.write(json.dumps(row) + "\n")
+            ckpt.flush()
+
+            # Tiến độ: tốc độ và thời gian còn lại
+            elapsed = time.perf_counter() - t0
+            rate = count / elapsed if elapsed > 0 else 0
+            eta = (len(todo) - count) / rate if rate > 0 else 0
+            status = (f"BER {row['ber']:.2f}%  SNR {row['snr']:.2f} dB" if row['error'] is None
+                      else f"FAILED: {row['error']}")
+            print(f"[{len(jobs) - len(todo) + count}/{len(jobs)}] {row['watermark_signal_file']}  {status}  "
+                  f"({rate:.1f} files/s, ETA {eta:.0f} s)")
+
+    # Báo cáo theo thứ tự manifest
+    rows = [done[job_key(job)] for job in jobs]
+    write_report(rows, output_file)
+    ok = [row for row in rows if row['error'] is None]
+    print(f"Report saved to {output_file}")
+    print(f"Evaluated {len(ok)}/{len(rows)} files, {len(rows) - len(ok)} failed")
+    if ok:
+        print(f"Mean BER: {np.mean([row['ber'] for row in ok]):.2f}%")
+        print(f"Mean SNR: {np.mean([row['snr'] for row in ok]):.2f} dB")
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Detect and evaluate many watermarked audio files in parallel.")
+    parser.add_argument("--manifest_file", type=str, required=True, help="CSV with watermark_signal_file, signal_type[, secret_key_file, host_signal_file, watermark_original_file, params_file]")
+    parser.add_argument("--output_file", type=str, default="evaluation.csv", help="Consolidated report (.csv or .json)")
+    parser.add_argument("--secret_key_file", type=str, default="secret_key.dat", help="Secret key file for rows without one")
+    parser.add_argument("--host_signal_file", type=str, default="bass_half.wav", help="Original audio file for rows without one")
+    parser.add_argument("--watermark_original_file", type=str, default="watermark_ori.dat", help="Original watermark file for rows without one")
+    parser.add_argument("--params_file", type=str, default="embed_params.dat", help="Parameters file for rows without one (embed_nbit is capped to each host's length)")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes")
+    parser.add_argument("--checkpoint_file", type=str, default=None, help="Checkpoint file to resume from (default: output_file + .ckpt)")
+    parser.add_argument("--method", type=str, choices=DETECT_METHODS, default='full', help="Full cepstrum or only the needed quefrency bins")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    if args.profile:
+        enable_profiling(args.profile)
+
+    rows = task5_evaluate_batch(
+        args.manifest_file,
+        args.output_file,
+        args.secret_key_file,
+        args.host_signal_file,
+        args.watermark_original_file,
+        args.params_file,
+        args.workers,
+        args.checkpoint_file,
+        args.method
+    )
+    if any(row['error'] is not None for row in rows):
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()